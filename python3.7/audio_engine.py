@@ -0,0 +1,445 @@
+import array
+import audioop
+import collections
+import itertools
+import operator
+import queue
+import threading
+import wave
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+import config
+import metrics
+from buffer_pool import PooledBuffer, audio_view, release
+
+ENGINE_BUFFERED = metrics.REGISTRY.gauge("realtime_dialog_engine_buffered_bytes", "音频引擎中各会话待播放的字节数")
+ENGINE_DROPPED = metrics.REGISTRY.counter(
+    "realtime_dialog_engine_dropped_bytes_total", "超出会话字节预算被丢弃的音频字节数", ["direction"])
+
+
+def pcm16(audio: bytes, bit_size: str) -> bytes:
+    """把输出格式的PCM转为16bit，float32先截断到[-1, 1]再量化
+
+    整块处理：缩放后按int32打包，audioop.mul放大到int32满幅时饱和，再由lin2lin取高16位，
+    逐样本的只有C层的map；样本值异常（inf/nan或远超满幅）时退回逐样本截断。
+    """
+    if bit_size != "paFloat32":
+        return audio
+    samples = array.array("f", audio[:len(audio) // 4 * 4])
+    try:
+        scaled = array.array("i", map(int, map(operator.mul, samples, itertools.repeat(32767.0))))
+    except (OverflowError, ValueError):
+        return array.array("h", (int(max(-1.0, min(1.0, x)) * 32767) for x in samples)).tobytes()
+    return audioop.lin2lin(audioop.mul(scaled.tobytes(), 4, 65536.0), 4, 2)
+
+
+def mix(chunks: List[bytes], bit_size: str) -> bytes:
+    """叠加多路PCM，短的一路按静音补齐
+
+    16bit用audioop饱和相加；float32把各路串成一条map(operator.add)链一次求和，逐样本的只有C层的map。
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    length = max(len(chunk) for chunk in chunks)
+    if bit_size == "paFloat32":
+        mixed = None
+        for chunk in chunks:
+            samples = array.array("f", chunk)
+            if len(chunk) < length:
+                samples = itertools.chain(samples, itertools.repeat(0.0, (length - len(chunk)) // 4))
+            mixed = samples if mixed is None else map(operator.add, mixed, samples)
+        return array.array("f", mixed).tobytes()
+    width = config.sample_width(bit_size)
+    mixed = chunks[0]
+    for chunk in chunks[1:]:
+        if len(chunk) < length or len(mixed) < length:
+            mixed, chunk = bytes(mixed).ljust(length, b"\0"), bytes(chunk).ljust(length, b"\0")
+        mixed = audioop.add(mixed, chunk, width)
+    return mixed
+
+
+class SessionBuffer:
+    """会话的音频缓冲：按字节预算限制的块队列
+
+    提供DialogSession和训练管理器用到的queue.Queue接口（put/get/get_nowait/empty/qsize/task_done），
+    可以直接替换原来无上限的audio_queue；超出budget字节时丢弃最旧的块并计数。
+    块由引擎的调度线程取出后立即写出或混音，未完成的块数(unfinished_tasks)即缓冲中的块数，task_done()不需要计数。
+    read()按字节读取（可拆开块），供混音时按设备可写入的长度取数据。
+    块可以是buffer_pool.PooledBuffer：丢弃、清空或被read()读出后归还到缓冲池。
+    """
+
+    def __init__(self, budget: int, direction: str = "output",
+                 on_data: Optional[Callable[["SessionBuffer"], Any]] = None):
+        self.budget = budget
+        self.direction = direction
+        self.on_data = on_data
+        self.bytes = 0
+        self.dropped = 0
+        self.closed = False
+        self._chunks: Deque[bytes] = collections.deque()
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+
+    def put(self, chunk: Optional[bytes], block: bool = True, timeout: Optional[float] = None) -> None:
+        if not chunk:
+            return
+        with self._lock:
+            self._chunks.append(chunk)
+            self.bytes += len(chunk)
+            while self.bytes > self.budget and len(self._chunks) > 1:
+                dropped = self._chunks.popleft()
+                self.bytes -= len(dropped)
+                self.dropped += len(dropped)
+                ENGINE_DROPPED.labels(self.direction).inc(len(dropped))
+                release(dropped)
+            self._ready.notify()
+        if self.on_data is not None:
+            self.on_data(self)
+
+    def put_nowait(self, chunk: bytes) -> None:
+        self.put(chunk, block=False)
+
+    def get(self, block: bool = True, timeout: Optional[float] = None) -> bytes:
+        with self._lock:
+            if block and not self._chunks:
+                self._ready.wait_for(lambda: self._chunks, timeout)
+            if not self._chunks:
+                raise queue.Empty
+            chunk = self._chunks.popleft()
+            self.bytes -= len(chunk)
+            return chunk
+
+    def get_nowait(self) -> bytes:
+        return self.get(block=False)
+
+    def read(self, max_bytes: int, align: int = 1, timeout: Optional[float] = None) -> bytes:
+        """读取至多max_bytes字节，长度按align向下取整；timeout不为None时等到攒够max_bytes或超时"""
+        with self._lock:
+            if timeout is not None:
+                self._ready.wait_for(lambda: self.bytes >= max_bytes or self.closed, timeout)
+            size = min(max_bytes, self.bytes)
+            size -= size % align
+            parts = []
+            remaining = size
+            pooled = []
+            while remaining > 0:
+                chunk = self._chunks.popleft()
+                if type(chunk) is PooledBuffer:
+                    pooled.append(chunk)
+                    chunk = chunk.view
+                if len(chunk) > remaining:
+                    self._chunks.appendleft(bytes(chunk[remaining:]))
+                    chunk = chunk[:remaining]
+                parts.append(chunk)
+                remaining -= len(chunk)
+            self.bytes -= size
+            data = b"".join(parts)
+            for chunk in pooled:
+                chunk.release()
+            return data
+
+    def close(self) -> None:
+        """唤醒等待中的read()"""
+        with self._lock:
+            self.closed = True
+            self._ready.notify_all()
+
+    def clear(self) -> int:
+        with self._lock:
+            cleared, self.bytes = self.bytes, 0
+            for chunk in self._chunks:
+                release(chunk)
+            self._chunks.clear()
+            return cleared
+
+    def empty(self) -> bool:
+        return not self._chunks
+
+    @property
+    def unfinished_tasks(self) -> int:
+        return len(self._chunks)
+
+    def task_done(self) -> None:
+        pass
+
+    def qsize(self) -> int:
+        return len(self._chunks)
+
+
+class CallableSink:
+    """把一个会话的音频交给函数（内存、网络转发等），不按实时节奏"""
+    realtime = False
+
+    def __init__(self, write: Callable[[bytes], Any]):
+        self.write = write
+
+    def close(self) -> None:
+        pass
+
+
+class FileSink(CallableSink):
+    """把一个会话的音频写入16bit WAV文件"""
+
+    def __init__(self, path: str, audio_config: Optional[Dict[str, Any]] = None):
+        self.audio_config = audio_config or config.output_audio_config
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(self.audio_config["channels"])
+        self._wav.setsampwidth(2)
+        self._wav.setframerate(self.audio_config["sample_rate"])
+        super().__init__(lambda audio: self._wav.writeframesraw(pcm16(audio, self.audio_config["bit_size"])))
+
+    def close(self) -> None:
+        self._wav.close()
+
+
+class DeviceSink:
+    """共享的声卡输出：路由到该设备的所有会话混音后写出
+
+    流支持get_write_available()（pyaudio的阻塞式流）时只写入设备当前能接收的帧数，调度线程不会被阻塞；
+    否则退化为每次写一块的阻塞写入。
+    """
+    realtime = True
+
+    def __init__(self, stream, audio_config: Optional[Dict[str, Any]] = None):
+        self.stream = stream
+        self.audio_config = audio_config or config.output_audio_config
+        self.frame_bytes = self.audio_config["channels"] * config.sample_width(self.audio_config["bit_size"])
+        self.chunk_bytes = self.audio_config["chunk"] * self.frame_bytes
+        self.stats = {"writes": 0, "mixed": 0}
+
+    def writable(self) -> int:
+        available = getattr(self.stream, "get_write_available", None)
+        return available() * self.frame_bytes if available is not None else self.chunk_bytes
+
+    def service(self, buffers: List[SessionBuffer]) -> bool:
+        size = min(self.writable(), self.chunk_bytes)
+        if size <= 0:
+            return False
+        chunks = [chunk for chunk in (buffer.read(size, self.frame_bytes) for buffer in buffers) if chunk]
+        if not chunks:
+            return False
+        self.stream.write(mix(chunks, self.audio_config["bit_size"]))
+        self.stats["writes"] += 1
+        self.stats["mixed"] += len(chunks) > 1
+        return True
+
+    def close(self) -> None:
+        self.stream.stop_stream()
+        self.stream.close()
+
+
+class AudioEngine:
+    """进程内共享的音频引擎：一个调度线程服务所有会话的播放和采集
+
+    - 每个会话一个SessionBuffer（字节预算默认为budget_seconds秒音频），代替各自的无界队列和播放线程
+    - 播放路由到CallableSink/FileSink（每个会话一个，尽快写出）或共享的DeviceSink（多个会话混音）
+    - 麦克风只打开一次，采集到的数据分发给订阅的会话（open_source返回的缓冲可以像输入流一样read）
+    - 只有一个PyAudio实例（由devices持有），会话可以单独detach，stop()时统一释放
+    调度线程只处理有新数据的缓冲，没有声卡和麦克风要轮询时一直睡眠到下一次put，空闲会话不占CPU。
+    device_factory同audio_process.default_device，在第一次用到声卡时才调用。
+    """
+
+    def __init__(self, budget_seconds: float = 30.0, batch: int = 8, idle_wait: float = 0.01,
+                 device_factory: Optional[Callable[[Dict[str, Any], Dict[str, Any]], Any]] = None,
+                 input_config: Optional[Dict[str, Any]] = None, output_config: Optional[Dict[str, Any]] = None):
+        self.input_config = input_config or config.input_audio_config
+        self.output_config = output_config or config.output_audio_config
+        self.output_budget = int(budget_seconds * self._bytes_per_second(self.output_config))
+        self.input_budget = int(budget_seconds * self._bytes_per_second(self.input_config))
+        self.batch = batch  # 每次轮到一个非实时输出时最多写出的块数
+        self.idle_wait = idle_wait
+        self.device_factory = device_factory
+        self.devices = None
+        self._device_sink: Optional[DeviceSink] = None
+        self._input_stream = None
+        self._outputs: Dict[str, SessionBuffer] = {}
+        self._routes: Dict[SessionBuffer, Any] = {}  # 缓冲 -> 输出
+        self._devices: Dict[DeviceSink, List[SessionBuffer]] = {}  # 实时输出 -> 混音的缓冲
+        self._pending = set()  # 有新数据待写出的缓冲
+        self._sources: Dict[str, SessionBuffer] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.is_running = False
+        self.stats = {"chunks": 0, "bytes": 0, "errors": 0, "captured": 0}
+        ENGINE_BUFFERED.set_function(self.buffered_bytes)
+
+    @staticmethod
+    def _bytes_per_second(audio_config: Dict[str, Any]) -> int:
+        return audio_config["sample_rate"] * audio_config["channels"] * config.sample_width(audio_config["bit_size"])
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name="audio-engine", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self.is_running = False
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        with self._lock:
+            sinks = set(self._routes.values())
+            sources = list(self._sources.values())
+            self._outputs, self._routes, self._devices, self._pending, self._sources = {}, {}, {}, set(), {}
+        for source in sources:
+            source.close()
+        for sink in sinks:
+            if sink is not self._device_sink:
+                sink.close()
+        if self.devices is not None:
+            self.devices.cleanup()  # 关闭共享的输入输出流并释放PyAudio
+            self.devices = self._device_sink = self._input_stream = None
+
+    def _ensure_devices(self):
+        if self.devices is None:
+            factory = self.device_factory
+            if factory is None:
+                from audio_process import default_device
+                factory = default_device
+            self.devices = factory(self.input_config, self.output_config)
+        return self.devices
+
+    def create_buffer(self) -> SessionBuffer:
+        return SessionBuffer(self.output_budget, "output", on_data=self._mark)
+
+    def _mark(self, buffer: SessionBuffer) -> None:
+        with self._lock:
+            self._pending.add(buffer)
+        self._wake.set()
+
+    def device_sink(self) -> DeviceSink:
+        """共享的声卡输出，第一次调用时打开"""
+        with self._lock:
+            if self._device_sink is None:
+                self._device_sink = DeviceSink(self._ensure_devices().open_output_stream(), self.output_config)
+            return self._device_sink
+
+    def attach(self, key: str, buffer: SessionBuffer, sink: Any) -> None:
+        """把会话的缓冲接到输出上"""
+        self.start()
+        with self._lock:
+            self._outputs[key] = buffer
+            self._routes[buffer] = sink
+            if sink.realtime:
+                self._devices.setdefault(sink, []).append(buffer)
+            self._pending.add(buffer)
+        self._wake.set()
+
+    def detach(self, key: str) -> None:
+        """断开会话的输出和采集；会话独占的输出（文件等）随之关闭，共享的声卡保持打开"""
+        with self._lock:
+            buffer = self._outputs.pop(key, None)
+            sink = self._routes.pop(buffer, None) if buffer is not None else None
+            if sink is not None and sink.realtime:
+                self._devices[sink].remove(buffer)
+            self._pending.discard(buffer)
+            source = self._sources.pop(key, None)
+        if source is not None:
+            source.close()
+        if sink is not None and sink is not self._device_sink:
+            sink.close()
+
+    def open_source(self, key: str) -> "EngineSource":
+        """订阅麦克风输入，第一次调用时打开输入设备"""
+        with self._lock:
+            if self._input_stream is None:
+                self._input_stream = self._ensure_devices().open_input_stream()
+            source = self._sources[key] = SessionBuffer(self.input_budget, "input")
+        self.start()
+        self._wake.set()
+        return EngineSource(source, self.input_config)
+
+    def buffered_bytes(self) -> int:
+        with self._lock:
+            return sum(buffer.bytes for buffer in self._outputs.values())
+
+    def _run(self) -> None:
+        while self.is_running:
+            self._wake.clear()
+            with self._lock:
+                pending, self._pending = self._pending, set()
+                targets = [(buffer, self._routes.get(buffer)) for buffer in pending]
+                devices = [(sink, list(buffers)) for sink, buffers in self._devices.items() if buffers]
+                sources = list(self._sources.values())
+            busy = False
+            for buffer, sink in targets:
+                if sink is None or sink.realtime:
+                    continue  # 未接到输出的缓冲在attach时重新加入；实时输出在下面按设备轮询
+                for _ in range(self.batch):
+                    try:
+                        chunk = buffer.get_nowait()
+                    except queue.Empty:
+                        break
+                    busy = True
+                    try:
+                        sink.write(audio_view(chunk))
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        print(f"音频输出错误: {e}")
+                        break
+                    finally:
+                        release(chunk)
+                    self.stats["chunks"] += 1
+                    self.stats["bytes"] += len(chunk)
+                if not buffer.empty():
+                    busy = True
+                    with self._lock:
+                        self._pending.add(buffer)
+            polling = bool(sources)
+            for sink, buffers in devices:
+                if not any(buffer.bytes for buffer in buffers):
+                    continue
+                polling = True
+                try:
+                    busy = sink.service(buffers) or busy
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    print(f"声卡输出错误: {e}")
+            if sources:
+                busy = self._capture(sources) or busy
+            if not busy:
+                # 声卡有待播放数据或有麦克风订阅时按idle_wait轮询，否则等到下一次put
+                self._wake.wait(self.idle_wait if polling else None)
+
+    def _capture(self, sources: List[SessionBuffer]) -> bool:
+        stream = self._input_stream
+        available = getattr(stream, "get_read_available", None)
+        frames = available() if available is not None else self.input_config["chunk"]
+        if frames < self.input_config["chunk"]:
+            return False
+        data = stream.read(frames, exception_on_overflow=False)
+        self.stats["captured"] += len(data)
+        for source in sources:
+            source.put(data)
+        return True
+
+
+class EngineSource:
+    """会话的麦克风输入，read()与pyaudio输入流的用法相同"""
+
+    def __init__(self, buffer: SessionBuffer, audio_config: Dict[str, Any]):
+        self.buffer = buffer
+        self.frame_bytes = audio_config["channels"] * config.sample_width(audio_config["bit_size"])
+
+    def read(self, num_frames: int, exception_on_overflow: bool = False) -> bytes:
+        """等到攒够num_frames帧；会话detach后返回已有的数据（可能为空）"""
+        size = num_frames * self.frame_bytes
+        data = b""
+        while len(data) < size and not self.buffer.closed:
+            data += self.buffer.read(size - len(data), self.frame_bytes, timeout=1.0)
+        return data + self.buffer.read(size - len(data), self.frame_bytes)
+
+
+_shared: Optional[AudioEngine] = None
+
+
+def shared_engine(**options: Any) -> AudioEngine:
+    """进程内共用的音频引擎（首次调用时按options创建）"""
+    global _shared
+    if _shared is None:
+        _shared = AudioEngine(**options)
+    return _shared
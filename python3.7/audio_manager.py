@@ -1,23 +1,49 @@
 import asyncio
+import functools
 import uuid
 import queue
 import threading
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Union, Callable, List
 import wave
-import pyaudio
 import signal
+import weakref
 from dataclasses import dataclass
 
 import config
+import metrics
 from realtime_dialog_client import RealtimeDialogClient
+from audio_engine import AudioEngine, CallableSink
+from buffer_pool import AUDIO_TYPES, BufferPool, audio_view, release
+from audio_process import AudioProcess
+from startup import StartupPipeline
+from uplink_controller import AdaptiveUplink
+from uplink_gate import UplinkGate
+
+PLAYBACK_QUEUE = metrics.REGISTRY.gauge(
+    "realtime_dialog_playback_queue_chunks", "所有会话待播放的音频块数", ["stat"])
+PLAYBACK_UNDERRUNS = metrics.REGISTRY.counter(
+    "realtime_dialog_playback_underruns_total", "TTS播放过程中播放队列已被取空、下一块音频才到达的次数")
+ACTIVE_SESSIONS = metrics.REGISTRY.gauge("realtime_dialog_sessions", "运行中的对话会话数")
+
+# 播放队列深度在抓取时遍历存活的会话计算
+_sessions: "weakref.WeakSet[DialogSession]" = weakref.WeakSet()
+
+
+def _queue_depths() -> List[int]:
+    return [session.audio_queue.qsize() for session in list(_sessions) if session.is_running]
+
+
+PLAYBACK_QUEUE.labels("total").set_function(lambda: sum(_queue_depths()))
+PLAYBACK_QUEUE.labels("max").set_function(lambda: max(_queue_depths(), default=0))
+ACTIVE_SESSIONS.set_function(lambda: len(_queue_depths()))
 
 
 @dataclass
 class AudioConfig:
     """音频配置数据类"""
     format: str
-    bit_size: int
+    bit_size: Union[int, str]
     channels: int
     sample_rate: int
     chunk: int
@@ -29,15 +55,30 @@ class AudioDeviceManager:
     def __init__(self, input_config: AudioConfig, output_config: AudioConfig):
         self.input_config = input_config
         self.output_config = output_config
-        self.pyaudio = pyaudio.PyAudio()
-        self.input_stream: Optional[pyaudio.Stream] = None
-        self.output_stream: Optional[pyaudio.Stream] = None
+        # PyAudio实例在首次打开设备时创建，避免导入和构造时初始化PortAudio
+        self.pyaudio = None
+        self.input_stream = None
+        self.output_stream = None
 
-    def open_input_stream(self) -> pyaudio.Stream:
+    def _ensure_pyaudio(self):
+        """按需初始化PyAudio"""
+        if self.pyaudio is None:
+            import pyaudio
+            self.pyaudio = pyaudio.PyAudio()
+        return self.pyaudio
+
+    @staticmethod
+    def _resolve_format(bit_size: Union[int, str]) -> int:
+        """将配置中的采样格式名(如 paInt16)解析为pyaudio常量"""
+        if isinstance(bit_size, str):
+            import pyaudio
+            return getattr(pyaudio, bit_size)
+        return bit_size
+
+    def open_input_stream(self):
         """打开音频输入流"""
-        # p = pyaudio.PyAudio()
-        self.input_stream = self.pyaudio.open(
-            format=self.input_config.bit_size,
+        self.input_stream = self._ensure_pyaudio().open(
+            format=self._resolve_format(self.input_config.bit_size),
             channels=self.input_config.channels,
             rate=self.input_config.sample_rate,
             input=True,
@@ -45,10 +86,10 @@ class AudioDeviceManager:
         )
         return self.input_stream
 
-    def open_output_stream(self) -> pyaudio.Stream:
+    def open_output_stream(self):
         """打开音频输出流"""
-        self.output_stream = self.pyaudio.open(
-            format=self.output_config.bit_size,
+        self.output_stream = self._ensure_pyaudio().open(
+            format=self._resolve_format(self.output_config.bit_size),
             channels=self.output_config.channels,
             rate=self.output_config.sample_rate,
             output=True,
@@ -62,42 +103,229 @@ class AudioDeviceManager:
             if stream:
                 stream.stop_stream()
                 stream.close()
-        self.pyaudio.terminate()
+        if self.pyaudio is not None:
+            self.pyaudio.terminate()
+
+
+class AudioWorkerPool:
+    """多个会话共享的音频播放线程
+
+    每个会话注册时固定分配给一个线程，保证同一会话的音频按顺序写出；
+    线程轮流从所负责会话的队列中取音频写入各自的输出，每块写完（或出错）后调用task_done()。
+    输出为阻塞式声卡写入时，一个线程负责的会话会相互等待，适合文件/网络等非阻塞输出。
+    """
+
+    def __init__(self, workers: int = 2, batch: int = 4, idle_wait: float = 0.01):
+        self.workers = workers
+        self.batch = batch  # 每次轮到一个会话时最多写出的块数
+        self.idle_wait = idle_wait
+        self._sessions: List[Dict[str, Any]] = [{} for _ in range(workers)]
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._next = 0
+        self.is_running = False
+        self.stats = {"sessions": 0, "chunks": 0, "bytes": 0, "errors": 0}
+
+    def start(self) -> None:
+        if self.is_running:
+            return
+        self.is_running = True
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, args=(i,), name=f"audio-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self.is_running = False
+        for thread in self._threads:
+            thread.join(timeout=1.0)
+        self._threads = []
+
+    def register(self, key: str, audio_queue: "queue.Queue[bytes]", write: Callable[[bytes], Any]) -> None:
+        """注册会话的音频队列和输出函数"""
+        self.start()
+        with self._lock:
+            worker = self._next % self.workers
+            self._next += 1
+            self._sessions[worker][key] = (audio_queue, write)
+            self.stats["sessions"] += 1
+
+    def unregister(self, key: str) -> None:
+        with self._lock:
+            for sessions in self._sessions:
+                if sessions.pop(key, None) is not None:
+                    self.stats["sessions"] -= 1
+
+    def _worker(self, index: int) -> None:
+        while self.is_running:
+            with self._lock:
+                sessions = list(self._sessions[index].values())
+            written = 0
+            for audio_queue, write in sessions:
+                for _ in range(self.batch):
+                    try:
+                        audio_data = audio_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if audio_data is None:
+                        audio_queue.task_done()
+                        continue
+                    try:
+                        write(audio_view(audio_data))
+                    except Exception as e:
+                        self.stats["errors"] += 1
+                        print(f"音频播放错误: {e}")
+                        break
+                    finally:
+                        release(audio_data)
+                        audio_queue.task_done()
+                    written += 1
+                    self.stats["chunks"] += 1
+                    self.stats["bytes"] += len(audio_data)
+            if not written:
+                time.sleep(self.idle_wait)
 
 
 class DialogSession:
-    """对话会话管理类"""
+    """对话会话管理类
+
+    audio_workers为共享的播放线程池，未提供时会话使用自己的播放线程；
+    output_sink替代声卡输出（如写文件或转发），提供时不打开输出设备。
+    同一进程运行多个会话时应关闭use_microphone和handle_signals。
+    uplink_gate在播放TTS期间门控麦克风上行（见uplink_gate.py），未指定播放状态时以播放队列非空为准。
+    audio_process提供时由独立的音频进程读写声卡（见audio_process.py），本进程只通过共享内存交换PCM。
+    audio_engine提供时播放队列换成引擎中按字节预算限制的缓冲，由引擎的调度线程统一写出或混音到共享声卡，
+    麦克风也从引擎订阅（见audio_engine.py），会话不再有自己的PyAudio和播放线程。
+    buffer_pool提供时下行音频解码进池中的缓冲，播放队列中的块为PooledBuffer，写出或丢弃后归还（见buffer_pool.py）。
+    uplink_controller提供时麦克风帧交给它排队发送，按往返时延和积压合并帧、降低精度、静音置零或丢弃过期帧
+    （见uplink_controller.py），它的发送任务在prepare()握手完成后启动。
+    """
 
-    def __init__(self, ws_config: Dict[str, Any]):
+    def __init__(self, ws_config: Dict[str, Any], audio_workers: Optional[AudioWorkerPool] = None,
+                 output_sink: Optional[Callable[[bytes], Any]] = None, use_microphone: bool = True,
+                 handle_signals: bool = True, uplink_gate: Optional[UplinkGate] = None,
+                 audio_process: Optional[AudioProcess] = None, audio_engine: Optional[AudioEngine] = None,
+                 buffer_pool: Optional[BufferPool] = None, uplink_controller: Optional[AdaptiveUplink] = None):
         self.session_id = str(uuid.uuid4())
         self.client = RealtimeDialogClient(config=ws_config, session_id=self.session_id)
+        self.client.buffer_pool = buffer_pool
         self.audio_device = AudioDeviceManager(
             AudioConfig(**config.input_audio_config),
             AudioConfig(**config.output_audio_config)
         )
+        self.audio_workers = audio_workers
+        self.output_sink = output_sink
+        self.audio_process = audio_process
+        self.audio_engine = audio_engine
+        self.use_microphone = use_microphone
 
         self.is_running = True
         self.is_session_finished = False
 
-        signal.signal(signal.SIGINT, self._keyboard_signal)
-        # 初始化音频队列和输出流
-        self.audio_queue = queue.Queue()
-        self.output_stream = self.audio_device.open_output_stream()
-        # 启动播放线程
+        if handle_signals:
+            signal.signal(signal.SIGINT, self._keyboard_signal)
+        # 初始化音频队列；输出流在启动流水线中与握手并行打开
+        self.audio_queue = audio_engine.create_buffer() if audio_engine is not None else queue.Queue()
+        self.output_stream = None
         self.is_recording = True
         self.is_playing = True
-        self.player_thread = threading.Thread(target=self._audio_player_thread)
+        self.player_thread = None
+        self.startup = StartupPipeline()
+        self.tts_playing = False  # 350(TTS开始)到359(TTS结束)之间
+        self.tts_chunks = 0
+        self.uplink_controller = uplink_controller
+        self.uplink_task: Optional[asyncio.Task] = None
+        self.receive_task: Optional[asyncio.Task] = None
+        self.uplink_gate = None
+        if uplink_gate is not None:
+            self.set_uplink_gate(uplink_gate)
+        _sessions.add(self)
+
+    def set_uplink_gate(self, gate: UplinkGate) -> None:
+        if gate.playback_active is None:
+            gate.playback_active = self.playback_pending
+        self.uplink_gate = gate
+
+    def playback_pending(self) -> bool:
+        """还有音频没有播放完（包括播放线程已取出、还在写出的块）"""
+        if self.audio_queue.unfinished_tasks:
+            return True
+        return self.audio_process is not None and self.audio_process.pending_playback() > 0
+
+    def open_audio_output(self) -> None:
+        """打开音频输出并开始播放（阻塞调用，可在线程池中执行）"""
+        write = self.output_sink
+        if self.audio_engine is not None:
+            sink = CallableSink(write) if write is not None else self.audio_engine.device_sink()
+            self.audio_engine.attach(self.session_id, self.audio_queue, sink)
+            return
+        if write is None and self.audio_process is not None:
+            self.audio_process.start()
+            write = self.audio_process.play
+        elif write is None:
+            self.output_stream = self.audio_device.open_output_stream()
+            write = self.output_stream.write
+        if self.audio_workers is not None:
+            self.audio_workers.register(self.session_id, self.audio_queue, write)
+            return
+        self.player_thread = threading.Thread(target=self._audio_player_thread, args=(write,))
         self.player_thread.daemon = True
         self.player_thread.start()
 
-    def _audio_player_thread(self):
+    def close_audio_output(self) -> None:
+        """停止播放并释放音频设备"""
+        self.is_playing = False
+        if self.audio_workers is not None:
+            self.audio_workers.unregister(self.session_id)
+        if self.audio_process is not None:
+            self.audio_process.stop()
+        if self.audio_engine is not None:
+            self.audio_engine.detach(self.session_id)
+        self.audio_device.cleanup()
+
+    async def wait_playback_drained(self, timeout: float = 10.0, poll: float = 0.01) -> bool:
+        """等到已收到的音频都写出，超时返回False
+
+        播放线程每写完一块才调用task_done()，只看队列是否为空会漏掉已取出、正在写的块。
+        """
+        deadline = time.perf_counter() + timeout
+        while self.playback_pending():
+            if time.perf_counter() >= deadline:
+                return False
+            await asyncio.sleep(poll)
+        return True
+
+    async def prepare(self) -> None:
+        """并行完成WebSocket握手和输入输出设备打开"""
+        self.startup.add_stage("handshake", self.client.connect())
+        self.startup.add_stage("audio_output", self.startup.run_blocking(self.open_audio_output))
+        stages = ["handshake", "audio_output"]
+        if self.use_microphone and self.audio_process is None and self.audio_engine is None:
+            self.startup.add_stage("audio_input", self.startup.run_blocking(self.audio_device.open_input_stream))
+            stages.append("audio_input")
+        await self.startup.ready(*stages)
+        if self.uplink_controller is not None and self.uplink_task is None:
+            # 握手完成即开始发送和探测，麦克风循环或调用方自己只需submit()
+            self.uplink_task = asyncio.ensure_future(self.uplink_controller.run(self.client))
+
+    async def stop_uplink(self) -> None:
+        """停止自适应上行的发送和探测（连接关闭时它也会自行结束）"""
+        if self.uplink_task is not None:
+            self.uplink_task.cancel()
+            await asyncio.gather(self.uplink_task, return_exceptions=True)
+
+    def _audio_player_thread(self, write: Callable[[bytes], Any]):
         """音频播放线程"""
         while self.is_playing:
             try:
                 # 从队列获取音频数据
                 audio_data = self.audio_queue.get(timeout=1.0)
-                if audio_data is not None:
-                    self.output_stream.write(audio_data)
+                try:
+                    if audio_data is not None:
+                        write(audio_view(audio_data))
+                finally:
+                    release(audio_data)
+                    self.audio_queue.task_done()
             except queue.Empty:
                 # 队列为空时等待一小段时间
                 time.sleep(0.1)
@@ -109,7 +337,7 @@ class DialogSession:
         if response == {}:
             return
         """处理服务器响应"""
-        if response['message_type'] == 'SERVER_ACK' and isinstance(response.get('payload_msg'), bytes):
+        if response['message_type'] == 'SERVER_ACK' and isinstance(response.get('payload_msg'), AUDIO_TYPES):
             # print(f"\n接收到音频数据: {len(response['payload_msg'])} 字节")
             self.audio_queue.put(response['payload_msg'])
         elif response['message_type'] == 'SERVER_FULL_RESPONSE':
@@ -118,13 +346,30 @@ class DialogSession:
                 print(f"清空缓存音频: {response['session_id']}")
                 while not self.audio_queue.empty():
                     try:
-                        self.audio_queue.get_nowait()
+                        release(self.audio_queue.get_nowait())
                     except queue.Empty:
                         continue
+                    self.audio_queue.task_done()
         elif response['message_type'] == 'SERVER_ERROR':
             print(f"服务器错误: {response['payload_msg']}")
             raise Exception("服务器错误")
 
+    def track_playback(self, response: Dict[str, Any]) -> None:
+        """统计播放间隙：TTS进行中下一块音频到达时播放队列已空（对实时输出设备有意义）"""
+        event = response.get('event')
+        if self.uplink_gate is not None:
+            self.uplink_gate.on_event(event)
+        if isinstance(response.get('payload_msg'), AUDIO_TYPES):
+            if self.uplink_controller is not None:
+                self.uplink_controller.on_downlink()
+            if self.tts_playing and self.tts_chunks and self.audio_queue.empty():
+                PLAYBACK_UNDERRUNS.inc()
+            self.tts_chunks += 1
+        elif event == 350:
+            self.tts_playing, self.tts_chunks = True, 0
+        elif event == 359:
+            self.tts_playing = False
+
     def _keyboard_signal(self, sig, frame):
         print(f"receive keyboard Ctrl+C")
         self.is_recording = False
@@ -135,7 +380,13 @@ class DialogSession:
         try:
             while True:
                 response = await self.client.receive_server_response()
+                if isinstance(response.get('payload_msg'), AUDIO_TYPES):
+                    self.startup.mark_first_audio()
+                self.track_playback(response)
                 self.handle_server_response(response)
+                if response.get('event') == 450 and self.audio_process is not None:
+                    # 音频进程输出环中已缓冲的音频也一并丢弃
+                    await asyncio.get_running_loop().run_in_executor(None, self.audio_process.flush)
                 if 'event' in response and (response['event'] == 152 or response['event'] == 153):
                     print(f"receive session finished event: {response['event']}")
                     self.is_session_finished = True
@@ -145,17 +396,60 @@ class DialogSession:
         except Exception as e:
             print(f"接收消息错误: {e}")
 
+    def start_receiving(self) -> asyncio.Task:
+        """在后台运行receive_loop，finish()时等它收到会话结束事件"""
+        self.receive_task = asyncio.ensure_future(self.receive_loop())
+        return self.receive_task
+
+    async def finish(self, timeout: float = 5.0) -> None:
+        """结束会话并关闭连接
+
+        发FinishSession(102)，等receive_loop收到152/153后发FinishConnection(2)，最后关闭WebSocket；
+        每一步最多等timeout秒，连接已断开或等不到时跳过，连接总会被关闭。可以重复调用。
+        """
+        client = self.client
+        try:
+            if client.ws is not None and client.ws.open and not self.is_session_finished:
+                await client.finish_session()
+                if self.receive_task is not None:
+                    await asyncio.wait([self.receive_task], timeout=timeout)
+            if self.is_session_finished and client.ws is not None and client.ws.open:
+                await asyncio.wait_for(client.finish_connection(), timeout)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"结束会话时出错: {e!r}")
+        finally:
+            if self.receive_task is not None:
+                self.receive_task.cancel()
+                await asyncio.gather(self.receive_task, return_exceptions=True)
+            await self.stop_uplink()
+            await client.close()
+
     async def process_microphone_input(self) -> None:
         """处理麦克风输入"""
-        stream = self.audio_device.open_input_stream()
+        if self.audio_engine is not None:
+            stream = self.audio_engine.open_source(self.session_id)
+        else:
+            stream = self.audio_process or self.audio_device.input_stream or self.audio_device.open_input_stream()
         print("已打开麦克风，请讲话...")
+        loop = asyncio.get_running_loop()
+        # 读取一块音频会阻塞一个块的时长，和写WAV一样放到线程池中，避免阻塞事件循环
+        read = functools.partial(stream.read, config.input_audio_config["chunk"], exception_on_overflow=False)
 
         while self.is_recording:
             try:
                 # 添加exception_on_overflow=False参数来忽略溢出错误
-                audio_data = stream.read(config.input_audio_config["chunk"], exception_on_overflow=False)
-                save_pcm_to_wav(audio_data, "output.wav")
-                await self.client.task_request(audio_data)
+                audio_data = await loop.run_in_executor(None, read)
+                if not audio_data:  # 音频引擎中的订阅已断开
+                    break
+                await loop.run_in_executor(None, save_pcm_to_wav, audio_data, "output.wav")
+                frames = self.uplink_gate.filter(audio_data) if self.uplink_gate is not None else [audio_data]
+                for frame in frames:
+                    if self.uplink_controller is not None:
+                        self.uplink_controller.submit(frame)
+                    else:
+                        await self.client.task_request(frame)
                 await asyncio.sleep(0.01)  # 避免CPU过度使用
             except Exception as e:
                 print(f"读取麦克风数据出错: {e}")
@@ -164,30 +458,28 @@ class DialogSession:
     async def start(self) -> None:
         """启动对话会话"""
         try:
-            await self.client.connect()
-            asyncio.create_task(self.process_microphone_input())
-            asyncio.create_task(self.receive_loop())
+            await self.prepare()
+            if self.use_microphone:
+                asyncio.create_task(self.process_microphone_input())
+            self.start_receiving()
 
             while self.is_running:
                 await asyncio.sleep(0.1)
 
-            await self.client.finish_session()
-            while not self.is_session_finished:
-                await asyncio.sleep(0.1)
-            await self.client.finish_connection()
-            await asyncio.sleep(0.1)
-            await self.client.close()
+            await self.finish()
             print(f"dialog request logid: {self.client.logid}")
         except Exception as e:
             print(f"会话错误: {e}")
         finally:
-            self.audio_device.cleanup()
+            self.startup.cancel()
+            await self.stop_uplink()
+            self.close_audio_output()
 
 
 def save_pcm_to_wav(pcm_data: bytes, filename: str) -> None:
     """保存PCM数据为WAV文件"""
     with wave.open(filename, 'wb') as wf:
         wf.setnchannels(config.input_audio_config["channels"])
-        wf.setsampwidth(2)  # paInt16 = 2 bytes
+        wf.setsampwidth(config.sample_width(config.input_audio_config["bit_size"]))
         wf.setframerate(config.input_audio_config["sample_rate"])
         wf.writeframes(pcm_data)
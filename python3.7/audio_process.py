@@ -0,0 +1,345 @@
+import multiprocessing
+import struct
+import threading
+import time
+from multiprocessing.sharedctypes import RawArray
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import config
+
+try:  # Python 3.8+
+    from multiprocessing import shared_memory
+except ImportError:  # Python 3.7用sharedctypes.RawArray，只能在创建子进程时传递
+    shared_memory = None
+
+
+class SharedRing:
+    """单生产者单消费者的共享内存字节环形缓冲
+
+    头部两个uint64：累计写入字节数（只由生产者更新）和累计读取字节数（只由消费者更新），不需要锁；
+    数据先写入、再更新计数，对齐的8字节写在x86/ARM64上是原子的。
+    handle可传给子进程后用attach打开同一块内存。
+    """
+    _HEADER = struct.Struct("=QQ")
+    _COUNTER = struct.Struct("=Q")
+
+    def __init__(self, capacity: int, handle: Optional[Tuple] = None):
+        self.capacity = capacity
+        self._shm = None
+        self._owner = handle is None
+        size = self._HEADER.size + capacity
+        if handle is None:
+            if shared_memory is not None:
+                self._shm = shared_memory.SharedMemory(create=True, size=size)
+                self.handle = ("shm", self._shm.name, capacity)
+            else:
+                raw = RawArray("B", size)
+                self.handle = ("raw", raw, capacity)
+        else:
+            self.handle = handle
+            if handle[0] == "shm":
+                # 子进程与创建方共用同一个resource_tracker，只由创建方unlink
+                self._shm = shared_memory.SharedMemory(name=handle[1])
+        self.buf = self._shm.buf if self._shm is not None else memoryview(self.handle[1]).cast("B")
+        self._data = self.buf[self._HEADER.size:self._HEADER.size + capacity]
+
+    @classmethod
+    def attach(cls, handle: Tuple) -> "SharedRing":
+        return cls(handle[2], handle)
+
+    def counters(self) -> Tuple[int, int]:
+        return self._HEADER.unpack_from(self.buf, 0)
+
+    def available(self) -> int:
+        head, tail = self.counters()
+        return head - tail
+
+    def free(self) -> int:
+        return self.capacity - self.available()
+
+    def write(self, data: bytes) -> int:
+        """写入尽可能多的数据（生产者调用），返回写入的字节数"""
+        head, tail = self.counters()
+        n = min(len(data), self.capacity - (head - tail))
+        if n <= 0:
+            return 0
+        view = memoryview(data)
+        pos = head % self.capacity
+        first = min(n, self.capacity - pos)
+        self._data[pos:pos + first] = view[:first]
+        if n > first:
+            self._data[:n - first] = view[first:n]
+        self._COUNTER.pack_into(self.buf, 0, head + n)
+        return n
+
+    def read(self, max_bytes: int, align: int = 1) -> bytes:
+        """读取至多max_bytes字节（消费者调用），长度按align（一帧的字节数）向下取整"""
+        head, tail = self.counters()
+        n = min(max_bytes, head - tail)
+        n -= n % align
+        if n <= 0:
+            return b""
+        pos = tail % self.capacity
+        first = min(n, self.capacity - pos)
+        data = bytes(self._data[pos:pos + first])
+        if n > first:
+            data += bytes(self._data[:n - first])
+        self._COUNTER.pack_into(self.buf, 8, tail + n)
+        return data
+
+    def discard(self) -> int:
+        """丢弃所有未读数据（消费者调用），返回丢弃的字节数"""
+        head, tail = self.counters()
+        self._COUNTER.pack_into(self.buf, 8, head)
+        return head - tail
+
+    def close(self) -> None:
+        self._data.release()
+        if self._shm is not None:
+            self.buf = None
+            self._shm.close()
+            if self._owner:
+                self._shm.unlink()
+
+
+def _bytes_per_frame(audio_config: Dict[str, Any]) -> int:
+    return audio_config["channels"] * config.sample_width(audio_config["bit_size"])
+
+
+def default_device(input_config: Dict[str, Any], output_config: Dict[str, Any]):
+    """在音频进程中创建AudioDeviceManager（延迟导入，子进程不需要加载网络相关模块以外的依赖）"""
+    from audio_manager import AudioConfig, AudioDeviceManager
+    return AudioDeviceManager(AudioConfig(**input_config), AudioConfig(**output_config))
+
+
+class _Worker:
+    """音频进程内：播放线程把输出环中的PCM写入声卡，采集线程把麦克风数据写入输入环，主线程处理控制命令"""
+
+    def __init__(self, conn, output_handle, input_handle, input_config, output_config, device_factory, poll):
+        self.conn = conn
+        self.output = SharedRing.attach(output_handle) if output_handle else None
+        self.input = SharedRing.attach(input_handle) if input_handle else None
+        self.input_config = input_config
+        self.output_config = output_config
+        self.device_factory = device_factory
+        self.poll = poll
+        self.running = True
+        self.muted = {"input": False, "output": False}
+        self._output_lock = threading.Lock()  # flush和播放线程都会移动输出环的读位置
+        self.stats = {"played_bytes": 0, "captured_bytes": 0, "flushed_bytes": 0, "underruns": 0,
+                      "overflows": 0, "errors": 0}
+
+    def run(self) -> None:
+        try:
+            device = self.device_factory(self.input_config, self.output_config)
+            output_stream = device.open_output_stream() if self.output else None
+            input_stream = device.open_input_stream() if self.input else None
+        except Exception as e:
+            self.conn.send({"error": f"{type(e).__name__}: {e}"})
+            for ring in (self.output, self.input):
+                if ring is not None:
+                    ring.close()
+            return
+        threads = []
+        if output_stream is not None:
+            threads.append(threading.Thread(target=self._play, args=(output_stream,), daemon=True))
+        if input_stream is not None:
+            threads.append(threading.Thread(target=self._capture, args=(input_stream,), daemon=True))
+        for thread in threads:
+            thread.start()
+        self.conn.send({"ready": True})
+        try:
+            while self.running:
+                try:
+                    message = self.conn.recv()
+                except (EOFError, OSError):
+                    break
+                self.conn.send(self._control(message))
+        finally:
+            self.running = False
+            for thread in threads:
+                thread.join(timeout=1.0)
+            device.cleanup()
+            for ring in (self.output, self.input):
+                if ring is not None:
+                    ring.close()
+
+    def _control(self, message: Dict[str, Any]) -> Dict[str, Any]:
+        command = message.get("cmd")
+        if command == "flush":
+            flushed = 0
+            if self.output is not None:
+                with self._output_lock:
+                    flushed = self.output.discard()
+            self.stats["flushed_bytes"] += flushed
+            return {"flushed": flushed}
+        if command == "mute":
+            self.muted[message.get("stream", "output")] = bool(message.get("muted", True))
+            return {"muted": dict(self.muted)}
+        if command == "stats":
+            return dict(self.stats)
+        if command == "stop":
+            self.running = False
+            return {"stopped": True}
+        return {"error": f"未知命令: {command}"}
+
+    def _play(self, stream) -> None:
+        frame_bytes = _bytes_per_frame(self.output_config)
+        chunk_bytes = self.output_config["chunk"] * frame_bytes
+        playing = False
+        while self.running:
+            with self._output_lock:
+                data = self.output.read(chunk_bytes, frame_bytes)
+            if not data:
+                if playing:
+                    # 播放中途输出环被取空（与PLAYBACK_UNDERRUNS相同，包含正常的回合结束）
+                    self.stats["underruns"] += 1
+                    playing = False
+                time.sleep(self.poll)
+                continue
+            playing = True
+            if self.muted["output"]:
+                continue
+            try:
+                stream.write(data)
+                self.stats["played_bytes"] += len(data)
+            except Exception:
+                self.stats["errors"] += 1
+
+    def _capture(self, stream) -> None:
+        chunk = self.input_config["chunk"]
+        while self.running:
+            try:
+                data = stream.read(chunk, exception_on_overflow=False)
+            except Exception:
+                self.stats["errors"] += 1
+                time.sleep(self.poll)
+                continue
+            if self.muted["input"]:
+                data = bytes(len(data))
+            # 对话进程取得不够快时丢弃整块，保持环中的数据按帧对齐
+            if self.input.free() < len(data):
+                self.stats["overflows"] += 1
+                continue
+            self.input.write(data)
+            self.stats["captured_bytes"] += len(data)
+
+
+def _worker_main(*args) -> None:
+    _Worker(*args).run()
+
+
+class AudioProcess:
+    """独立进程中的音频采集和播放
+
+    子进程持有AudioDeviceManager，和对话进程通过两个共享内存环形缓冲交换PCM（输出: 对话进程 -> 声卡，
+    输入: 麦克风 -> 对话进程），另用一个Pipe传控制命令（flush/mute/stats/stop）。
+    声卡读写、播放线程不再和事件循环争抢同一个GIL，对话进程里的长时间处理不会造成播放卡顿。
+    play()和read()与声卡流的write/read用法相同，可直接替换DialogSession中的输出和输入流。
+    """
+
+    def __init__(self, input_config: Optional[Dict[str, Any]] = None, output_config: Optional[Dict[str, Any]] = None,
+                 buffer_seconds: float = 2.0, capture: bool = True, playback: bool = True,
+                 device_factory: Callable[[Dict[str, Any], Dict[str, Any]], Any] = default_device,
+                 poll: float = 0.002, start_timeout: float = 10.0):
+        self.input_config = dict(input_config or config.input_audio_config)
+        self.output_config = dict(output_config or config.output_audio_config)
+        self.buffer_seconds = buffer_seconds
+        self.capture = capture
+        self.playback = playback
+        self.device_factory = device_factory
+        self.poll = poll
+        self.start_timeout = start_timeout
+        self.output: Optional[SharedRing] = None
+        self.input: Optional[SharedRing] = None
+        self.process: Optional[multiprocessing.Process] = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self.is_running = False
+
+    def _ring(self, audio_config: Dict[str, Any]) -> SharedRing:
+        frame_bytes = _bytes_per_frame(audio_config)
+        return SharedRing(int(audio_config["sample_rate"] * self.buffer_seconds) * frame_bytes)
+
+    def start(self) -> None:
+        """启动音频进程并等待设备打开（阻塞调用，可在线程池中执行）"""
+        if self.is_running:
+            return
+        self.output = self._ring(self.output_config) if self.playback else None
+        self.input = self._ring(self.input_config) if self.capture else None
+        self._conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=_worker_main, name="audio-io", daemon=True,
+            args=(child, self.output.handle if self.output else None, self.input.handle if self.input else None,
+                  self.input_config, self.output_config, self.device_factory, self.poll))
+        self.process.start()
+        child.close()
+        if not self._conn.poll(self.start_timeout):
+            self.stop()
+            raise RuntimeError("音频进程启动超时")
+        reply = self._conn.recv()
+        if "error" in reply:
+            self.stop()
+            raise RuntimeError(f"音频进程打开设备失败: {reply['error']}")
+        self.is_running = True
+
+    def _command(self, message: Dict[str, Any], timeout: float = 2.0) -> Dict[str, Any]:
+        with self._lock:
+            if self._conn is None:
+                return {}
+            self._conn.send(message)
+            if not self._conn.poll(timeout):
+                raise RuntimeError(f"音频进程没有响应: {message.get('cmd')}")
+            return self._conn.recv()
+
+    def play(self, data: bytes) -> None:
+        """写入待播放的PCM，输出环满时等待（与阻塞式声卡写入一致）"""
+        view = memoryview(data)
+        while view and self.is_running:
+            written = self.output.write(view)
+            view = view[written:]
+            if view:
+                time.sleep(self.poll)
+
+    def read(self, num_frames: int, exception_on_overflow: bool = False) -> bytes:
+        """读取num_frames帧麦克风数据，数据不足时等待（与pyaudio的stream.read一致）"""
+        size = num_frames * _bytes_per_frame(self.input_config)
+        while self.is_running and self.input.available() < size:
+            time.sleep(self.poll)
+        return self.input.read(size)
+
+    def pending_playback(self) -> int:
+        """输出环中尚未播放的字节数"""
+        return self.output.available() if self.output is not None else 0
+
+    def flush(self) -> int:
+        """丢弃尚未播放的音频（被打断时），返回丢弃的字节数"""
+        return self._command({"cmd": "flush"}).get("flushed", 0) if self.is_running else 0
+
+    def mute(self, muted: bool = True, stream: str = "output") -> None:
+        """静音输出（读出后丢弃）或输入（采集到的数据替换为静音）"""
+        if self.is_running:
+            self._command({"cmd": "mute", "stream": stream, "muted": muted})
+
+    def stats(self) -> Dict[str, Any]:
+        return self._command({"cmd": "stats"}) if self.is_running else {}
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self.is_running = False
+        if self._conn is not None:
+            try:
+                if self.process is not None and self.process.is_alive():
+                    self._command({"cmd": "stop"}, timeout)
+            except (RuntimeError, EOFError, OSError):
+                pass
+            self._conn.close()
+            self._conn = None
+        if self.process is not None:
+            self.process.join(timeout)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
+        for ring in (self.output, self.input):
+            if ring is not None:
+                ring.close()
+        self.output = self.input = None
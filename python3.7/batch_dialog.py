@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import time
+import wave
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import config
+from audio_engine import pcm16
+from audio_manager import AudioWorkerPool, DialogSession
+
+
+@dataclass
+class BatchResult:
+    """一条录音的处理结果，同时写入<名称>.json和清单"""
+    name: str
+    source: str
+    transcript: str = ""
+    interim_results: int = 0
+    bot_text: str = ""
+    audio_file: Optional[str] = None
+    input_seconds: float = 0.0
+    audio_seconds: float = 0.0
+    first_transcript: Optional[float] = None  # 开始发送到首个ASR结果(s)
+    first_audio: Optional[float] = None  # 最终ASR结果到首包下行音频(s)
+    elapsed: float = 0.0
+    error: Optional[str] = None
+    events: Dict[str, int] = field(default_factory=dict)
+
+
+def read_input_pcm(path: str) -> bytes:
+    """读取WAV并转换为上行音频格式（input_audio_config的采样率、声道数，16bit）"""
+    target = config.input_audio_config
+    with wave.open(path, "rb") as wf:
+        pcm = wf.readframes(wf.getnframes())
+        width, channels, rate = wf.getsampwidth(), wf.getnchannels(), wf.getframerate()
+    if (width, channels, rate) == (2, target["channels"], target["sample_rate"]):
+        return pcm
+    import audioop  # 仅在格式不一致时需要
+    if width != 2:
+        pcm, width = audioop.lin2lin(pcm, width, 2), 2
+    if channels == 2 and target["channels"] == 1:
+        pcm = audioop.tomono(pcm, 2, 0.5, 0.5)
+    elif channels != target["channels"]:
+        raise ValueError(f"不支持的声道数: {channels}")
+    if rate != target["sample_rate"]:
+        pcm, _ = audioop.ratecv(pcm, 2, target["channels"], rate, target["sample_rate"], None)
+    return pcm
+
+
+def write_output_wav(path: str, audio: bytes) -> None:
+    """把下行音频写成16bit WAV，float32输出先截断到[-1, 1]再量化"""
+    output = config.output_audio_config
+    audio = pcm16(audio, output["bit_size"])
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(output["channels"])
+        wf.setsampwidth(2)
+        wf.setframerate(output["sample_rate"])
+        wf.writeframes(audio)
+
+
+class BatchRunner:
+    """把一个目录的WAV文件逐个作为一次对话会话的上行音频，有界并发地批量处理
+
+    每条录音使用独立的DialogSession（独立的WebSocket连接和session id），下行音频经共享的播放线程
+    写入内存而不是声卡；录音发送完并补发trailing_silence秒静音后，等到本轮TTS结束(359)
+    或idle_timeout秒没有下行消息为止。realtime为True时按录音时长实时发送，否则尽快发送。
+    """
+
+    def __init__(self, ws_config: Dict[str, Any], output_dir: str, concurrency: int = 4, realtime: bool = True,
+                 trailing_silence: float = 1.5, idle_timeout: float = 5.0, item_timeout: float = 120.0,
+                 save_audio: bool = True):
+        self.ws_config = ws_config
+        self.output_dir = output_dir
+        self.concurrency = concurrency
+        self.realtime = realtime
+        self.trailing_silence = trailing_silence
+        self.idle_timeout = idle_timeout
+        self.item_timeout = item_timeout
+        self.save_audio = save_audio
+        self.audio_workers = AudioWorkerPool(workers=1)
+        input_config = config.input_audio_config
+        self.bytes_per_second = input_config["sample_rate"] * input_config["channels"] * 2
+        self.chunk_bytes = input_config["chunk"] * input_config["channels"] * 2
+
+    async def run(self, paths: List[str]) -> Dict[str, Any]:
+        os.makedirs(self.output_dir, exist_ok=True)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        started = time.perf_counter()
+
+        async def run_one(path: str) -> BatchResult:
+            async with semaphore:
+                result = await self.run_item(path)
+                status = "失败: " + result.error if result.error else result.transcript
+                print(f"[{result.name}] {result.elapsed:.1f}s {status}")
+                return result
+
+        try:
+            results = await asyncio.gather(*(run_one(path) for path in paths))
+        finally:
+            self.audio_workers.stop()
+        elapsed = time.perf_counter() - started
+        failed = sum(1 for r in results if r.error)
+        summary = {
+            "items": len(results),
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "elapsed": elapsed,
+            "items_per_minute": len(results) / elapsed * 60 if elapsed else 0.0,
+            "concurrency": self.concurrency,
+            "realtime": self.realtime,
+            "input_seconds": sum(r.input_seconds for r in results),
+        }
+        with open(os.path.join(self.output_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump({"summary": summary, "items": [asdict(r) for r in results]}, f, ensure_ascii=False, indent=2)
+        return summary
+
+    async def run_item(self, path: str) -> BatchResult:
+        name = os.path.splitext(os.path.basename(path))[0]
+        result = BatchResult(name=name, source=path)
+        started = time.perf_counter()
+        audio = bytearray()
+        session = DialogSession(self.ws_config, audio_workers=self.audio_workers, output_sink=audio.extend,
+                                use_microphone=False, handle_signals=False)
+        try:
+            pcm = read_input_pcm(path)
+            result.input_seconds = len(pcm) / self.bytes_per_second
+            await asyncio.wait_for(self._converse(session, pcm, result, started), self.item_timeout)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            result.error = f"超过{self.item_timeout}秒未完成"
+        except Exception as e:
+            result.error = str(e) or type(e).__name__
+        finally:
+            await self._finish(session)
+        result.elapsed = time.perf_counter() - started
+        output = config.output_audio_config
+        result.audio_seconds = len(audio) / (output["sample_rate"] * output["channels"]
+                                             * config.sample_width(output["bit_size"]))
+        if audio and self.save_audio:
+            result.audio_file = os.path.join(self.output_dir, f"{name}.wav")
+            write_output_wav(result.audio_file, bytes(audio))
+        with open(os.path.join(self.output_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+            json.dump(asdict(result), f, ensure_ascii=False, indent=2)
+        return result
+
+    async def _converse(self, session: DialogSession, pcm: bytes, result: BatchResult, started: float) -> None:
+        await session.prepare()
+        state = {"final_at": None, "sent": False, "done": asyncio.Event(), "last_message": time.perf_counter()}
+        receiver = asyncio.ensure_future(self._receive(session, result, state, started))
+        try:
+            silence = bytes(int(self.trailing_silence * self.bytes_per_second) // 2 * 2)
+            await self._send_audio(session, pcm + silence)
+            state["sent"] = True
+            while not state["done"].is_set():
+                if receiver.done():
+                    receiver.result()  # 接收出错时抛出
+                    break
+                if time.perf_counter() - state["last_message"] > self.idle_timeout:
+                    break
+                try:
+                    await asyncio.wait_for(state["done"].wait(), 0.1)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            receiver.cancel()
+        # 等共享播放线程写完已收到的音频
+        await session.wait_playback_drained()
+
+    async def _send_audio(self, session: DialogSession, pcm: bytes) -> None:
+        loop = asyncio.get_running_loop()
+        next_send = loop.time()
+        for offset in range(0, len(pcm), self.chunk_bytes):
+            chunk = pcm[offset:offset + self.chunk_bytes]
+            await session.client.task_request(chunk)
+            if self.realtime:
+                next_send += len(chunk) / self.bytes_per_second
+                await asyncio.sleep(max(next_send - loop.time(), 0))
+            else:
+                await asyncio.sleep(0)
+
+    async def _receive(self, session: DialogSession, result: BatchResult, state: Dict[str, Any],
+                       started: float) -> None:
+        while True:
+            response = await session.client.receive_server_response()
+            state["last_message"] = time.perf_counter()
+            event = response.get("event")
+            if event is not None:
+                result.events[str(event)] = result.events.get(str(event), 0) + 1
+            payload = response.get("payload_msg")
+            if response.get("message_type") == "SERVER_ERROR":
+                raise Exception(f"服务器错误: {payload}")
+            if isinstance(payload, bytes):
+                if state["final_at"] is not None and result.first_audio is None:
+                    result.first_audio = time.perf_counter() - state["final_at"]
+                session.audio_queue.put(payload)
+            elif event == 451:
+                for item in payload.get("results", []):
+                    if result.first_transcript is None:
+                        result.first_transcript = time.perf_counter() - started
+                    if item.get("is_interim", False):
+                        result.interim_results += 1
+                    else:
+                        result.transcript += item.get("text", "")
+                        state["final_at"] = time.perf_counter()
+            elif event == 550:
+                result.bot_text += payload.get("content", "")
+            elif event == 359 and state["sent"] and state["final_at"] is not None:
+                state["done"].set()
+
+    @staticmethod
+    async def _finish(session: DialogSession) -> None:
+        """结束会话并关闭连接，失败时只释放本地资源"""
+        try:
+            if session.client.ws is not None and session.client.ws.open:
+                await session.client.finish_session()
+                await session.client.finish_connection()
+        except Exception as e:
+            print(f"结束会话失败: {e}")
+        finally:
+            session.startup.cancel()
+            await session.client.close()
+            session.close_audio_output()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量把WAV录音送入实时对话服务")
+    parser.add_argument("input", help="WAV文件目录（或单个WAV文件）")
+    parser.add_argument("-o", "--output", default="batch_output", help="输出目录")
+    parser.add_argument("-c", "--concurrency", type=int, default=4, help="同时进行的会话数")
+    parser.add_argument("--fast", action="store_true", help="尽快发送音频，不按录音时长实时发送")
+    parser.add_argument("--trailing-silence", type=float, default=1.5, help="录音后补发的静音(s)")
+    parser.add_argument("--idle-timeout", type=float, default=5.0, help="多久没有下行消息视为结束(s)")
+    parser.add_argument("--no-audio", action="store_true", help="不保存TTS音频")
+    args = parser.parse_args()
+
+    if os.path.isdir(args.input):
+        paths = sorted(glob.glob(os.path.join(args.input, "*.wav")))
+    else:
+        paths = [args.input]
+    runner = BatchRunner(config.ws_connect_config, args.output, concurrency=args.concurrency,
+                         realtime=not args.fast, trailing_silence=args.trailing_silence,
+                         idle_timeout=args.idle_timeout, save_audio=not args.no_audio)
+    summary = asyncio.run(runner.run(paths))
+    print(f"完成 {summary['succeeded']}/{summary['items']} 条, 失败 {summary['failed']} 条, "
+          f"耗时 {summary['elapsed']:.1f}s, {summary['items_per_minute']:.1f} 条/分钟")
+    print(f"清单: {os.path.join(args.output, 'manifest.json')}")
+
+
+if __name__ == "__main__":
+    main()
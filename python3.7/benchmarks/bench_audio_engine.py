@@ -0,0 +1,143 @@
+"""每个会话一个播放线程 vs 共享音频引擎：1/100/1000个会话的内存、线程数和CPU
+
+每种方式创建N个DialogSession（不连接服务端），输出写入内存计数：
+- thread: 原有方式，每个会话一个无界queue.Queue和一个播放线程
+- engine: audio_engine.AudioEngine，每个会话一个按字节预算限制的缓冲，一个调度线程
+统计创建后每个会话增加的Python内存(tracemalloc)和RSS、线程数、空闲2秒的CPU时间、
+每个会话放入1秒音频后全部写出的耗时，以及输出卡住时积压的上限（字节预算的作用）和关闭全部会话的耗时。
+最后统计共享声卡时调度线程把N路各1秒音频混音（和float32转16bit）所用的时间。
+用法: python benchmarks/bench_audio_engine.py [--sessions 1 100 1000] [--mix 2 8 32]
+"""
+import argparse
+import array
+import contextlib
+import io
+import os
+import random
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_engine import AudioEngine, mix, pcm16  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+
+OUTPUT = config.output_audio_config
+CHUNK = bytes(OUTPUT["chunk"] * config.sample_width(OUTPUT["bit_size"]))
+CHUNKS_PER_SECOND = OUTPUT["sample_rate"] // OUTPUT["chunk"] + 1
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def wait_until(predicate, timeout: float = 60.0) -> float:
+    start = time.perf_counter()
+    while not predicate() and time.perf_counter() - start < timeout:
+        time.sleep(0.005)
+    return time.perf_counter() - start
+
+
+def measure(design: str, count: int, stall_seconds: float) -> dict:
+    written = [0]
+    stalled = threading.Event()
+
+    def sink(audio: bytes) -> None:
+        while stalled.is_set():
+            time.sleep(0.01)
+        written[0] += len(audio)
+
+    engine = AudioEngine(budget_seconds=5.0) if design == "engine" else None
+    threads, rss = threading.active_count(), rss_bytes()
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sessions = [DialogSession(config.ws_connect_config, output_sink=sink, use_microphone=False,
+                                  handle_signals=False, audio_engine=engine) for _ in range(count)]
+        for session in sessions:
+            session.open_audio_output()
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    result = {"threads": threading.active_count() - threads, "python_kb": python_bytes / count / 1024,
+              "rss_kb": (rss_bytes() - rss) / count / 1024}
+
+    cpu = time.process_time()
+    time.sleep(2.0)
+    result["idle_cpu_ms"] = (time.process_time() - cpu) / 2.0 * 1000
+
+    # 每个会话放入1秒音频，等全部写出
+    target = count * CHUNKS_PER_SECOND * len(CHUNK)
+    cpu = time.process_time()
+    for session in sessions:
+        for _ in range(CHUNKS_PER_SECOND):
+            session.audio_queue.put(CHUNK)
+    result["drain_s"] = wait_until(lambda: written[0] >= target)
+    result["drain_cpu_ms"] = (time.process_time() - cpu) * 1000
+
+    # 输出卡住时持续放入音频：无界队列一直增长，字节预算则封顶
+    stalled.set()
+    time.sleep(0.05)
+    probe = sessions[0]
+    for _ in range(int(stall_seconds * CHUNKS_PER_SECOND)):
+        probe.audio_queue.put(CHUNK)
+    result["backlog_kb"] = probe.audio_queue.qsize() * len(CHUNK) / 1024
+    stalled.clear()
+
+    start = time.perf_counter()
+    for session in sessions:
+        session.is_playing = False
+        session.close_audio_output()
+    for session in sessions:
+        if session.player_thread is not None:
+            session.player_thread.join()
+    if engine is not None:
+        engine.stop()
+    result["teardown_s"] = time.perf_counter() - start
+    return result
+
+
+def measure_mixing(count: int, bit_size: str) -> dict:
+    """count路各1秒音频按设备块大小混音，返回每秒音频的耗时"""
+    rng = random.Random(count)
+    samples = OUTPUT["chunk"]
+    if bit_size == "paFloat32":
+        chunk = array.array("f", (rng.uniform(-0.3, 0.3) for _ in range(samples))).tobytes()
+    else:
+        chunk = array.array("h", (rng.randint(-8000, 8000) for _ in range(samples))).tobytes()
+    chunks = [chunk] * count
+    start = time.perf_counter()
+    for _ in range(CHUNKS_PER_SECOND):
+        mix(chunks, bit_size)
+    mixed = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(CHUNKS_PER_SECOND):
+        pcm16(chunk, bit_size)
+    return {"mix_ms": mixed * 1000, "pcm16_ms": (time.perf_counter() - start) * 1000}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="每个会话一个播放线程 vs 共享音频引擎")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--stall-seconds", type=float, default=60.0, help="输出卡住期间放入的音频时长")
+    parser.add_argument("--mix", type=int, nargs="*", default=[2, 8, 32], help="混音的会话数")
+    args = parser.parse_args()
+    print(f"{'会话':>6} {'方式':<8}{'线程':>6}{'Python/会话(KB)':>16}{'RSS/会话(KB)':>14}{'空闲CPU(ms/s)':>15}"
+          f"{'写出1秒音频(s)':>16}{'积压上限(KB)':>14}{'关闭(s)':>9}")
+    for count in args.sessions:
+        for design in ("thread", "engine"):
+            r = measure(design, count, args.stall_seconds)
+            print(f"{count:>6} {design:<8}{r['threads']:>6}{r['python_kb']:>16.1f}{r['rss_kb']:>14.1f}"
+                  f"{r['idle_cpu_ms']:>15.1f}{r['drain_s']:>16.2f}{r['backlog_kb']:>14.0f}{r['teardown_s']:>9.2f}")
+    if args.mix:
+        print(f"\n{'混音路数':>8} {'格式':<10}{'混音(ms/音频秒)':>16}{'转16bit(ms/音频秒)':>20}")
+        for count in args.mix:
+            for bit_size in ("paFloat32", "paInt16"):
+                r = measure_mixing(count, bit_size)
+                print(f"{count:>8} {bit_size:<10}{r['mix_ms']:>16.2f}{r['pcm16_ms']:>20.2f}")
+
+
+if __name__ == "__main__":
+    main()
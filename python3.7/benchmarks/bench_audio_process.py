@@ -0,0 +1,201 @@
+"""进程内播放线程 vs 独立音频进程：CPU负载下的播放卡顿和采集溢出
+
+用模拟声卡代替PortAudio：输出流按实时速度消耗数据，设备缓冲(--device-buffer秒)放空后下一次写入才到即记一次卡顿；
+输入流按实时速度产生数据，超过设备缓冲时长没有读走即记一次溢出。
+对话进程的事件循环一边以快于实时的速度把TTS音频放入播放队列、一边读麦克风，同时施加CPU负载：
+- loop: 事件循环中周期性地解析大块JSON（持有GIL数十毫秒，模拟耗时的响应处理）
+- loop+threads: 另外再加几个纯Python计算线程
+thread为DialogSession原有的进程内播放线程，process为audio_process.AudioProcess。
+用法: python benchmarks/bench_audio_process.py [--seconds 5] [--device-buffer 0.05] [--json-kb 2048]
+"""
+import argparse
+import asyncio
+import contextlib
+import functools
+import io
+import json
+import os
+import sys
+import threading
+import time
+from multiprocessing.sharedctypes import RawArray
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from audio_process import AudioProcess  # noqa: E402
+
+GLITCHES, GLITCH_SECONDS, WRITES, OVERFLOWS, READS = range(5)
+TOLERANCE = 0.002
+
+
+class FakeOutput:
+    def __init__(self, counters, audio_config, buffer_seconds: float):
+        self.counters = counters
+        self.bytes_per_second = audio_config["sample_rate"] * audio_config["channels"] * config.sample_width(
+            audio_config["bit_size"])
+        self.buffer_seconds = buffer_seconds
+        self.deadline = None  # 设备缓冲放空的时刻
+
+    def write(self, data: bytes) -> None:
+        now = time.perf_counter()
+        if self.deadline is not None and now > self.deadline + TOLERANCE:
+            self.counters[GLITCHES] += 1
+            self.counters[GLITCH_SECONDS] += now - self.deadline
+        self.deadline = max(self.deadline or now, now) + len(data) / self.bytes_per_second
+        self.counters[WRITES] += 1
+        # 阻塞到设备缓冲有空间
+        wait = self.deadline - self.buffer_seconds - time.perf_counter()
+        if wait > 0:
+            time.sleep(wait)
+
+    def stop_stream(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakeInput:
+    def __init__(self, counters, audio_config, buffer_seconds: float):
+        self.counters = counters
+        self.frame_bytes = audio_config["channels"] * config.sample_width(audio_config["bit_size"])
+        self.chunk_seconds = audio_config["chunk"] / audio_config["sample_rate"]
+        self.buffer_seconds = max(buffer_seconds, self.chunk_seconds)
+        self.ready = time.perf_counter() + self.chunk_seconds  # 下一块数据就绪的时刻
+
+    def read(self, num_frames: int, exception_on_overflow: bool = False) -> bytes:
+        now = time.perf_counter()
+        if now > self.ready + self.buffer_seconds:
+            # 设备缓冲被覆盖：丢掉过期的数据
+            self.counters[OVERFLOWS] += 1
+            self.ready = now
+        elif now < self.ready:
+            time.sleep(self.ready - now)
+        self.ready += self.chunk_seconds
+        self.counters[READS] += 1
+        return bytes(num_frames * self.frame_bytes)
+
+    def stop_stream(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class FakeDevice:
+    def __init__(self, counters, buffer_seconds: float, input_config=None, output_config=None):
+        self.counters = counters
+        self.buffer_seconds = buffer_seconds
+        self.input_config = input_config or config.input_audio_config
+        self.output_config = output_config or config.output_audio_config
+
+    def open_output_stream(self) -> FakeOutput:
+        return FakeOutput(self.counters, self.output_config, self.buffer_seconds)
+
+    def open_input_stream(self) -> FakeInput:
+        return FakeInput(self.counters, self.input_config, self.buffer_seconds)
+
+    def cleanup(self) -> None:
+        pass
+
+
+def busy(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(i * i for i in range(2000))
+
+
+async def run_case(design: str, load: str, args) -> dict:
+    counters = RawArray("d", 5)
+    if design == "thread":
+        device = FakeDevice(counters, args.device_buffer)
+        session = DialogSession(config.ws_connect_config, output_sink=device.open_output_stream().write,
+                                use_microphone=False, handle_signals=False)
+        microphone = device.open_input_stream()
+    else:
+        process = AudioProcess(device_factory=functools.partial(FakeDevice, counters, args.device_buffer))
+        session = DialogSession(config.ws_connect_config, use_microphone=False, handle_signals=False,
+                                audio_process=process)
+        microphone = process
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, session.open_audio_output)
+
+    output = config.output_audio_config
+    chunk = bytes(output["chunk"] * config.sample_width(output["bit_size"]))
+    chunk_seconds = output["chunk"] / output["sample_rate"]
+    payload = json.dumps({"results": [{"text": "中能科技" * 16, "is_interim": True}] * (args.json_kb * 16)})
+    stop = threading.Event()
+    threads = [threading.Thread(target=busy, args=(stop,), daemon=True)
+               for _ in range(args.threads if load == "loop+threads" else 0)]
+    for thread in threads:
+        thread.start()
+
+    async def network() -> None:
+        # 服务端以4倍实时速度下发音频（合成快于实时），播放队列最多积压16块
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            session.audio_queue.put(chunk)
+            await asyncio.sleep(chunk_seconds / 4)
+            while session.audio_queue.qsize() > 16:
+                await asyncio.sleep(chunk_seconds / 4)
+
+    async def handlers() -> None:
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            if load != "none":
+                json.loads(payload)
+            await asyncio.sleep(0.05)
+
+    async def capture() -> None:
+        deadline = time.perf_counter() + args.seconds
+        read = functools.partial(microphone.read, config.input_audio_config["chunk"], exception_on_overflow=False)
+        while time.perf_counter() < deadline:
+            await loop.run_in_executor(None, read)
+
+    started = time.perf_counter()
+    await asyncio.gather(network(), handlers(), capture())
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+    session.is_playing = False
+    stats = process.stats() if design == "process" else {}
+    session.close_audio_output()
+    if session.player_thread is not None:
+        session.player_thread.join(timeout=2.0)
+    return {"elapsed": elapsed, "glitches": int(counters[GLITCHES]), "glitch_ms": counters[GLITCH_SECONDS] * 1000,
+            "writes": int(counters[WRITES]), "overflows": int(counters[OVERFLOWS]), "reads": int(counters[READS]),
+            "worker": stats}
+
+
+def json_hold_ms(json_kb: int) -> float:
+    payload = json.dumps({"results": [{"text": "中能科技" * 16, "is_interim": True}] * (json_kb * 16)})
+    start = time.perf_counter()
+    json.loads(payload)
+    return (time.perf_counter() - start) * 1000
+
+
+async def run(args) -> None:
+    print(f"设备缓冲 {args.device_buffer * 1000:.0f}ms, 每50ms解析一次JSON（单次持有GIL约"
+          f"{json_hold_ms(args.json_kb):.0f}ms）, 计算线程 {args.threads} 个, 每项 {args.seconds:.0f}秒")
+    print(f"{'负载':<14}{'设计':<9}{'写入块':>7}{'卡顿':>6}{'卡顿时长(ms)':>13}{'读取块':>8}{'采集溢出':>9}")
+    for load in ("none", "loop", "loop+threads"):
+        for design in ("thread", "process"):
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = await run_case(design, load, args)
+            print(f"{load:<14}{design:<9}{result['writes']:>7}{result['glitches']:>6}{result['glitch_ms']:>13.0f}"
+                  f"{result['reads']:>8}{result['overflows']:>9}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="进程内播放线程 vs 独立音频进程")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--device-buffer", type=float, default=0.05, help="模拟声卡的缓冲时长（秒）")
+    parser.add_argument("--json-kb", type=int, default=2048, help="每次解析的JSON大小（约KB）")
+    parser.add_argument("--threads", type=int, default=2, help="loop+threads负载下的计算线程数")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
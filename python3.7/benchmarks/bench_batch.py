@@ -0,0 +1,74 @@
+"""批量模式吞吐：本地对话服务上处理一批合成录音，对比实时/尽快发送和不同并发数的每分钟条数
+用法: python benchmarks/bench_batch.py [--items 16] [--seconds 2.0] [--concurrency 1 8]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import struct
+import sys
+import tempfile
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from batch_dialog import BatchRunner  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+
+REPLY = "好的，我们继续讨论中能科技的出海策略。"
+
+
+def make_inputs(directory: str, items: int, seconds: float) -> list:
+    """生成items条指定时长的正弦波录音（44.1kHz双声道，测试格式转换）"""
+    paths = []
+    rate = 44100
+    for i in range(items):
+        path = os.path.join(directory, f"utt_{i:03d}.wav")
+        samples = int(rate * seconds)
+        frames = b"".join(struct.pack("<hh", v, v) for v in
+                          (int(8000 * math.sin(2 * math.pi * 220 * n / rate)) for n in range(samples)))
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(2)
+            wf.setsampwidth(2)
+            wf.setframerate(rate)
+            wf.writeframes(frames)
+        paths.append(path)
+    return paths
+
+
+async def run(paths: list, output: str, concurrency: int, realtime: bool) -> dict:
+    server = LocalDialogServer(native_reply=REPLY)
+    ws_config = {**config.ws_connect_config, "base_url": await server.start()}
+    try:
+        runner = BatchRunner(ws_config, output, concurrency=concurrency, realtime=realtime, trailing_silence=0.5)
+        return await runner.run(paths)
+    finally:
+        await server.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="批量模式吞吐")
+    parser.add_argument("--items", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=2.0, help="每条录音的时长(s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    paths = make_inputs(workdir, args.items, args.seconds)
+    print(f"{args.items}条录音, 每条{args.seconds}s")
+    print(f"{'发送方式':<8}{'并发':>4}{'成功':>6}{'耗时(s)':>10}{'条/分钟':>10}")
+    for realtime in (True, False):
+        for concurrency in args.concurrency:
+            output = os.path.join(workdir, f"out_{'rt' if realtime else 'fast'}_{concurrency}")
+            with contextlib.redirect_stdout(io.StringIO()):
+                summary = asyncio.run(run(paths, output, concurrency, realtime))
+            print(f"{'实时' if realtime else '尽快':<8}{concurrency:>4}{summary['succeeded']:>6}"
+                  f"{summary['elapsed']:>10.2f}{summary['items_per_minute']:>10.1f}")
+    print(f"输出目录: {workdir}")
+
+
+if __name__ == "__main__":
+    main()
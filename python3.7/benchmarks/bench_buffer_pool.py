@@ -0,0 +1,119 @@
+"""下行音频缓冲池：稳态下每秒音频的分配次数、GC次数和CPU
+
+N个DialogSession（不连接服务端）共用两个播放线程(AudioWorkerPool)，输出写入内存计数。
+主线程按 接收帧 -> parse_response -> handle_server_response -> 播放队列 的路径灌入下行音频
+（24kHz float32，每帧3200个采样 = 12800字节），每个会话的队列积压超过8块时等待播放线程：
+- slice: 原来的方式，每帧从消息中切片出新的bytes
+- pool: 会话共用一个buffer_pool.BufferPool，负载复制进池中的缓冲，写出后归还
+WebSocket库为每条消息分配的bytes两种方式相同，不计入。
+统计每秒音频新分配的负载缓冲数、GC次数和耗时、CPU，以及缓冲池的命中率。
+用法: python benchmarks/bench_buffer_pool.py [--sessions 1 20] [--seconds 120]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import protocol  # noqa: E402
+from audio_manager import AudioWorkerPool, DialogSession  # noqa: E402
+from buffer_pool import BufferPool, PooledBuffer  # noqa: E402
+
+OUTPUT = config.output_audio_config
+CHUNK_BYTES = OUTPUT["chunk"] * config.sample_width(OUTPUT["bit_size"])
+CHUNK_SECONDS = OUTPUT["chunk"] / OUTPUT["sample_rate"]
+MAX_QUEUED = 8
+
+
+class GCTimer:
+    """用gc.callbacks统计各代的回收次数和总耗时"""
+
+    def __init__(self):
+        self.collections = [0, 0, 0]
+        self.seconds = 0.0
+        self._start = 0.0
+
+    def __call__(self, phase: str, info: dict) -> None:
+        if phase == "start":
+            self._start = time.perf_counter()
+        else:
+            self.seconds += time.perf_counter() - self._start
+            self.collections[info["generation"]] += 1
+
+
+def measure(design: str, count: int, seconds: float) -> dict:
+    written = [0]
+    lock = threading.Lock()
+
+    def sink(audio) -> None:
+        with lock:
+            written[0] += len(audio)
+
+    pool = BufferPool(name=f"bench-{count}") if design == "pool" else None
+    workers = AudioWorkerPool(workers=2, idle_wait=0.001)
+    with contextlib.redirect_stdout(io.StringIO()):
+        sessions = [DialogSession(config.ws_connect_config, audio_workers=workers, output_sink=sink,
+                                  use_microphone=False, handle_signals=False, buffer_pool=pool)
+                    for _ in range(count)]
+        for session in sessions:
+            session.open_audio_output()
+    frames = [protocol.build_frame(352, bytes(range(256)) * (CHUNK_BYTES // 256), session.session_id,
+                                   message_type=protocol.SERVER_ACK, serial_method=protocol.NO_SERIALIZATION,
+                                   compression_type=protocol.NO_COMPRESSION) for session in sessions]
+    per_session = int(seconds / CHUNK_SECONDS)
+    timer = GCTimer()
+    gc.collect()
+    gc.callbacks.append(timer)
+    allocated = 0
+    cpu, start = time.process_time(), time.perf_counter()
+    for _ in range(per_session):
+        for session, frame in zip(sessions, frames):
+            while session.audio_queue.qsize() >= MAX_QUEUED:
+                time.sleep(0.0005)
+            response = protocol.parse_response(frame, pool)
+            if type(response["payload_msg"]) is not PooledBuffer:
+                allocated += 1
+            session.track_playback(response)
+            session.handle_server_response(response)
+    target = per_session * count * CHUNK_BYTES
+    while written[0] < target and time.perf_counter() - start < 60:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    gc.callbacks.remove(timer)
+    workers.stop()
+    audio_seconds = per_session * count * CHUNK_SECONDS
+    report = pool.report() if pool is not None else {}
+    if pool is not None:
+        allocated = report["allocated"] + report["oversize"]
+    return {"audio_seconds": audio_seconds, "elapsed": elapsed, "complete": written[0] >= target,
+            "allocs": allocated / audio_seconds, "gc": [c / audio_seconds for c in timer.collections],
+            "gc_ms": timer.seconds * 1000 / audio_seconds, "cpu_ms": cpu * 1000 / audio_seconds,
+            "total_allocs": allocated, "hit_rate": report.get("hit_rate"), "free": report.get("free")}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="下行音频缓冲池")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 20])
+    parser.add_argument("--seconds", type=float, default=120.0, help="每个会话灌入的音频时长")
+    args = parser.parse_args()
+    print(f"每帧 {CHUNK_BYTES} 字节 ({CHUNK_SECONDS * 1000:.0f}ms 音频), 每个会话 {args.seconds:.0f} 秒音频")
+    print(f"{'会话':>5} {'方式':<7}{'负载分配/音频秒':>16}{'分配总数':>10}{'GC次数/音频秒(0/1/2代)':>26}"
+          f"{'GC耗时(ms/音频秒)':>19}{'CPU(ms/音频秒)':>16}{'命中率':>8}")
+    for count in args.sessions:
+        for design in ("slice", "pool"):
+            r = measure(design, count, args.seconds)
+            gcs = "/".join(f"{c:.2f}" for c in r["gc"])
+            hit = f"{r['hit_rate']:.1%}" if r["hit_rate"] is not None else "-"
+            print(f"{count:>5} {design:<7}{r['allocs']:>16.2f}{r['total_allocs']:>10}{gcs:>26}"
+                  f"{r['gc_ms']:>19.3f}{r['cpu_ms']:>16.2f}{hit:>8}" + ("" if r["complete"] else "  (未写完)"))
+
+
+if __name__ == "__main__":
+    main()
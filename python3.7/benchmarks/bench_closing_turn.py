@@ -0,0 +1,122 @@
+"""收尾轮次耗时：学员最后一次回答到培训总结首段TTS发出
+
+对比三种流程：
+- 原流程：检测到最后一轮后固定等待3秒，再按完整对话同步生成总结
+- 滚动总结：每轮问答结束后在后台把本轮对话增量合并进总结，收尾时只合并最后一轮问答（整段发送）
+- 滚动总结+流式：收尾的增量合并边生成边发送TTS
+模拟后端的总结调用耗时固定为summary_latency（流式时首个增量在summary_ttft后到达），
+同时统计每个会话的总结调用次数和平均prompt token数。学员每轮作答间隔answer_gap秒，
+小于summary_latency时后台的增量合并跟不上，收尾要先等它完成。
+用法: python benchmarks/bench_closing_turn.py [--rounds 6] [--summary-latency 2.0] [--summary-ttft 0.4] [--answer-gap 3.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from conversation_memory import message_tokens  # noqa: E402
+from llm_backend import LLMBackend, LLMResult  # noqa: E402
+
+REPLY = "很好，请结合中能科技的属地化策略继续分析。"
+SUMMARY = "学员对出海战略的理解较为全面。能够结合中能科技的调研和属地化管理分析案例。建议继续加强风险评估。"
+LEGACY_WAIT = 3.0
+
+
+class SlowSummaryBackend(LLMBackend):
+    """回复延迟固定，培训总结延迟较长的模拟后端"""
+
+    def __init__(self, reply_latency: float, summary_latency: float, summary_ttft: float):
+        self.reply_latency = reply_latency
+        self.summary_latency = summary_latency
+        self.summary_ttft = summary_ttft
+        self.summary_prompts = []  # 每次总结调用的prompt token数
+
+    def _is_summary(self, messages) -> bool:
+        if "总结评价" not in messages[-1]["content"]:
+            return False
+        self.summary_prompts.append(message_tokens(messages))
+        return True
+
+    async def complete(self, messages, **params):
+        if self._is_summary(messages):
+            await asyncio.sleep(self.summary_latency)
+            return LLMResult(text=SUMMARY)
+        await asyncio.sleep(self.reply_latency)
+        return LLMResult(text=REPLY)
+
+    async def stream(self, messages, **params):
+        if not self._is_summary(messages):
+            await asyncio.sleep(self.reply_latency)
+            yield REPLY
+            return
+        await asyncio.sleep(self.summary_ttft)
+        pieces = [SUMMARY[i:i + 4] for i in range(0, len(SUMMARY), 4)]
+        for piece in pieces:
+            yield piece
+            await asyncio.sleep((self.summary_latency - self.summary_ttft) / len(pieces))
+
+
+class RecordingClient:
+    def __init__(self):
+        self.frames = []
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        self.frames.append((time.perf_counter(), content, start, end))
+
+
+async def run(mode: str, rounds: int, reply_latency: float, summary_latency: float, summary_ttft: float,
+              answer_gap: float) -> dict:
+    backend = SlowSummaryBackend(reply_latency, summary_latency, summary_ttft)
+    manager = ConfigurableTrainingManager(
+        config.ws_connect_config,
+        {"use_gpt4o": True, "enable_gpt4o_logging": False, "enable_response_cache": False,
+         "precompute_summary": mode != "legacy", "stream_tts": mode == "stream", "max_rounds": rounds},
+        llm_backend=backend,
+    )
+    client = RecordingClient()
+    manager.session.client = client
+    for _ in range(rounds - 1):
+        await manager.process_user_input_with_gpt4o("我认为要先评估自身条件", time.perf_counter())
+        await asyncio.sleep(answer_gap)  # 学员听完回复、思考并作答的间隔
+
+    # 最后一轮：与start_configurable_session中的收尾逻辑一致
+    last_answer = time.perf_counter()
+    manager.turns.start(manager.process_user_input_with_gpt4o("我认为要先评估自身条件", last_answer))
+    if mode != "legacy":
+        await manager.wait_for_current_reply()
+    else:
+        await asyncio.sleep(LEGACY_WAIT)
+    await manager.send_training_summary()
+    summary_first = next(t for t, content, start, _ in client.frames if content.startswith("培训总结") and start)
+    prompts = backend.summary_prompts
+    return {"closing": summary_first - last_answer, "calls": len(prompts),
+            "prompt_tokens": sum(prompts) / len(prompts) if prompts else 0}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="收尾轮次静默时间基准")
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--reply-latency", type=float, default=0.3)
+    parser.add_argument("--summary-latency", type=float, default=2.0)
+    parser.add_argument("--summary-ttft", type=float, default=0.4)
+    parser.add_argument("--answer-gap", type=float, default=3.0, help="每轮回复结束到学员下一次回答的间隔")
+    args = parser.parse_args()
+
+    print(f"{'流程':<28}{'最后回答->总结首段(s)':>20}{'总结调用次数':>12}{'平均prompt token':>18}")
+    for mode, name in (("legacy", f"原流程（等待{LEGACY_WAIT:.0f}秒+完整生成）"), ("full", "滚动总结"),
+                       ("stream", "滚动总结+流式")):
+        with contextlib.redirect_stdout(io.StringIO()):
+            r = asyncio.run(run(mode, args.rounds, args.reply_latency, args.summary_latency, args.summary_ttft,
+                                args.answer_gap))
+        print(f"{name:<28}{r['closing']:>20.3f}{r['calls']:>12}{r['prompt_tokens']:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
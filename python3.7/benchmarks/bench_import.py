@@ -0,0 +1,64 @@
+"""无音频设备(headless)进程的模块导入耗时基准
+
+每个模块在全新的解释器中导入，统计耗时中位数，并检查导入后是否加载了pyaudio/openai。
+用法: python benchmarks/bench_import.py [--repeat 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ["config", "protocol", "realtime_dialog_client", "audio_manager", "configurable_training_manager"]
+HEAVY_MODULES = ["pyaudio", "openai"]
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"elapsed": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure(module: str, repeat: int) -> dict:
+    """在子进程中重复导入模块并收集结果"""
+    samples, heavy, error = [], set(), None
+    for _ in range(repeat):
+        proc = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=PROJECT_DIR, capture_output=True, text=True
+        )
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1]
+            break
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        samples.append(result["elapsed"])
+        heavy.update(result["heavy"])
+    return {
+        "module": module,
+        "median_ms": statistics.median(samples) * 1000 if samples else None,
+        "heavy_imports": sorted(heavy),
+        "error": error,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="模块导入耗时基准")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'模块':<32}{'导入耗时(ms)':>14}  重量级依赖")
+    for module in MODULES:
+        result = measure(module, args.repeat)
+        if result["error"]:
+            print(f"{module:<32}{'导入失败':>14}  {result['error']}")
+            continue
+        heavy = ", ".join(result["heavy_imports"]) or "无"
+        print(f"{module:<32}{result['median_ms']:>14.2f}  {heavy}")
+
+
+if __name__ == "__main__":
+    main()
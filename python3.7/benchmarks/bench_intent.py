@@ -0,0 +1,132 @@
+"""控制意图识别基准
+
+1. 匹配开销：原is_end_command的逐个子串查找 vs 编译后的Aho-Corasick匹配器，短语数从默认的11个增加到数百个
+2. 提前生效：按ASR中间结果逐字到达的节奏回放学员的话，统计控制意图在中间结果上生效比等最终结果提前的时间，
+   以及普通回答被中间结果误触发的次数
+用法: python benchmarks/bench_intent.py [--char-interval 0.12] [--endpoint 0.6]
+"""
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from intent import IntentMatcher, IntentTracker  # noqa: E402
+
+COMMANDS = [
+    ("end", "结束培训吧"), ("end", "好的，再见！"), ("end", "结束对话"), ("end", "我想结束了"),
+    ("end", "bye"), ("skip", "跳过这个问题"), ("skip", "下一题"), ("skip", "换个问题吧"),
+]
+ANSWERS = [
+    "我觉得不应该结束这个项目的讨论，而是继续分析德国市场",
+    "中能科技选择德国是因为当地政策支持新能源",
+    "他们没有停止投入，反而加大了本地研发",
+    "属地化管理可以帮助企业融入当地文化",
+    "下一步应该考虑人才招聘和供应链的风险",
+    "退出机制也是海外投资必须提前设计的",
+]
+
+
+def legacy_is_end_command(text: str, commands) -> bool:
+    text = text.lower().strip()
+    return any(cmd in text for cmd in commands)
+
+
+def synthetic_phrases(count: int, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    alphabet = "结束培训会话对话停止退出再见跳过下一题换个问题请帮我现在马上"
+    return ["".join(rng.choice(alphabet) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+def default_intents() -> dict:
+    """ConfigurableTrainingManager默认配置中的控制意图"""
+    session = DialogSession(config.ws_connect_config, use_microphone=False, handle_signals=False)
+    manager = ConfigurableTrainingManager(config.ws_connect_config, {"llm_backend": "scripted"}, session=session)
+    return manager.config["intents"]
+
+
+def bench_matching(texts: list, end_phrases: list, phrase_counts=(0, 100, 500)) -> None:
+    print(f"{'短语数':>6}{'逐个查找(us/句)':>18}{'AC匹配(us/句)':>16}")
+    for extra in phrase_counts:
+        phrases = end_phrases + synthetic_phrases(extra)
+        matcher = IntentMatcher.from_config({"end": {"phrases": phrases}})
+        rounds = max(2000 // len(texts), 1)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                legacy_is_end_command(text, phrases)
+        legacy = (time.perf_counter() - start) / (rounds * len(texts)) * 1e6
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                matcher.match(text)
+        compiled = (time.perf_counter() - start) / (rounds * len(texts)) * 1e6
+        print(f"{len(phrases):>6}{legacy:>18.1f}{compiled:>16.1f}")
+
+
+def replay(tracker: IntentTracker, text: str, char_interval: float, endpoint: float):
+    """回放一句话：第i个字在i*char_interval时出现在中间结果里，说完后endpoint秒到达最终结果
+
+    返回(中间结果上触发的意图及时刻, 最终结果上的意图, 最终结果时刻)
+    """
+    fired = None
+    for i in range(1, len(text) + 1):
+        match = tracker.on_interim(text[:i])
+        if match is not None:
+            fired = (match, i * char_interval)
+            break
+    final, _ = tracker.on_final(text)
+    return fired, (None if fired else final), len(text) * char_interval + endpoint
+
+
+def run_replay(intents: dict, char_interval: float, endpoint: float, verbose: bool) -> tuple:
+    tracker = IntentTracker(IntentMatcher.from_config(intents))
+    saved, false_positives, missed = [], 0, 0
+    for expected, text in COMMANDS + [(None, text) for text in ANSWERS]:
+        fired, final, final_at = replay(tracker, text, char_interval, endpoint)
+        gain = final_at - fired[1] if fired else 0.0
+        if fired and fired[0].name != expected:
+            false_positives += 1
+        elif fired:
+            saved.append(gain)
+        elif expected is not None:
+            missed += 1
+        if verbose:
+            print(f"{text:<28}{expected or '-':>6}{fired[0].name if fired else '-':>12}"
+                  f"{final.name if final else '-':>8}{gain:>8.2f}")
+    return saved, missed, false_positives
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="控制意图识别基准")
+    parser.add_argument("--char-interval", type=float, default=0.12, help="中间结果每个字的到达间隔(s)")
+    parser.add_argument("--endpoint", type=float, default=0.6, help="说完到最终结果的端点检测延迟(s)")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        intents = default_intents()
+    bench_matching([text for _, text in COMMANDS] + ANSWERS, list(intents["end"]["phrases"]))
+
+    print(f"\n中间结果每字{args.char_interval}s, 端点检测{args.endpoint}s（默认配置）")
+    print(f"{'文本':<28}{'期望':>6}{'中间结果触发':>12}{'仅最终结果':>8}{'提前(s)':>8}")
+    run_replay(intents, args.char_interval, args.endpoint, verbose=True)
+
+    print(f"\n{'中间结果门限':>10}{'连续结果数':>8}{'中间结果生效':>10}{'平均提前(s)':>12}{'误触发':>6}")
+    for confidence in (0.5, 0.6):
+        for stable in (1, 2, 3):
+            variant = {name: {**options, "interim_confidence": confidence, "interim_stable": stable}
+                       for name, options in intents.items()}
+            saved, missed, false_positives = run_replay(variant, args.char_interval, args.endpoint, verbose=False)
+            avg = sum(saved) / len(saved) if saved else 0.0
+            print(f"{confidence:>14}{stable:>12}{len(saved):>10}/{len(COMMANDS)}{avg:>14.2f}{false_positives:>8}")
+
+
+if __name__ == "__main__":
+    main()
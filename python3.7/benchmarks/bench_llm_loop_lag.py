@@ -0,0 +1,118 @@
+"""LLM生成期间的事件循环延迟基准
+
+对比三种LLM调用方式在生成回复时事件循环的最大延迟：
+- blocking: 协程中直接调用同步接口（改造前的实现方式）
+- executor: ExecutorLLMBackend，同步接口放到线程池执行
+- async:    StubLLMBackend，纯异步后端
+用法: python benchmarks/bench_llm_loop_lag.py [--latency 0.5] [--check]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from llm_backend import LLMBackend, LLMResult, ExecutorLLMBackend, StubLLMBackend  # noqa: E402
+
+REPLY = "很好的思考！中能科技在出海前做了充分的市场调研，请您进一步分析他们为什么选择德国作为首个落脚点？"
+
+
+class BlockingBackend(LLMBackend):
+    """模拟改造前的行为：在协程中执行同步调用"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def complete(self, messages, **params):
+        time.sleep(self.latency)
+        return LLMResult(text=REPLY, total_tokens=len(REPLY))
+
+
+def fake_create(latency: float):
+    """返回模拟同步chat.completions.create的函数"""
+    def create(**kwargs):
+        time.sleep(latency)
+        message = SimpleNamespace(content=REPLY)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)],
+                               usage=SimpleNamespace(total_tokens=len(REPLY)))
+    return create
+
+
+async def measure_lag(manager: ConfigurableTrainingManager, interval: float = 0.01) -> dict:
+    """生成一轮回复，同时以固定间隔检测事件循环延迟"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    tick_task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    text = await manager.generate_gpt4o_response("企业出海首先要分析自身条件")
+    elapsed = time.perf_counter() - start
+    done.set()
+    await tick_task
+    return {"elapsed": elapsed, "max_lag": max(lags) if lags else elapsed, "ticks": len(lags), "ok": text == REPLY}
+
+
+def build_manager(backend: LLMBackend, timeout: float = 30.0) -> ConfigurableTrainingManager:
+    training_config = {
+        "use_gpt4o": True,
+        "enable_gpt4o_logging": False,
+        "llm_timeout": timeout,
+    }
+    return ConfigurableTrainingManager(config.ws_connect_config, training_config, llm_backend=backend)
+
+
+async def run(latency: float) -> dict:
+    backends = {
+        "blocking": BlockingBackend(latency),
+        "executor": ExecutorLLMBackend(fake_create(latency), model="stub"),
+        "async": StubLLMBackend(reply=REPLY, latency=latency),
+    }
+    results = {}
+    for name, backend in backends.items():
+        results[name] = await measure_lag(build_manager(backend))
+
+    # 超时：后端延迟超过llm_timeout时应快速返回备用回复
+    manager = build_manager(StubLLMBackend(reply=REPLY, latency=latency), timeout=latency / 5)
+    start = time.perf_counter()
+    await manager.generate_gpt4o_response("测试超时")
+    results["timeout_return"] = time.perf_counter() - start
+    results["timeout_stats"] = dict(manager.llm.stats)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="LLM生成期间的事件循环延迟基准")
+    parser.add_argument("--latency", type=float, default=0.5, help="模拟的LLM调用耗时（秒）")
+    parser.add_argument("--max-lag", type=float, default=0.05, help="--check模式下允许的最大循环延迟（秒）")
+    parser.add_argument("--check", action="store_true", help="非阻塞后端延迟超标时返回非零退出码")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args.latency))
+    print(f"{'模式':<10}{'生成耗时(s)':>12}{'最大循环延迟(ms)':>18}{'tick数':>8}")
+    for name in ("blocking", "executor", "async"):
+        r = results[name]
+        print(f"{name:<10}{r['elapsed']:>12.3f}{r['max_lag'] * 1000:>18.1f}{r['ticks']:>8}")
+    print(f"超时返回耗时: {results['timeout_return']:.3f}s, 统计: {results['timeout_stats']}")
+
+    if args.check:
+        failed = [name for name in ("executor", "async")
+                  if results[name]["max_lag"] > args.max_lag or not results[name]["ok"]]
+        if failed or results["timeout_stats"]["timeouts"] != 1:
+            print(f"检查失败: {failed or 'timeout'}")
+            sys.exit(1)
+        print("检查通过")
+
+
+if __name__ == "__main__":
+    main()
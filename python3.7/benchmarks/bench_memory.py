@@ -0,0 +1,95 @@
+"""长会话下每轮请求的prompt token数与生成延迟
+
+模拟后端的首token延迟随prompt长度线性增长（base + per_token * prompt_tokens），
+对比开启/关闭对话记忆(ConversationMemory)时，每轮讲师回复请求的估算token数和首段TTS延迟。
+用法: python benchmarks/bench_memory.py [--turns 30] [--budget 1200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from conversation_memory import message_tokens  # noqa: E402
+from llm_backend import LLMBackend, LLMResult  # noqa: E402
+
+REPLY = ("您的分析很有见地。中能科技在进入德国之前，先通过国际咨询公司厘清了政策环境和竞争格局，"
+         "又在商务谈判中锁定了土地和配套成本，这体现了对外部风险的系统评估。请您进一步思考："
+         "属地化管理和与当地政府建立信任，对企业长期经营分别起到了什么作用？")
+ANSWER = "我认为中能科技先评估了自己的技术优势和资金实力，再结合欧洲的政策支持决定出海，这样风险更可控。"
+
+
+class PromptCostBackend(LLMBackend):
+    """延迟随prompt token数增长的模拟后端"""
+
+    def __init__(self, base: float, per_token: float):
+        self.base = base
+        self.per_token = per_token
+        self.summary_calls = 0
+
+    async def _wait(self, messages):
+        await asyncio.sleep(self.base + self.per_token * message_tokens(messages))
+
+    async def complete(self, messages, **params):
+        await self._wait(messages)
+        if messages[0]["content"].startswith("你是培训对话记录员"):
+            self.summary_calls += 1
+            return LLMResult(text="学员依次分析了市场饱和、自身条件、政策支持和属地化，讲师引导其结合案例深入。")
+        return LLMResult(text=REPLY)
+
+    async def stream(self, messages, **params):
+        await self._wait(messages)
+        for i in range(0, len(REPLY), 4):
+            yield REPLY[i:i + 4]
+
+
+class NullClient:
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        pass
+
+
+async def run(memory: bool, turns: int, budget: int, base: float, per_token: float) -> dict:
+    backend = PromptCostBackend(base, per_token)
+    manager = ConfigurableTrainingManager(
+        config.ws_connect_config,
+        {"use_gpt4o": True, "enable_gpt4o_logging": False, "enable_response_cache": False,
+         "enable_conversation_memory": memory, "memory_token_budget": budget, "max_rounds": turns},
+        llm_backend=backend,
+    )
+    manager.session.client = NullClient()
+    for _ in range(turns):
+        await manager.process_user_input_with_gpt4o(ANSWER, time.perf_counter())
+    summary_start = time.perf_counter()
+    await manager.generate_training_summary()
+    return {
+        "turns": manager.turn_latencies,
+        "summary_time": time.perf_counter() - summary_start,
+        "summary_calls": backend.summary_calls,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="长会话prompt token数与延迟基准")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--budget", type=int, default=1200)
+    parser.add_argument("--base", type=float, default=0.05, help="模拟首token基础延迟（秒）")
+    parser.add_argument("--per-token", type=float, default=0.0001, help="每个prompt token增加的延迟（秒）")
+    args = parser.parse_args()
+
+    legacy = asyncio.run(run(False, args.turns, args.budget, args.base, args.per_token))
+    memory = asyncio.run(run(True, args.turns, args.budget, args.base, args.per_token))
+    print(f"{'轮次':>4}{'原实现token':>12}{'原实现延迟(s)':>14}{'记忆token':>10}{'记忆延迟(s)':>12}")
+    for old, new in zip(legacy["turns"], memory["turns"]):
+        if old["round"] in (1, 2, 5) or old["round"] % 10 == 0 or old["round"] == args.turns:
+            print(f"{old['round']:>4}{old['prompt_tokens']:>12}{old['first_tts']:>14.3f}"
+                  f"{new['prompt_tokens']:>10}{new['first_tts']:>12.3f}")
+    print(f"最终总结生成耗时: 原实现 {legacy['summary_time']:.3f}s, 记忆 {memory['summary_time']:.3f}s")
+    print(f"后台摘要调用次数: {memory['summary_calls']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""指标开销与抓取：
+
+1. 本地对话服务跑一遍会话后通过HTTP抓取/metrics，输出抓取耗时和主要指标
+2. 每帧的统计开销：收帧计数(frame_info + 帧数/字节数计数器) + 解码耗时直方图，对比未统计的解码耗时
+用法: python benchmarks/bench_metrics.py [--frames 20000] [--sessions 500]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import metrics  # noqa: E402
+import protocol  # noqa: E402
+import realtime_dialog_client  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+
+AUDIO_FRAME = protocol.build_frame(352, bytes(12800), "s" * 36, message_type=protocol.SERVER_ACK,
+                                   serial_method=protocol.NO_SERIALIZATION, compression_type=protocol.NO_COMPRESSION)
+ASR_FRAME = protocol.build_frame(451, {"results": [{"text": "中能科技选择德国是因为当地政策支持新能源", "is_interim": False}]},
+                                 "s" * 36, message_type=protocol.SERVER_FULL_RESPONSE)
+
+
+def per_frame(function, frame: bytes, count: int) -> float:
+    start = time.perf_counter()
+    for _ in range(count):
+        function(frame)
+    return (time.perf_counter() - start) / count * 1e6
+
+
+def instrumented(frame: bytes) -> None:
+    realtime_dialog_client._count_frame("in", frame)
+    protocol.parse_response(frame)
+
+
+async def run_session() -> str:
+    server = LocalDialogServer(utterances=LocalDialogServer().utterances[:3])
+    ws_config = {**config.ws_connect_config, "base_url": await server.start()}
+    session = DialogSession(ws_config, output_sink=lambda audio: None, use_microphone=False, handle_signals=False)
+    manager = ConfigurableTrainingManager(
+        ws_config, {"use_gpt4o": True, "enable_round_control": False, "enable_response_cache": False,
+                    "llm_backend": "scripted", "metrics_port": 0}, session=session)
+    task = asyncio.ensure_future(manager.start_configurable_session())
+    frame = bytes(config.input_audio_config["chunk"] * 2)
+    try:
+        while session.client.ws is None or not session.client.ws.open:
+            await asyncio.sleep(0.01)
+        while not (len(server.turns) == len(server.utterances) and server.turns[-1]["tts_end"]):
+            await session.client.task_request(frame)
+            await asyncio.sleep(0.02)
+    finally:
+        session.is_running = False
+        await asyncio.gather(task, return_exceptions=True)
+        await session.client.close()
+        session.close_audio_output()
+        await server.stop()
+    return metrics.serve(0).url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="指标开销与抓取")
+    parser.add_argument("--frames", type=int, default=20000)
+    parser.add_argument("--sessions", type=int, default=500, help="估算CPU占用时的并发会话数")
+    parser.add_argument("--frame-rate", type=float, default=30.0, help="每个会话每秒收发的帧数")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        url = asyncio.run(run_session())
+    start = time.perf_counter()
+    body = urllib.request.urlopen(url).read().decode("utf-8")
+    elapsed = time.perf_counter() - start
+    lines = [line for line in body.splitlines() if not line.startswith("#")]
+    print(f"抓取 {url}: {len(lines)} 个样本, {len(body)} 字节, {elapsed * 1000:.1f}ms")
+    for line in lines:
+        if ("_bucket" not in line and line.split("{")[0].split(" ")[0].endswith(("_total", "_count", "_bytes",
+                                                                                   "_chunks", "sessions"))):
+            print(f"  {line}")
+
+    print(f"\n{'帧':<8}{'解码(us)':>10}{'解码+统计(us)':>16}{'统计开销(us)':>14}")
+    overhead = 0.0
+    for name, frame in (("音频", AUDIO_FRAME), ("ASR结果", ASR_FRAME)):
+        raw = per_frame(protocol._parse_response, frame, args.frames)
+        total = per_frame(instrumented, frame, args.frames)
+        overhead = max(overhead, total - raw)
+        print(f"{name:<8}{raw:>10.2f}{total:>16.2f}{total - raw:>14.2f}")
+    cpu = overhead * 1e-6 * args.frame_rate * args.sessions
+    print(f"{args.sessions}个会话 x {args.frame_rate}帧/s 的统计开销约占 {cpu * 100:.2f}% 单核")
+
+
+if __name__ == "__main__":
+    main()
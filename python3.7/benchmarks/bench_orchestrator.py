@@ -0,0 +1,211 @@
+"""多会话编排基准：N个培训会话在一个进程内运行时的播放线程数、LLM后端数和首段TTS延迟
+
+- 独立会话：每个会话各自的LLM后端和播放线程（原ConfigurableTrainingManager的做法）
+- 编排器：共享LLM池和共享音频引擎（一个调度线程写出所有会话的播放），LLM延迟p95超过SLO时新会话排队
+LLM为本地桩后端（服务端并发超过capacity后延迟线性增长，模拟过载），不连接服务端。
+最后用默认的会话运行器（start_configurable_session）连接本地对话服务跑close_sessions个会话，
+一半在运行中被停止、一半由shutdown()结束，检查每个会话都发了FinishSession/FinishConnection并关闭了连接。
+用法: python benchmarks/bench_orchestrator.py [--sessions 200] [--rounds 6] [--slo 1.0] [--close-sessions 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from llm_backend import LLMBackend, StubLLMBackend  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+from orchestrator import AdmissionRejected, TenantLimits, TrainingOrchestrator  # noqa: E402
+
+REPLY = "很好，请结合中能科技的属地化策略继续分析。当地人才和政策分别起了什么作用？"
+TRAINING_CONFIG = {"use_gpt4o": True, "enable_gpt4o_logging": False, "enable_response_cache": False,
+                   "precompute_summary": False, "enable_conversation_memory": False}
+
+
+class ServiceLoad:
+    """模拟的LLM服务端负载，所有后端实例共用"""
+
+    def __init__(self, latency: float = 0.3, capacity: int = 16):
+        self.latency = latency
+        self.capacity = capacity
+        self.in_flight = 0
+
+
+class OverloadedBackend(LLMBackend):
+    """服务端并发超过capacity后首包延迟按比例增长的桩后端"""
+
+    def __init__(self, load: ServiceLoad, token_interval: float = 0.02):
+        self.load = load
+        self.token_interval = token_interval
+
+    async def stream(self, messages, **params):
+        self.load.in_flight += 1
+        try:
+            await asyncio.sleep(self.load.latency * max(1.0, self.load.in_flight / self.load.capacity))
+            for i in range(0, len(REPLY), 4):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield REPLY[i:i + 4]
+        finally:
+            self.load.in_flight -= 1
+
+
+class RecordingClient:
+    ws = None
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+def null_sink(_: bytes) -> None:
+    pass
+
+
+async def simulate(manager: ConfigurableTrainingManager, rounds: int, think: float) -> list:
+    """模拟一个学员：打开音频输出，每轮收到下行音频后作答"""
+    manager.session.client = RecordingClient()
+    manager.session.open_audio_output()
+    for _ in range(rounds):
+        manager.session.audio_queue.put(b"\0" * 640)
+        await asyncio.sleep(think)
+        await manager.process_user_input_with_gpt4o("我认为要先评估自身条件")
+    return [latency["first_tts"] for latency in manager.turn_latencies]
+
+
+def backend_count(managers: list) -> int:
+    """会话实际使用的LLM后端（连接）数"""
+    return len({id(getattr(m.llm.backend, "pool", m.llm.backend)) for m in managers})
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+async def run_independent(sessions: int, rounds: int, think: float, arrival: float) -> dict:
+    threads_before = threading.active_count()
+    load = ServiceLoad()
+    managers, tasks = [], []
+    for _ in range(sessions):
+        session = DialogSession(config.ws_connect_config, output_sink=null_sink, use_microphone=False,
+                                handle_signals=False)
+        # 每个会话各自创建LLM后端
+        manager = ConfigurableTrainingManager(config.ws_connect_config, TRAINING_CONFIG,
+                                              llm_backend=OverloadedBackend(load), session=session)
+        managers.append(manager)
+        tasks.append(asyncio.ensure_future(simulate(manager, rounds, think)))
+        await asyncio.sleep(arrival)  # 学员陆续进入
+    threads = threading.active_count() - threads_before
+    latencies = [x for result in await asyncio.gather(*tasks) for x in result]
+    for manager in managers:
+        manager.session.close_audio_output()
+        manager.session.player_thread.join()
+    return {"admitted": sessions, "queued": 0, "rejected": 0, "threads": threads,
+            "backends": backend_count(managers), "latencies": latencies, "queue_wait": 0.0}
+
+
+async def run_orchestrated(sessions: int, rounds: int, think: float, arrival: float, slo: float,
+                           max_sessions: int) -> dict:
+    threads_before = threading.active_count()
+    orchestrator = TrainingOrchestrator(
+        config.ws_connect_config, OverloadedBackend(ServiceLoad()), TRAINING_CONFIG, max_sessions=max_sessions,
+        max_queue=sessions, queue_timeout=120.0, latency_slo=slo, llm_concurrency=64,
+        output_sink_factory=lambda session_id: null_sink,
+        default_limits=TenantLimits(max_sessions=sessions, llm_concurrency=32),
+    )
+    handles = []
+
+    async def submit(i: int) -> None:
+        try:
+            handles.append(await orchestrator.submit(f"tenant-{i % 4}", run=lambda m: simulate(m, rounds, think)))
+        except AdmissionRejected:
+            pass
+
+    submitters = []
+    for i in range(sessions):
+        submitters.append(asyncio.ensure_future(submit(i)))
+        await asyncio.sleep(arrival)
+    threads = threading.active_count() - threads_before
+    await asyncio.gather(*submitters)
+    managers = [h.manager for h in handles]
+    results = await asyncio.gather(*(h.task for h in handles), return_exceptions=True)
+    report = orchestrator.report()
+    await orchestrator.shutdown()
+    latencies = [x for result in results if isinstance(result, list) for x in result]
+    return {"admitted": report["admitted"], "queued": report["queued"], "rejected": report["rejected"],
+            "threads": threads, "backends": backend_count(managers), "latencies": latencies,
+            "queue_wait": max((h.queued_for for h in handles), default=0.0)}
+
+
+async def run_hosted_close(sessions: int) -> dict:
+    """默认运行器连接本地对话服务，会话结束后服务端应看不到任何打开的连接"""
+    server = LocalDialogServer()
+    ws_config = {**config.ws_connect_config, "base_url": await server.start()}
+    orchestrator = TrainingOrchestrator(
+        ws_config, StubLLMBackend(REPLY, latency=0.05), TRAINING_CONFIG, max_queue=sessions,
+        output_sink_factory=lambda session_id: null_sink,
+        default_limits=TenantLimits(max_sessions=sessions),
+    )
+    handles = [await orchestrator.submit(f"tenant-{i % 4}") for i in range(sessions)]
+    while server.stats["connections"] < sessions:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(1.0)  # 开场白TTS下发中
+    stopped = handles[:sessions // 2]
+    for handle in stopped:
+        handle.stop()
+    await asyncio.gather(*(h.task for h in stopped), return_exceptions=True)
+    await orchestrator.shutdown()
+    await asyncio.sleep(0.1)  # 服务端处理关闭
+    stats = dict(server.stats)
+    await server.stop()
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="多会话编排基准")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=6)
+    parser.add_argument("--think", type=float, default=2.0, help="学员每轮作答前的思考时间(s)")
+    parser.add_argument("--arrival", type=float, default=0.1, help="相邻学员进入的间隔(s)")
+    parser.add_argument("--slo", type=float, default=1.0, help="LLM首包延迟p95的SLO(s)")
+    parser.add_argument("--max-sessions", type=int, default=200)
+    parser.add_argument("--close-sessions", type=int, default=20, help="检查连接关闭的托管会话数")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        independent = asyncio.run(run_independent(args.sessions, args.rounds, args.think, args.arrival))
+        orchestrated = asyncio.run(run_orchestrated(args.sessions, args.rounds, args.think, args.arrival,
+                                                    args.slo, args.max_sessions))
+
+    print(f"{args.sessions}个会话, 每个{args.rounds}轮")
+    print(f"{'模式':<8}{'接纳':>6}{'排队':>6}{'拒绝':>6}{'播放线程':>8}{'LLM后端':>8}"
+          f"{'首段TTS p50(s)':>16}{'p95(s)':>8}")
+    for name, r in (("独立会话", independent), ("编排器", orchestrated)):
+        print(f"{name:<8}{r['admitted']:>6}{r['queued']:>6}{r['rejected']:>6}{r['threads']:>8}{r['backends']:>8}"
+              f"{percentile(r['latencies'], 0.5):>16.2f}{percentile(r['latencies'], 0.95):>8.2f}")
+    print(f"编排器最长排队时间: {orchestrated['queue_wait']:.2f}s (SLO {args.slo}s)")
+
+    if args.close_sessions:
+        with contextlib.redirect_stdout(io.StringIO()):
+            closed = asyncio.run(run_hosted_close(args.close_sessions))
+        ok = (closed["open"] == 0 and closed["connections"] == args.close_sessions
+              and closed["finish_session"] == closed["finish_connection"] == args.close_sessions)
+        print(f"托管会话关闭检查: 连接 {closed['connections']}, 仍打开 {closed['open']}, "
+              f"FinishSession {closed['finish_session']}, FinishConnection {closed['finish_connection']} "
+              f"-> {'通过' if ok else '失败'}")
+        if not ok:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""全链路延迟回归：本地对话服务 + 脚本LLM后端 + ConfigurableTrainingManager
+
+本地服务按脚本“识别”学员的每句话，在服务端统计每轮
+最终ASR结果 -> 首个ChatTTSText、最终ASR结果 -> 首包下行音频 的延迟。
+LLM使用ScriptedLLMBackend，首token延迟和输出速度固定，结果可重复。
+--scenario指定网络场景（impairment_proxy.SCENARIOS中的名称或JSON文件）时，客户端经过网络损伤代理连接本地服务，
+另外按代理记录的送达时刻统计 最终ASR结果 -> 首包音频到达客户端 的延迟，并输出代理的链路报告；
+此时--check检查的是到达客户端的延迟。
+用法: python benchmarks/bench_pipeline.py [--ttft 0.3] [--tps 30] [--scenario 4g] [--check --budget 1.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from impairment_proxy import ImpairmentProxy  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+
+REPLIES = [
+    "您提到了市场饱和，这是非常关键的外部因素。请进一步思考：中能科技为什么选择德国作为第一站？",
+    "很好！政策支持确实重要。那么在进入德国之前，海外事业小组做了哪些准备来控制风险？",
+    "属地化管理是融入当地的关键。请结合案例谈谈，人才和文化融合分别带来了什么价值？",
+]
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else float("nan")
+
+
+async def feed_silence(session: DialogSession, interval: float) -> None:
+    """代替麦克风持续发送静音帧，由本地服务按帧数模拟学员说话"""
+    frame = bytes(config.input_audio_config["chunk"] * config.sample_width(config.input_audio_config["bit_size"]))
+    while session.is_running:
+        await session.client.task_request(frame)
+        await asyncio.sleep(interval)
+
+
+async def run(training_config: dict, llm_options: dict, frame_interval: float, scenario: str = None,
+              seed: int = 1) -> tuple:
+    server = LocalDialogServer()
+    url = await server.start()
+    proxy = None
+    if scenario:
+        proxy = ImpairmentProxy.from_scenario(url, scenario, seed=seed)
+        url = await proxy.start()
+    ws_config = {**config.ws_connect_config, "base_url": url}
+    session = DialogSession(ws_config, output_sink=lambda audio: None, use_microphone=False, handle_signals=False)
+    manager = ConfigurableTrainingManager(
+        ws_config,
+        {"use_gpt4o": True, "enable_round_control": False, "enable_response_cache": False,
+         "llm_backend": "scripted", "llm_backend_options": llm_options, **training_config},
+        session=session,
+    )
+    task = asyncio.ensure_future(manager.start_configurable_session())
+    feeder = None
+    try:
+        while session.client.ws is None or not session.client.ws.open:
+            await asyncio.sleep(0.01)
+        feeder = asyncio.ensure_future(feed_silence(session, frame_interval))
+        while len(server.turns) < len(server.utterances) or server.turns[-1]["tts_end"] is None:
+            if task.done():
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        session.is_running = False
+        if feeder is not None:
+            feeder.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        await session.client.close()
+        session.close_audio_output()
+        if proxy is not None:
+            await proxy.stop()
+        await server.stop()
+    if proxy is not None:
+        for turn in server.turns:
+            turn["client_audio"] = proxy.first_delivery("downlink", 352, turn["first_audio"]) \
+                if turn["first_audio"] else None
+    return server.turns, proxy
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="全链路延迟回归")
+    parser.add_argument("--ttft", type=float, default=0.3, help="脚本LLM的首token延迟(s)")
+    parser.add_argument("--tps", type=float, default=30.0, help="脚本LLM每秒输出的token数")
+    parser.add_argument("--frame-interval", type=float, default=0.02, help="上行静音帧的发送间隔(s)")
+    parser.add_argument("--check", action="store_true", help="首包音频p95超过budget时返回非零退出码")
+    parser.add_argument("--budget", type=float, default=1.0, help="流式模式首包音频p95的预算(s)")
+    parser.add_argument("--scenario", default=None, help="经过网络损伤代理连接，如 wifi/4g/3g 或JSON文件")
+    parser.add_argument("--seed", type=int, default=1, help="网络损伤的随机种子")
+    args = parser.parse_args()
+
+    llm_options = {"replies": REPLIES, "ttft": args.ttft, "tokens_per_second": args.tps}
+    modes = (("整段", {"stream_tts": False}), ("流式", {"stream_tts": True}))
+    results, proxies = {}, {}
+    for name, training_config in modes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name], proxies[name] = asyncio.run(
+                run(training_config, llm_options, args.frame_interval, args.scenario, args.seed))
+
+    print(f"脚本LLM: 首token {args.ttft}s, {args.tps} token/s" + (f", 网络场景 {args.scenario}" if args.scenario else ""))
+    print(f"{'模式':<6}{'轮数':>4}{'->首个TTS文本 p50/p95(s)':>26}{'->首包音频 p50/p95(s)':>24}"
+          + (f"{'->音频到达客户端 p50/p95(s)':>28}" if args.scenario else ""))
+    for name, turns in results.items():
+        text = [t["first_tts_text"] - t["asr_final"] for t in turns if t["first_tts_text"]]
+        audio = [t["first_audio"] - t["asr_final"] for t in turns if t["first_audio"]]
+        line = (f"{name:<6}{len(turns):>4}{percentile(text, 0.5):>16.3f}/{percentile(text, 0.95):.3f}"
+                f"{percentile(audio, 0.5):>17.3f}/{percentile(audio, 0.95):.3f}")
+        if args.scenario:
+            client = [t["client_audio"] - t["asr_final"] for t in turns if t.get("client_audio")]
+            line += f"{percentile(client, 0.5):>20.3f}/{percentile(client, 0.95):.3f}"
+        print(line)
+    if args.scenario:
+        for name, proxy in proxies.items():
+            print(f"[{name}] {proxy.format_report()}")
+
+    if args.check:
+        turns = results["流式"]
+        key = "client_audio" if args.scenario else "first_audio"
+        audio = [t[key] - t["asr_final"] for t in turns if t.get(key)]
+        if len(audio) < len(turns) or not turns or percentile(audio, 0.95) > args.budget:
+            print(f"回归检查失败: 流式首包音频p95 {percentile(audio, 0.95):.3f}s, 预算 {args.budget}s, "
+                  f"完成 {len(audio)}/{len(turns)} 轮")
+            sys.exit(1)
+        print(f"回归检查通过: 流式首包音频p95 {percentile(audio, 0.95):.3f}s <= {args.budget}s")
+
+
+if __name__ == "__main__":
+    main()
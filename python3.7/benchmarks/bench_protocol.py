@@ -0,0 +1,132 @@
+"""二进制帧编解码吞吐：按消息类型、负载大小和压缩方式统计 build_frame / parse_response / parse_request
+
+每项反复编码或解码同一帧约 --seconds 秒（分3轮取最快），输出每秒帧数和负载吞吐(MB/s)。
+--save 把结果写入基线文件(benchmarks/baselines/bench_protocol.json)，
+--check 与基线比较，任何一项的每秒帧数低于基线的 (1 - tolerance) 倍时返回非零退出码。
+基线和机器相关，换机器后先 --save 再比较。
+用法: python benchmarks/bench_protocol.py [--seconds 0.3] [--save | --check --tolerance 0.5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import protocol  # noqa: E402
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines", "bench_protocol.json")
+SESSION_ID = "5f0c8c4e-2f4a-4a57-9d4b-6d3c6f7e1a20"
+ASR_TEXT = "中能科技选择德国是因为当地政策支持新能源"
+
+# (名称, 事件, 负载, 消息类型, 序列化, 压缩, 解码方)
+CASES = [
+    ("StartSession json+gzip", 100, config.start_session_req, protocol.CLIENT_FULL_REQUEST,
+     protocol.JSON, protocol.GZIP, "server"),
+    ("ChatTTSText json+gzip", 500, {"start": True, "content": ASR_TEXT, "end": False}, protocol.CLIENT_FULL_REQUEST,
+     protocol.JSON, protocol.GZIP, "server"),
+    ("上行音频 640B gzip", 200, bytes(640), protocol.CLIENT_AUDIO_ONLY_REQUEST,
+     protocol.NO_SERIALIZATION, protocol.GZIP, "server"),
+    ("上行音频 3200B gzip", 200, bytes(3200), protocol.CLIENT_AUDIO_ONLY_REQUEST,
+     protocol.NO_SERIALIZATION, protocol.GZIP, "server"),
+    ("上行音频 3200B raw", 200, bytes(3200), protocol.CLIENT_AUDIO_ONLY_REQUEST,
+     protocol.NO_SERIALIZATION, protocol.NO_COMPRESSION, "server"),
+    ("ASR结果 json+gzip", 451, {"results": [{"text": ASR_TEXT, "is_interim": False}]}, protocol.SERVER_FULL_RESPONSE,
+     protocol.JSON, protocol.GZIP, "client"),
+    ("ASR结果 json raw", 451, {"results": [{"text": ASR_TEXT, "is_interim": False}]}, protocol.SERVER_FULL_RESPONSE,
+     protocol.JSON, protocol.NO_COMPRESSION, "client"),
+    ("下行音频 3200B raw", 352, bytes(3200), protocol.SERVER_ACK,
+     protocol.NO_SERIALIZATION, protocol.NO_COMPRESSION, "client"),
+    ("下行音频 12800B raw", 352, bytes(12800), protocol.SERVER_ACK,
+     protocol.NO_SERIALIZATION, protocol.NO_COMPRESSION, "client"),
+    ("下行音频 64000B raw", 352, bytes(64000), protocol.SERVER_ACK,
+     protocol.NO_SERIALIZATION, protocol.NO_COMPRESSION, "client"),
+    ("下行音频 12800B gzip", 352, bytes(12800), protocol.SERVER_ACK,
+     protocol.NO_SERIALIZATION, protocol.GZIP, "client"),
+]
+
+
+def rate(func, seconds: float, repeat: int = 3) -> float:
+    """每秒调用次数：按批调用直到超过给定时长，取repeat轮中最快的一轮以减少噪声"""
+    func()
+    best = 0.0
+    for _ in range(repeat):
+        count, batch = 0, 16
+        start = time.perf_counter()
+        while True:
+            for _ in range(batch):
+                func()
+            count += batch
+            elapsed = time.perf_counter() - start
+            if elapsed >= seconds / repeat:
+                break
+            batch = min(batch * 2, 4096)
+        best = max(best, count / elapsed)
+    return best
+
+
+def run(seconds: float) -> dict:
+    results = {}
+    for name, event, payload, message_type, serial_method, compression, decoder in CASES:
+        def encode():
+            return protocol.build_frame(event, payload, SESSION_ID, message_type=message_type,
+                                        serial_method=serial_method, compression_type=compression)
+
+        frame = encode()
+        parse = protocol.parse_request if decoder == "server" else protocol.parse_response
+        raw = len(payload) if isinstance(payload, bytes) else len(json.dumps(payload, ensure_ascii=False).encode())
+        results[name] = {"frame_bytes": len(frame), "payload_bytes": raw,
+                         "encode": rate(encode, seconds), "decode": rate(lambda: parse(frame), seconds)}
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="二进制帧编解码吞吐")
+    parser.add_argument("--seconds", type=float, default=0.3, help="每项的测量时长")
+    parser.add_argument("--save", action="store_true", help="把结果写入基线文件")
+    parser.add_argument("--check", action="store_true", help="与基线比较，变慢超过tolerance时返回非零退出码")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="允许低于基线的比例（本机噪声约±30%）")
+    parser.add_argument("--baseline", default=BASELINE)
+    args = parser.parse_args()
+
+    results = run(args.seconds)
+    baseline = {}
+    if args.check or os.path.exists(args.baseline):
+        try:
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)["results"]
+        except FileNotFoundError:
+            print(f"基线文件不存在: {args.baseline}，先用 --save 生成")
+            sys.exit(1)
+
+    print(f"{'帧':<24}{'帧长(B)':>9}{'编码(帧/s)':>12}{'解码(帧/s)':>12}{'编码MB/s':>10}{'解码MB/s':>10}"
+          f"{'编码/基线':>10}{'解码/基线':>10}")
+    failures = []
+    for name, r in results.items():
+        line = (f"{name:<24}{r['frame_bytes']:>9}{r['encode']:>12.0f}{r['decode']:>12.0f}"
+                f"{r['encode'] * r['payload_bytes'] / 1e6:>10.1f}{r['decode'] * r['payload_bytes'] / 1e6:>10.1f}")
+        base = baseline.get(name)
+        if base:
+            line += f"{r['encode'] / base['encode']:>10.2f}{r['decode'] / base['decode']:>10.2f}"
+            for op in ("encode", "decode"):
+                if r[op] < base[op] * (1 - args.tolerance):
+                    failures.append(f"{name} {op}: {r[op]:.0f} < 基线 {base[op]:.0f}")
+        print(line)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "seconds": args.seconds, "results": results}, f,
+                      ensure_ascii=False, indent=1)
+        print(f"基线已写入: {args.baseline}")
+    if args.check:
+        if failures:
+            print("回归检查失败:\n  " + "\n  ".join(failures))
+            sys.exit(1)
+        print(f"回归检查通过: 全部 {len(results)} 项不低于基线的 {1 - args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""录制回放回归：同一条录制轨迹上对比改动前后的客户端延迟
+
+1. 连接本地对话服务跑一次完整会话，客户端把收发的帧写入录制文件
+2. 用ReplayServer把录制的下行帧回放给客户端两次：LLM首token延迟为--ttft（改动前）和--ttft-after（改动后），
+   统计每轮 下发ASR最终结果 -> 收到首个ChatTTSText 的延迟
+3. 下行帧不经网络直接回放进DialogSession的响应处理，统计处理速度
+4. 文本帧检查：构造一条下行夹着WebSocket文本帧的轨迹，经ReplayServer回放给开着录制的客户端，
+   检查客户端照常收完、重新录制的文件中文本帧仍是文本帧
+用法: python benchmarks/bench_replay.py [--ttft 0.3] [--ttft-after 0.6] [--speed 1.0]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import protocol  # noqa: E402
+import wire_recorder  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from realtime_dialog_client import RealtimeDialogClient  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+from wire_replay import ReplayServer, replay_inbound  # noqa: E402
+
+REPLIES = [
+    "您提到了市场饱和，这是非常关键的外部因素。请进一步思考：中能科技为什么选择德国作为第一站？",
+    "很好！政策支持确实重要。那么在进入德国之前，海外事业小组做了哪些准备来控制风险？",
+    "属地化管理是融入当地的关键。请结合案例谈谈，人才和文化融合分别带来了什么价值？",
+]
+
+
+def make_manager(ws_config: dict, ttft: float) -> ConfigurableTrainingManager:
+    session = DialogSession(ws_config, output_sink=lambda audio: None, use_microphone=False, handle_signals=False)
+    return ConfigurableTrainingManager(
+        ws_config,
+        {"use_gpt4o": True, "enable_round_control": False, "enable_response_cache": False,
+         "llm_backend": "scripted", "llm_backend_options": {"replies": REPLIES, "ttft": ttft}},
+        session=session,
+    )
+
+
+async def drive(manager: ConfigurableTrainingManager, finished, feed_audio: bool) -> None:
+    """运行会话直到finished()为真，feed_audio时持续发送静音帧驱动本地服务"""
+    session = manager.session
+    task = asyncio.ensure_future(manager.start_configurable_session())
+    frame = bytes(config.input_audio_config["chunk"] * config.sample_width(config.input_audio_config["bit_size"]))
+    try:
+        while session.client.ws is None or not session.client.ws.open:
+            await asyncio.sleep(0.01)
+        while not finished() and not task.done():
+            if feed_audio:
+                await session.client.task_request(frame)
+            await asyncio.sleep(0.02)
+    finally:
+        session.is_running = False
+        await asyncio.gather(task, return_exceptions=True)
+        await session.client.close()
+        session.close_audio_output()
+
+
+async def record(path: str, ttft: float) -> None:
+    server = LocalDialogServer()
+    ws_config = {**config.ws_connect_config, "base_url": await server.start(), "record_path": path}
+    manager = make_manager(ws_config, ttft)
+    try:
+        await drive(manager, lambda: len(server.turns) == len(server.utterances) and
+                    server.turns[-1]["tts_end"] is not None, feed_audio=True)
+    finally:
+        await server.stop()
+
+
+def inbound_before_finish(records: list) -> int:
+    """FinishSession之前录制到的下行帧数，回放到这里说明所有回合都已结束"""
+    count = 0
+    for record in records:
+        if record.direction == wire_recorder.OUTBOUND and protocol.parse_request(record.frame)["event"] == 102:
+            break
+        count += record.direction == wire_recorder.INBOUND
+    return count
+
+
+async def replay(path: str, ttft: float, speed: float) -> list:
+    server = ReplayServer(path, speed=speed)
+    ws_config = {**config.ws_connect_config, "base_url": await server.start()}
+    target = inbound_before_finish(server.records)
+    try:
+        await drive(make_manager(ws_config, ttft), lambda: len(server.sent) >= target, feed_audio=False)
+        await asyncio.wait_for(server.done.wait(), 5.0)
+    finally:
+        await server.stop()
+
+    inbound = [r for r in server.records if r.direction == wire_recorder.INBOUND]
+    latencies = []
+    for record, (sent_at, _) in zip(inbound, server.sent):
+        response = protocol.parse_response(record.frame)
+        results = response.get("payload_msg", {}).get("results") if response.get("event") == 451 else None
+        if results and not results[0].get("is_interim", True):
+            reply = next((t for t, event in server.received if event == 500 and t >= sent_at), None)
+            latencies.append(reply - sent_at if reply is not None else None)
+    return [latencies, server.desyncs]
+
+
+async def replay_handler(path: str) -> dict:
+    session = DialogSession(config.ws_connect_config, output_sink=lambda audio: None, use_microphone=False,
+                            handle_signals=False)
+    return await replay_inbound(path, session.handle_server_response, speed=0)
+
+
+TEXT_FRAME = "服务端的文本帧"
+
+
+async def check_text_frames(directory: str) -> bool:
+    """握手、文本帧、音频帧的轨迹回放给录制中的客户端，比较两份录制的帧类型和内容"""
+    source = os.path.join(directory, "text.rdwl")
+    session_id = "text-frame-check"
+    audio = protocol.build_frame(352, bytes(640), session_id, message_type=protocol.SERVER_ACK,
+                                 serial_method=protocol.NO_SERIALIZATION, compression_type=protocol.NO_COMPRESSION)
+    recorder = wire_recorder.WireRecorder(source)
+    recorder.record(wire_recorder.OUTBOUND, protocol.build_frame(1, {}))
+    recorder.record(wire_recorder.INBOUND, protocol.build_frame(50, {}, "", message_type=protocol.SERVER_FULL_RESPONSE))
+    recorder.record(wire_recorder.OUTBOUND, protocol.build_frame(100, config.start_session_req, session_id))
+    recorder.record(wire_recorder.INBOUND, protocol.build_frame(150, {}, session_id,
+                                                                message_type=protocol.SERVER_FULL_RESPONSE))
+    recorder.record(wire_recorder.INBOUND, TEXT_FRAME)
+    recorder.record(wire_recorder.INBOUND, audio)
+    recorder.close()
+
+    server = ReplayServer(source, speed=0)
+    copy = os.path.join(directory, "text-copy.rdwl")
+    client = RealtimeDialogClient({**config.ws_connect_config, "base_url": await server.start(),
+                                   "record_path": copy}, session_id)
+    try:
+        await client.connect()
+        responses = [await client.receive_server_response() for _ in range(2)]
+    finally:
+        await client.close()
+        await server.stop()
+    frames = [(r.direction, r.frame) for r in wire_recorder.read_records(copy)]
+    expected = [(r.direction, r.frame) for r in wire_recorder.read_records(source)]
+    return frames == expected and responses[0] == {} and responses[1].get("event") == 352
+
+
+def fmt(values: list) -> str:
+    return " ".join("-" if v is None else f"{v:.3f}" for v in values)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="录制回放回归")
+    parser.add_argument("--ttft", type=float, default=0.3, help="录制和改动前回放时脚本LLM的首token延迟(s)")
+    parser.add_argument("--ttft-after", type=float, default=0.6, help="改动后回放时的首token延迟(s)")
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速")
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), "session.rdwl")
+    with contextlib.redirect_stdout(io.StringIO()):
+        asyncio.run(record(path, args.ttft))
+    summary = wire_recorder.summarize(path)
+    print(f"录制: {summary['frames']} 帧, {summary['duration']:.2f}s, "
+          f"{os.path.getsize(path) / 1024:.0f}KB ({path})")
+
+    for name, ttft in (("改动前", args.ttft), ("改动前(重复)", args.ttft), ("改动后", args.ttft_after)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            latencies, desyncs = asyncio.run(replay(path, ttft, args.speed))
+        print(f"{name:<10} 首token {ttft}s, 未同步 {desyncs} 次, 各轮ASR最终结果->首个TTS文本(s): {fmt(latencies)}")
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        stats = asyncio.run(replay_handler(path))
+    elapsed = time.perf_counter() - start
+    print(f"直接回放进响应处理: {stats['frames']} 帧, {elapsed:.3f}s, {stats['frames'] / elapsed:.0f} 帧/s")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        ok = asyncio.run(check_text_frames(os.path.dirname(path)))
+    print(f"文本帧录制回放检查: {'通过' if ok else '失败'}")
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""TTS分段器吞吐基准与随机性质检查
+
+- 吞吐：按LLM流式增量大小push文本，统计每秒处理的字符数，并与原split_text_for_tts对比
+- 性质检查(--check)：随机生成中英文混排文本，验证段落长度上限、内容无丢失、拆分方式不影响结果等性质
+用法: python benchmarks/bench_segmenter.py [--check] [--cases 2000] [--seed 0]
+"""
+import argparse
+import random
+import re
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_segmenter import StreamingSegmenter, split_text  # noqa: E402
+
+SAMPLE = ("您提到了市场饱和，这是非常关键的外部因素。中能科技正是看到国内竞争激烈、利润空间缩小，才把目光投向欧洲！"
+          "The team spent 6.5 months on research before choosing Germany. Why Germany? "
+          "“属地化”管理意味着什么？请结合案例：技术、人才、文化三个方面来分析；")
+ALPHABET = list("企业出海战略中能科技德国市场调研") + list("abcdefg ") + list("。！？，、：；,.!?;:…\n”）\"' 0123456789")
+
+
+def legacy_split_text_for_tts(text, max_length=120):
+    """改造前ConfigurableTrainingManager.split_text_for_tts的实现，用于对比"""
+    if len(text) <= max_length:
+        return [text]
+    chunks = []
+    sentences = text.replace('。', '。|').replace('！', '！|').replace('？', '？|').split('|')
+    current_chunk = ""
+    for sentence in sentences:
+        if len(current_chunk + sentence) <= max_length:
+            current_chunk += sentence
+        else:
+            if current_chunk:
+                chunks.append(current_chunk.strip())
+            current_chunk = sentence
+    if current_chunk:
+        chunks.append(current_chunk.strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+def stream_segments(segmenter: StreamingSegmenter, pieces) -> list:
+    segments = []
+    for piece in pieces:
+        segments.extend(segmenter.push(piece))
+    segments.extend(segmenter.flush())
+    return segments
+
+
+def random_pieces(rng: random.Random, text: str) -> list:
+    pieces, i = [], 0
+    while i < len(text):
+        size = rng.randint(1, 6)
+        pieces.append(text[i:i + size])
+        i += size
+    return pieces
+
+
+def check_properties(cases: int, seed: int) -> list:
+    """返回违反性质的用例描述"""
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        text = "".join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 400)))
+        max_length = rng.randint(8, 80)
+        params = dict(max_length=max_length, min_length=rng.randint(1, 6),
+                      clause_length=rng.randint(1, max_length), first_chunk_length=rng.randint(1, max_length))
+        whole = stream_segments(StreamingSegmenter(**params), [text])
+        pieces = stream_segments(StreamingSegmenter(**params), random_pieces(rng, text))
+        packed = split_text(text, max_length)
+        problems = []
+        if any(len(s) > max_length for s in whole + packed):
+            problems.append("段落超过max_length")
+        if any(not s or s != s.strip() for s in whole):
+            problems.append("出现空段落或首尾空白")
+        if re.sub(r"\s", "", "".join(whole)) != re.sub(r"\s", "", text):
+            problems.append("内容丢失或重复")
+        if re.sub(r"\s", "", "".join(packed)) != re.sub(r"\s", "", text):
+            problems.append("split_text内容丢失")
+        if whole != pieces:
+            problems.append("拆分push结果不一致")
+        if problems:
+            failures.append(f"case {case} params={params} text={text!r}: {', '.join(problems)}")
+    return failures
+
+
+def throughput(repeat: int, piece_size: int) -> dict:
+    text = SAMPLE * 20
+    pieces = [text[i:i + piece_size] for i in range(0, len(text), piece_size)]
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        stream_segments(StreamingSegmenter(), pieces)
+    results["streaming push"] = len(text) * repeat / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        split_text(text)
+    results["split_text"] = len(text) * repeat / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        legacy_split_text_for_tts(text)
+    results["legacy split_text_for_tts"] = len(text) * repeat / (time.perf_counter() - start)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="TTS分段器吞吐基准与性质检查")
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--piece-size", type=int, default=3, help="模拟流式增量的字符数")
+    parser.add_argument("--check", action="store_true", help="运行随机性质检查，失败时返回非零退出码")
+    parser.add_argument("--cases", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for name, chars_per_second in throughput(args.repeat, args.piece_size).items():
+        print(f"{name:<28}{chars_per_second / 1e6:>8.2f} M字符/秒")
+    legacy_max = max(len(c) for c in legacy_split_text_for_tts("无标点" * 100))
+    print(f"无句末标点的300字文本：原实现最长块 {legacy_max} 字，新实现最长块 "
+          f"{max(len(c) for c in split_text('无标点' * 100))} 字 (max_length=120)")
+
+    if args.check:
+        failures = check_properties(args.cases, args.seed)
+        for failure in failures[:10]:
+            print(failure)
+        print(f"性质检查: {args.cases - len(failures)}/{args.cases} 通过")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""推测式回复生成收益基准
+
+向GPT-4o响应处理器回放合成的ASR事件(451)：中间结果逐步增长并稳定，一段ASR定稿延迟后到达最终结果。
+部分语句的最终结果与中间结果不同（触发取消重算）。对比开启/关闭推测生成时，
+从最终结果到首个ChatTTSText(500)的延迟，以及命中率、浪费token数和节省的延迟。
+用法: python benchmarks/bench_speculation.py [--ttft 0.5] [--finalize-delay 0.6]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from llm_backend import StubLLMBackend  # noqa: E402
+
+REPLY = "您抓住了关键点。中能科技先做了半年的调研，再选择德国建厂。请您继续分析属地化管理的作用。"
+
+# (中间结果序列, 最终结果)
+UTTERANCES = [
+    (["我觉得", "我觉得首先要", "我觉得首先要看市场"], "我觉得首先要看市场"),
+    (["企业要", "企业要分析自身", "企业要分析自身条件"], "企业要分析自身条件。"),
+    (["政策", "政策支持很", "政策支持很重要"], "政策支持很重要"),
+    (["他们", "他们先做调研", "他们先做调研"], "他们先做调研然后再派团队去德国谈判和建厂"),
+    (["属地化", "属地化管理", "属地化管理能融入当地"], "属地化管理能融入当地"),
+]
+
+
+class RecordingClient:
+    """记录ChatTTSText发送时间的客户端"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        self.frames.append((time.perf_counter(), content, start, end))
+
+
+def asr_event(text: str, is_interim: bool) -> dict:
+    return {
+        "message_type": "SERVER_FULL_RESPONSE",
+        "event": 451,
+        "payload_msg": {"results": [{"text": text, "is_interim": is_interim}]},
+    }
+
+
+async def run(speculative: bool, ttft: float, finalize_delay: float, interval: float) -> dict:
+    manager = ConfigurableTrainingManager(
+        config.ws_connect_config,
+        {"use_gpt4o": True, "speculative_asr": speculative, "enable_gpt4o_logging": False,
+         "max_rounds": len(UTTERANCES)},
+        llm_backend=StubLLMBackend(reply=REPLY, latency=ttft, token_interval=0.02),
+    )
+    manager.session.client = RecordingClient()
+    for interims, final in UTTERANCES:
+        for text in interims + [interims[-1]]:
+            manager.gpt4o_response_handler(asr_event(text, True))
+            await asyncio.sleep(interval)
+        await asyncio.sleep(finalize_delay)
+        turns = len(manager.turn_latencies)
+        manager.gpt4o_response_handler(asr_event(final, False))
+        while len(manager.turn_latencies) == turns:
+            await asyncio.sleep(0.01)
+    first = [latency["first_tts"] for latency in manager.turn_latencies]
+    report = manager.speculator.report() if manager.speculator else {}
+    return {"first_tts": statistics.mean(first), "report": report}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="推测式回复生成收益基准")
+    parser.add_argument("--ttft", type=float, default=0.5, help="模拟的首token延迟（秒）")
+    parser.add_argument("--finalize-delay", type=float, default=0.6, help="最后一个中间结果到最终结果的间隔（秒）")
+    parser.add_argument("--interval", type=float, default=0.1, help="中间结果间隔（秒）")
+    args = parser.parse_args()
+
+    baseline = asyncio.run(run(False, args.ttft, args.finalize_delay, args.interval))
+    speculative = asyncio.run(run(True, args.ttft, args.finalize_delay, args.interval))
+    report = speculative["report"]
+    print(f"关闭推测: 最终结果->首段TTS平均 {baseline['first_tts']:.3f}s")
+    print(f"开启推测: 最终结果->首段TTS平均 {speculative['first_tts']:.3f}s")
+    print(f"推测次数 {report['speculations']}, 命中 {report['hits']}, 未命中 {report['misses']}, "
+          f"重启 {report['restarts']}, 命中率 {report['hit_rate']:.0%}")
+    print(f"浪费token(流式增量) {report['wasted_tokens']}, 命中平均节省 {report['avg_latency_saved']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""纯文本会话的吞吐与CPU开销
+
+本地对话服务上并发运行N个会话，每个会话依次完成Q轮：
+- 文本模式: TextDialogSession.ask()，不打开音频设备、不发送上行音频
+- 音频模式: 客户端按实时节奏发送静音帧驱动服务端“识别”出Q句，等到每轮TTS结束（对照组）
+输出每秒完成的轮数、每轮的CPU时间（客户端和服务端在同一进程中，一起计入）和文本模式的延迟分位数。
+--scenario指定网络场景（impairment_proxy.SCENARIOS中的名称或JSON文件）时，所有会话经过网络损伤代理连接，并输出代理的链路报告。
+用法: python benchmarks/bench_text_session.py [--sessions 200] [--queries 5] [--tts] [--scenario 4g]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from impairment_proxy import ImpairmentProxy  # noqa: E402
+from local_dialog_server import LocalDialogServer  # noqa: E402
+from realtime_dialog_client import RealtimeDialogClient  # noqa: E402
+from text_session import TextDialogSession  # noqa: E402
+
+QUERIES = ("企业出海首先要考虑什么？", "为什么选择德国？", "属地化管理有什么好处？",
+           "如何控制成本？", "产业链出海的优势是什么？")
+
+REPLY = "出海之前要先分析国内市场是否饱和，再评估目标市场的政策和成本。"
+
+
+def percentile(values, q: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+async def text_session(ws_config, queries: int, wait_tts: bool, latencies, errors) -> None:
+    async with TextDialogSession(ws_config, wait_tts=wait_tts) as session:
+        for i in range(queries):
+            reply = await session.ask(QUERIES[i % len(QUERIES)])
+            if reply.error:
+                errors.append(reply.error)
+            else:
+                latencies.append(reply.latency)
+
+
+async def audio_session(ws_config, server: LocalDialogServer) -> None:
+    client = RealtimeDialogClient(config=ws_config, session_id=str(uuid.uuid4()))
+    await client.connect()
+    frame = bytes(config.input_audio_config["chunk"] * 2)
+    interval = config.input_audio_config["chunk"] / config.input_audio_config["sample_rate"]
+    finished = asyncio.Event()
+
+    async def receive() -> None:
+        ended = 0
+        while ended < len(server.utterances):
+            response = await client.receive_server_response()
+            if response.get("event") == 359:
+                ended += 1
+        finished.set()
+
+    receiver = asyncio.ensure_future(receive())
+    try:
+        while not finished.is_set():
+            await client.task_request(frame)
+            await asyncio.sleep(interval)
+        await client.finish_session()
+        await client.finish_connection()
+    finally:
+        receiver.cancel()
+        await client.close()
+
+
+async def measure(mode: str, sessions: int, queries: int, tts: bool, scenario: str = None) -> None:
+    # 两种模式由服务端回复同样的文本，音频模式下服务端在识别出一句后自己回复(550/559)并合成音频
+    server = LocalDialogServer(utterances=list(QUERIES[:1]) * queries, native_reply=REPLY, text_tts=tts,
+                               tts_first_audio=0.05, synthesis_speed=50.0)
+    url = await server.start()
+    proxy = None
+    if scenario:
+        proxy = ImpairmentProxy.from_scenario(url, scenario, seed=1, record_trace=False)
+        url = await proxy.start()
+    ws_config = {**config.ws_connect_config, "base_url": url}
+    latencies, errors = [], []
+    cpu, wall = time.process_time(), time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "text":
+            results = await asyncio.gather(*(text_session(ws_config, queries, tts, latencies, errors)
+                                             for _ in range(sessions)), return_exceptions=True)
+        else:
+            results = await asyncio.gather(*(audio_session(ws_config, server) for _ in range(sessions)),
+                                           return_exceptions=True)
+    cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+    if proxy is not None:
+        await proxy.stop()
+    await server.stop()
+    failed = [r for r in results if isinstance(r, Exception)]
+    turns = sum(1 for turn in server.turns if turn["tts_end"] or (mode == "text" and not tts))
+    print(f"{mode:<6}{sessions:>6}{turns:>8}{wall:>9.2f}{turns / wall:>10.1f}{cpu / max(turns, 1) * 1000:>12.2f}"
+          f"{len(failed) + len(errors):>6}", end="")
+    if latencies:
+        print(f"   p50 {statistics.median(latencies) * 1000:.1f}ms p95 {percentile(latencies, 0.95) * 1000:.1f}ms")
+    else:
+        print()
+    if proxy is not None:
+        print(proxy.format_report())
+
+
+async def run(args) -> None:
+    print(f"{'模式':<6}{'会话':>6}{'轮数':>8}{'耗时(s)':>9}{'轮/秒':>10}{'CPU/轮(ms)':>12}{'失败':>6}")
+    for sessions in args.sessions:
+        await measure("text", sessions, args.queries, args.tts, args.scenario)
+        if not args.skip_audio:
+            await measure("audio", sessions, args.queries, True, args.scenario)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="纯文本会话的吞吐与CPU开销")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[10, 100])
+    parser.add_argument("--queries", type=int, default=5)
+    parser.add_argument("--tts", action="store_true", help="文本模式下服务端也合成回复音频（客户端只计数丢弃）")
+    parser.add_argument("--skip-audio", action="store_true", help="不运行音频模式对照")
+    parser.add_argument("--scenario", default=None, help="经过网络损伤代理连接，如 wifi/4g/3g 或JSON文件")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""流式LLM->TTS与整段生成后再发送的首段TTS延迟对比
+
+使用StubLLMBackend模拟LLM（首token延迟+逐token输出），用记录型客户端代替WebSocket，
+统计从用户说完（最终ASR结果）到首个ChatTTSText(500)发出的时间，并校验start/end标记。
+用法: python benchmarks/bench_tts_streaming.py [--ttft 0.4] [--tokens-per-second 40] [--turns 5]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from llm_backend import StubLLMBackend  # noqa: E402
+
+REPLY = ("您提到了市场饱和，这是非常关键的外部因素。中能科技正是看到国内竞争激烈、利润空间缩小，"
+         "才把目光投向欧洲。不过，仅有外部推力还不够，企业还需要审视自身条件：技术储备、资金实力、"
+         "团队的国际化能力。请您结合案例想一想，中能科技为什么先成立海外事业小组，花半年时间做调研，"
+         "而不是直接在欧洲建厂？这一步对出海战略的制定有什么意义？")
+
+
+class RecordingClient:
+    """记录ChatTTSText发送时间和内容的客户端"""
+
+    def __init__(self):
+        self.frames = []
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        self.frames.append((time.perf_counter(), content, start, end))
+
+
+def check_flags(frames) -> bool:
+    """一次回复的500帧：仅首帧start=True，仅末帧end=True，内容拼接后与回复一致"""
+    starts = [f[2] for f in frames]
+    ends = [f[3] for f in frames]
+    return (starts == [True] + [False] * (len(frames) - 1) and
+            ends == [False] * (len(frames) - 1) + [True] and
+            "".join(f[1] for f in frames) == REPLY)
+
+
+async def run_mode(stream_tts: bool, ttft: float, tokens_per_second: float, turns: int) -> dict:
+    backend = StubLLMBackend(reply=REPLY, latency=ttft, token_interval=1.0 / tokens_per_second, chunk_size=2)
+    manager = ConfigurableTrainingManager(
+        config.ws_connect_config,
+        {"use_gpt4o": True, "stream_tts": stream_tts, "enable_gpt4o_logging": False, "max_rounds": turns},
+        llm_backend=backend,
+    )
+    flags_ok = True
+    for _ in range(turns):
+        client = RecordingClient()
+        manager.session.client = client
+        await manager.process_user_input_with_gpt4o("企业要先看清自身条件", time.perf_counter())
+        flags_ok = flags_ok and check_flags(client.frames)
+    first = [latency["first_tts"] for latency in manager.turn_latencies]
+    total = [latency["total"] for latency in manager.turn_latencies]
+    return {"first_tts": statistics.mean(first), "total": statistics.mean(total), "flags_ok": flags_ok}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="流式LLM->TTS首段延迟对比")
+    parser.add_argument("--ttft", type=float, default=0.4, help="模拟的首token延迟（秒）")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    full = asyncio.run(run_mode(False, args.ttft, args.tokens_per_second, args.turns))
+    stream = asyncio.run(run_mode(True, args.ttft, args.tokens_per_second, args.turns))
+    print(f"{'模式':<8}{'首段TTS延迟(s)':>16}{'TTS全部发出(s)':>16}  标记校验")
+    for name, result in (("整段", full), ("流式", stream)):
+        print(f"{name:<8}{result['first_tts']:>16.3f}{result['total']:>16.3f}  "
+              f"{'通过' if result['flags_ok'] else '失败'}")
+    print(f"首段TTS延迟降低: {full['first_tts'] - stream['first_tts']:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""回合管理基准：用户连续说两句话、以及回复过程中打断(450)时发到线上的ChatTTSText
+
+对比原流程（每个最终ASR结果各自创建任务，两个回复交错发送）与TurnManager
+（新回合取消上一回合，过期的TTS块在发送前丢弃）。
+用法: python benchmarks/bench_turns.py [--gap 0.3] [--token-interval 0.05]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from llm_backend import StubLLMBackend  # noqa: E402
+
+REPLY = "您提到了市场饱和，这是关键的外部因素。请进一步思考：中能科技为什么选择德国？当地的政策和人才有什么优势？"
+
+
+class RecordingClient:
+    def __init__(self):
+        self.frames = []
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        self.frames.append((time.perf_counter(), content, start, end))
+
+
+def asr_final(text: str) -> dict:
+    return {"message_type": "SERVER_FULL_RESPONSE", "event": 451,
+            "payload_msg": {"results": [{"text": text, "is_interim": False}]}}
+
+
+def clear_audio() -> dict:
+    return {"message_type": "SERVER_FULL_RESPONSE", "event": 450, "payload_msg": {}}
+
+
+def count_replies(frames) -> int:
+    """线上结束帧的数量，即服务端完整合成的回复条数"""
+    return sum(1 for _, _, _, end in frames if end)
+
+
+async def run(scenario: str, legacy: bool, gap: float, token_interval: float) -> dict:
+    manager = ConfigurableTrainingManager(
+        config.ws_connect_config,
+        {"use_gpt4o": True, "enable_gpt4o_logging": False, "enable_response_cache": False,
+         "enable_conversation_memory": False, "precompute_summary": False},
+        llm_backend=StubLLMBackend(REPLY, latency=0.2, token_interval=token_interval),
+    )
+    client = RecordingClient()
+    manager.session.client = client
+
+    tasks = []
+
+    def on_final(text: str) -> None:
+        if legacy:
+            # 原流程：每个最终结果各自创建任务
+            tasks.append(asyncio.ensure_future(manager.process_user_input_with_gpt4o(text, time.perf_counter())))
+        else:
+            manager.gpt4o_response_handler(asr_final(text))
+
+    on_final("我觉得首先要看国内市场")
+    await asyncio.sleep(gap)
+    if scenario == "double":
+        on_final("还有海外政策的支持")
+    elif not legacy:
+        manager.gpt4o_response_handler(clear_audio())
+    if legacy:
+        await asyncio.gather(*tasks)
+    else:
+        await manager.turns.wait(30)
+        await asyncio.sleep(0)
+    return {
+        "replies": count_replies(client.frames),
+        "chunks": len(client.frames),
+        **manager.turns.report(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回合管理基准")
+    parser.add_argument("--gap", type=float, default=0.5, help="第一句之后第二句/打断到达的时间(s)")
+    parser.add_argument("--token-interval", type=float, default=0.05)
+    args = parser.parse_args()
+
+    rows = []
+    for scenario, label in (("double", "连续两句"), ("barge_in", "回复中打断")):
+        for legacy in (True, False):
+            result = asyncio.run(run(scenario, legacy, args.gap, args.token_interval))
+            rows.append((label, "原流程" if legacy else "回合管理", result))
+
+    print(f"{'场景':<10}{'流程':<10}{'完整回复数':>10}{'TTS块':>8}{'取消':>6}"
+          f"{'丢弃块':>8}{'浪费token':>10}{'浪费时间(s)':>12}")
+    for label, mode, r in rows:
+        print(f"{label:<10}{mode:<10}{r['replies']:>10}{r['chunks']:>8}{r['cancelled']:>6}"
+              f"{r['stale_chunks']:>8}{r['wasted_tokens']:>10}{r['wasted_time']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""拥塞自适应上行：网络损伤场景下固定上行(fixed)和自适应上行(adaptive)的端到端轮次延迟
+
+本地对话服务 + 脚本LLM后端（流式TTS），客户端经过网络损伤代理(impairment_proxy)连接。
+模拟的麦克风每200ms产生一帧：speech帧语音（RMS约2000、gzip几乎压不动），之后pause帧背景噪声（RMS约80），循环；
+帧经过AdaptiveUplink排队发送，fixed始终用第0档，adaptive按ping往返时延和积压降级（见uplink_controller.py）。
+本地服务空闲时按收到的音频时长“识别”出一句，记录识别时已收到的上行消息数，
+由此找到触发识别的那条消息中最后一帧的采集时刻，统计每轮：
+- ->识别: 采集时刻 -> 服务端最终ASR结果（主要是上行排队）
+- ->音频到达客户端: 采集时刻 -> 首包回复音频送达客户端（用户说完到听到回复）
+用法: python benchmarks/bench_uplink_adaptive.py [--scenarios 4g congested_uplink 3g] [--seconds 40]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import math
+import os
+import random
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+from audio_manager import DialogSession  # noqa: E402
+from bench_pipeline import REPLIES, percentile  # noqa: E402
+from configurable_training_manager import ConfigurableTrainingManager  # noqa: E402
+from impairment_proxy import ImpairmentProxy  # noqa: E402
+from local_dialog_server import DEFAULT_UTTERANCES, LocalDialogServer  # noqa: E402
+from uplink_controller import AdaptiveUplink  # noqa: E402
+
+SAMPLE_RATE = config.input_audio_config["sample_rate"]
+CHUNK = config.input_audio_config["chunk"]
+CHUNK_SECONDS = CHUNK / SAMPLE_RATE
+
+
+def synth_frames(count: int, amplitude: float, seed: int) -> list:
+    """带谐波和噪声的“语音”帧：amplitude较小时即背景噪声"""
+    rng = random.Random(seed)
+    frames = []
+    for index in range(count):
+        pitch = rng.uniform(120, 260)
+        samples = []
+        for i in range(CHUNK):
+            t = (index * CHUNK + i) / SAMPLE_RATE
+            voiced = sum(math.sin(2 * math.pi * pitch * k * t) / k for k in (1, 2, 3)) * 0.5
+            value = amplitude * (voiced * (1 + 0.5 * math.sin(2 * math.pi * 4 * t)) + 0.6 * rng.gauss(0, 1))
+            samples.append(max(-32768, min(32767, int(value))))
+        frames.append(struct.pack(f"<{CHUNK}h", *samples))
+    return frames
+
+
+async def feed_microphone(uplink: AdaptiveUplink, session: DialogSession, pattern: list) -> None:
+    """按实时节奏产生麦克风帧，采集时刻为一帧录完的时刻"""
+    next_at = time.perf_counter()
+    index = 0
+    while session.is_running:
+        next_at += CHUNK_SECONDS
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+        uplink.submit(pattern[index % len(pattern)], time.perf_counter())
+        index += 1
+
+
+async def run(scenario: str, mode: str, seconds: float, pattern: list, seed: int) -> dict:
+    server = LocalDialogServer(utterances=list(DEFAULT_UTTERANCES) * 20)
+    proxy = ImpairmentProxy.from_scenario(await server.start(), scenario, seed=seed)
+    ws_config = {**config.ws_connect_config, "base_url": await proxy.start()}
+    uplink = AdaptiveUplink(mode, record_trace=True)
+    session = DialogSession(ws_config, output_sink=lambda audio: None, use_microphone=False, handle_signals=False,
+                            uplink_controller=uplink)
+    manager = ConfigurableTrainingManager(
+        ws_config,
+        {"use_gpt4o": True, "enable_round_control": False, "enable_response_cache": False,
+         "llm_backend": "scripted", "llm_backend_options": {"replies": REPLIES, "ttft": 0.3, "tokens_per_second": 30}},
+        session=session,
+    )
+    task = asyncio.ensure_future(manager.start_configurable_session())
+    workers = []
+    try:
+        while session.client.ws is None or not session.client.ws.open:
+            if task.done():
+                raise RuntimeError(f"会话没有连上: {task.exception()!r}")
+            await asyncio.sleep(0.01)
+        # 上行的发送任务由会话在握手后启动，这里只模拟麦克风
+        workers = [asyncio.ensure_future(feed_microphone(uplink, session, pattern))]
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline and not task.done():
+            await asyncio.sleep(0.05)
+    finally:
+        session.is_running = False
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        await asyncio.gather(task, return_exceptions=True)
+        await session.client.close()
+        session.close_audio_output()
+        await proxy.stop()
+        await server.stop()
+
+    recognize, respond = [], []
+    for turn in server.turns:
+        captured = uplink.trace[turn["audio_messages"] - 1][1]
+        recognize.append(turn["asr_final"] - captured)
+        if turn["first_audio"] is not None:
+            arrived = proxy.first_delivery("downlink", 352, turn["first_audio"])
+            if arrived is not None:
+                respond.append(arrived - captured)
+    return {"turns": len(server.turns), "recognize": recognize, "respond": respond,
+            "uplink": uplink.report(), "uplink_text": uplink.format_report(),
+            "proxy": proxy.report()["uplink"]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="拥塞自适应上行的端到端轮次延迟")
+    parser.add_argument("--scenarios", nargs="+", default=["4g", "congested_uplink", "3g"],
+                        help="impairment_proxy.SCENARIOS中的名称或JSON文件")
+    parser.add_argument("--seconds", type=float, default=40.0, help="每次运行的时长")
+    parser.add_argument("--speech", type=int, default=6, help="每段语音的帧数(200ms)")
+    parser.add_argument("--pause", type=int, default=14, help="每段语音之后背景噪声的帧数")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    pattern = synth_frames(args.speech, 2500, args.seed) + synth_frames(args.pause, 100, args.seed + 1)
+    print(f"麦克风: {args.speech * CHUNK_SECONDS:.1f}s语音 + {args.pause * CHUNK_SECONDS:.1f}s背景噪声循环, "
+          f"每次运行 {args.seconds:.0f}s")
+    print(f"{'场景':<18}{'模式':<10}{'轮数':>4}{'->识别 p50/p95(s)':>20}{'->音频到达客户端 p50/p95(s)':>28}"
+          f"{'上行KB':>8}{'上行排队p95(s)':>15}{'过期丢弃':>9}  档位时间")
+    reports = []
+    for scenario in args.scenarios:
+        for mode in ("fixed", "adaptive"):
+            with contextlib.redirect_stdout(io.StringIO()):
+                r = asyncio.run(run(scenario, mode, args.seconds, pattern, args.seed))
+            shares = "/".join(f"{share:.0%}" for share in r["uplink"]["level_share"].values())
+            print(f"{scenario:<18}{mode:<10}{r['turns']:>4}"
+                  f"{percentile(r['recognize'], 0.5):>13.2f}/{percentile(r['recognize'], 0.95):.2f}"
+                  f"{percentile(r['respond'], 0.5):>21.2f}/{percentile(r['respond'], 0.95):.2f}"
+                  f"{r['proxy']['bytes'] / 1024:>8.0f}{r['proxy']['delay_p95']:>15.2f}{r['uplink']['stale']:>9}  "
+                  f"{shares}")
+            reports.append(f"[{scenario} {mode}] {r['uplink_text']}")
+    print("\n".join(reports))
+
+
+if __name__ == "__main__":
+    main()
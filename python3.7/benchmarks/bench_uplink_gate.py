@@ -0,0 +1,142 @@
+"""播放感知的上行门控
+
+模拟若干轮对话的麦克风信号（200ms一帧，用模拟时钟，不真正等待）：用户说话 -> 停顿 -> TTS播放，
+播放期间麦克风收到扬声器回声（带音节起伏的能量），播放结束后还有一段混响尾音；
+其中一部分回合用户在播放中途插话。服务端用简单的能量VAD代替：播放期间连续两帧超过阈值即打断(450)。
+对比off/half_duplex/duck三种模式的上行帧数、上行字节（gzip后的帧）、误打断次数、插话漏检和插话生效延迟。
+用法: python benchmarks/bench_uplink_gate.py [--turns 30] [--barge-in-every 3] [--echo 900]
+"""
+import argparse
+import array
+import audioop
+import math
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+import protocol  # noqa: E402
+from uplink_gate import UplinkGate  # noqa: E402
+
+CHUNK = config.input_audio_config["chunk"]
+FRAME_SECONDS = CHUNK / config.input_audio_config["sample_rate"]
+SERVER_VAD_RMS = 500
+SERVER_VAD_FRAMES = 2
+
+
+def make_frame(rng: random.Random, rms: float) -> bytes:
+    samples = array.array("h", (max(-32768, min(32767, int(rng.gauss(0, rms)))) for _ in range(CHUNK)))
+    return samples.tobytes()
+
+
+class Signals:
+    """预先生成各种能量的帧，按能量取用"""
+
+    def __init__(self, seed: int = 1):
+        self.rng = random.Random(seed)
+        self.cache = {}
+
+    def frame(self, rms: float) -> bytes:
+        level = int(round(rms / 50.0)) * 50
+        variants = self.cache.setdefault(level, [])
+        if len(variants) < 4:
+            variants.append(make_frame(self.rng, max(level, 1)))
+            return variants[-1]
+        return self.rng.choice(variants)
+
+
+def build_script(turns: int, barge_in_every: int, rng: random.Random):
+    """返回每轮的(用户帧数, TTS帧数, 插话开始帧(None表示不插话))"""
+    script = []
+    for turn in range(turns):
+        tts = rng.randint(15, 30)
+        barge = rng.randint(4, tts - 4) if barge_in_every and turn % barge_in_every == barge_in_every - 1 else None
+        script.append((rng.randint(8, 15), tts, barge))
+    return script
+
+
+def simulate(mode: str, script, echo: float, signals: Signals, hold: float):
+    now = [0.0]
+    gate = UplinkGate(mode=mode, hold=hold, playback_active=lambda: False, clock=lambda: now[0])
+    stats = {"frames": 0, "sent": 0, "bytes": 0, "false_interruptions": 0, "barge_ins": 0, "missed_barge_ins": 0,
+             "barge_latency": []}
+    rng = random.Random(7)
+    loud_run = [0]
+
+    def uplink(frame: bytes, playing: bool) -> bool:
+        """发送一帧麦克风音频，返回服务端VAD是否在播放中触发了打断"""
+        stats["frames"] += 1
+        triggered = False
+        for sent in gate.filter(frame):
+            stats["sent"] += 1
+            stats["bytes"] += len(protocol.build_frame(200, sent, "s" * 36,
+                                                       message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
+                                                       serial_method=protocol.NO_SERIALIZATION))
+            loud_run[0] = loud_run[0] + 1 if audioop.rms(sent, 2) >= SERVER_VAD_RMS else 0
+            if playing and loud_run[0] >= SERVER_VAD_FRAMES:
+                triggered = True
+        now[0] += FRAME_SECONDS
+        return triggered
+
+    for user_frames, tts_frames, barge in script:
+        for _ in range(user_frames):
+            uplink(signals.frame(rng.uniform(2500, 4000)), False)
+        for _ in range(3):
+            uplink(signals.frame(60), False)
+        gate.on_event(350)
+        interrupted = False
+        for index in range(tts_frames):
+            # 回声能量随音节起伏
+            level = echo * (0.6 + 0.5 * abs(math.sin(index * 1.3))) if index % 7 != 6 else echo * 0.2
+            speaking = barge is not None and index >= barge
+            if speaking:
+                level = math.hypot(level, rng.uniform(2500, 4000))
+            if uplink(signals.frame(level), True):
+                gate.on_event(450)
+                if speaking:
+                    stats["barge_ins"] += 1
+                    stats["barge_latency"].append((index - barge + 1) * FRAME_SECONDS)
+                else:
+                    stats["false_interruptions"] += 1
+                interrupted = True
+                break
+        if not interrupted:
+            gate.on_event(359)
+            if barge is not None:
+                stats["missed_barge_ins"] += 1
+            # 混响尾音
+            uplink(signals.frame(echo * 0.5), False)
+        else:
+            # 被打断后用户继续说完
+            for _ in range(5):
+                uplink(signals.frame(rng.uniform(2500, 4000)), False)
+        for _ in range(3):
+            uplink(signals.frame(60), False)
+    return stats, gate.report()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="播放感知的上行门控")
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--barge-in-every", type=int, default=3, help="每几轮有一次用户插话，0为不插话")
+    parser.add_argument("--echo", type=float, default=900.0, help="回声的RMS能量")
+    parser.add_argument("--hold", type=float, default=0.4)
+    args = parser.parse_args()
+
+    script = build_script(args.turns, args.barge_in_every, random.Random(3))
+    expected = sum(1 for *_, barge in script if barge is not None)
+    print(f"{args.turns} 轮, 插话 {expected} 次, 回声RMS {args.echo:.0f}, 帧长 {FRAME_SECONDS * 1000:.0f}ms")
+    print(f"{'模式':<12}{'上行帧':>8}{'上行KB':>9}{'误打断':>8}{'插话生效':>9}{'插话漏检':>9}{'插话延迟(ms)':>13}"
+          f"{'门控帧':>8}{'挡下回声段':>11}")
+    for mode in ("off", "half_duplex", "duck"):
+        stats, report = simulate(mode, script, args.echo, Signals(), args.hold)
+        latency = sum(stats["barge_latency"]) / len(stats["barge_latency"]) * 1000 if stats["barge_latency"] else 0.0
+        print(f"{mode:<12}{stats['sent']:>8}{stats['bytes'] / 1024:>9.0f}{stats['false_interruptions']:>8}"
+              f"{stats['barge_ins']:>9}{stats['missed_barge_ins']:>9}{latency:>13.0f}"
+              f"{report['gated']:>8}{report['suppressed_bursts']:>11}")
+
+
+if __name__ == "__main__":
+    main()
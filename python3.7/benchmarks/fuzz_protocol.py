@@ -0,0 +1,288 @@
+"""二进制帧的往返与模糊检查
+
+1. 语料：逐条解码 benchmarks/protocol_corpus.json 中保存的帧，结果必须和保存的期望完全一致
+   （期望为error的帧必须抛出protocol.ProtocolError）。语料覆盖每种消息类型、序列化和压缩方式，
+   以及曾经被静默解析成错误结果的畸形帧（有符号的session id长度、被截断的负载、带序号的帧）。
+2. 往返：随机生成各种消息类型/事件/session id/负载的帧，build_frame编码后解码必须得到原值，
+   frame_info读出的消息类型和事件号也必须一致。
+3. 变异：对随机帧做截断、字节翻转、改写长度字段，解码只允许返回结果或抛出ProtocolError；
+   合法帧的每个真前缀都必须抛出ProtocolError。
+改动protocol.py后运行本脚本；协议有意变化时用 --save-corpus 重新生成语料。
+用法: python benchmarks/fuzz_protocol.py [--iterations 2000] [--seed 1] [--save-corpus]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import protocol  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "protocol_corpus.json")
+CLIENT_TYPES = (protocol.CLIENT_FULL_REQUEST, protocol.CLIENT_AUDIO_ONLY_REQUEST)
+SERVER_TYPES = (protocol.SERVER_FULL_RESPONSE, protocol.SERVER_ACK)
+CLIENT_EVENTS = (1, 2, 100, 102, 200, 500, 501)
+SERVER_EVENTS = (50, 51, 52, 150, 152, 153, 350, 352, 359, 450, 451, 550, 559, 599)
+TEXT = "中能科技选择德国是因为当地政策支持新能源，abc 123 \"引号\" \\ emoji🙂"
+
+
+def parse(side: str, frame: bytes) -> dict:
+    return protocol.parse_request(frame) if side == "server" else protocol.parse_response(frame)
+
+
+def normalize(value):
+    """把解码结果转成可以写入JSON并直接比较的形式"""
+    if isinstance(value, (bytes, bytearray)):
+        return {"hex": bytes(value).hex()}
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    return value
+
+
+def decode(side: str, frame: bytes):
+    try:
+        return normalize(parse(side, frame))
+    except protocol.ProtocolError:
+        return "error"
+
+
+def error_frame(code: int, payload: dict) -> bytes:
+    """服务端错误帧: header + code + payload size + payload（build_frame不生成这种帧）"""
+    body = protocol.compress(json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    frame = protocol.generate_header(message_type=protocol.SERVER_ERROR_RESPONSE,
+                                     message_type_specific_flags=protocol.NO_SEQUENCE)
+    frame.extend(code.to_bytes(4, "big"))
+    frame.extend(len(body).to_bytes(4, "big"))
+    frame.extend(body)
+    return bytes(frame)
+
+
+def with_sequence(frame: bytes, seq: int) -> bytes:
+    """在帧头之后插入序号字段，并设置NEG_SEQUENCE标志"""
+    header = bytearray(frame[:4])
+    header[1] |= protocol.NEG_SEQUENCE
+    return bytes(header) + seq.to_bytes(4, "big") + frame[4:]
+
+
+def random_payload(rng: random.Random, serial_method: int):
+    if serial_method == protocol.JSON:
+        return {"content": TEXT[:rng.randint(0, len(TEXT))], "index": rng.randint(-2 ** 40, 2 ** 40),
+                "flags": [rng.random() < 0.5 for _ in range(rng.randint(0, 3))], "empty": {}}
+    if serial_method == protocol.NO_SERIALIZATION:
+        size = rng.choice((0, 1, 2, 640, 3200, rng.randint(0, 70000)))
+        return bytes(rng.getrandbits(8) for _ in range(min(size, 256))) * (size // 256) + bytes(size % 256)
+    return TEXT[:rng.randint(0, len(TEXT))]
+
+
+def random_case(rng: random.Random):
+    """返回(解码方, 帧, 期望的解码结果)"""
+    side = rng.choice(("server", "client"))
+    if side == "server":
+        message_type = rng.choice(CLIENT_TYPES)
+        event = rng.choice(CLIENT_EVENTS)
+        serial_method = protocol.NO_SERIALIZATION if message_type == protocol.CLIENT_AUDIO_ONLY_REQUEST else protocol.JSON
+    else:
+        message_type = rng.choice(SERVER_TYPES)
+        event = rng.choice(SERVER_EVENTS)
+        serial_method = rng.choice((protocol.JSON, protocol.NO_SERIALIZATION, protocol.CUSTOM_TYPE))
+    compression = rng.choice((protocol.GZIP, protocol.NO_COMPRESSION))
+    if side == "server" and event in protocol.CONNECTION_EVENTS:
+        session_id = None
+    else:
+        session_id = rng.choice(("", str(uuid.UUID(int=rng.getrandbits(128))), "会话-" + str(rng.randint(0, 99))))
+    payload = random_payload(rng, serial_method)
+    frame = protocol.build_frame(event, payload, session_id, message_type=message_type,
+                                 serial_method=serial_method, compression_type=compression)
+    if side == "server":
+        expected = {"message_type": message_type, "event": event, "payload_msg": payload}
+        if session_id is not None:
+            expected["session_id"] = session_id
+    else:
+        expected = {"message_type": "SERVER_ACK" if message_type == protocol.SERVER_ACK else "SERVER_FULL_RESPONSE",
+                    "event": event, "session_id": session_id, "payload_msg": payload}
+        raw = payload if isinstance(payload, bytes) else (
+            json.dumps(payload, ensure_ascii=False) if isinstance(payload, dict) else payload).encode("utf-8")
+        expected["payload_size"] = len(protocol.compress(raw)) if compression == protocol.GZIP else len(raw)
+    return side, frame, expected
+
+
+def corpus_cases() -> list:
+    """生成语料：每种消息类型/序列化/压缩的合法帧，加上畸形帧"""
+    sid = "5f0c8c4e-2f4a-4a57-9d4b-6d3c6f7e1a20"
+    cases = [
+        ("StartConnection", "server", protocol.build_frame(1, {})),
+        ("FinishConnection", "server", protocol.build_frame(2, {})),
+        ("StartSession", "server", protocol.build_frame(100, {"dialog": {"bot_name": "豆包"}}, sid)),
+        ("FinishSession", "server", protocol.build_frame(102, {}, sid)),
+        ("TaskRequest gzip", "server", protocol.build_frame(
+            200, bytes(range(256)) * 2, sid, message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
+            serial_method=protocol.NO_SERIALIZATION)),
+        ("TaskRequest raw", "server", protocol.build_frame(
+            200, bytes(64), sid, message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
+            serial_method=protocol.NO_SERIALIZATION, compression_type=protocol.NO_COMPRESSION)),
+        ("ChatTTSText", "server", protocol.build_frame(500, {"start": True, "content": TEXT, "end": False}, sid)),
+        ("ChatTextQuery", "server", protocol.build_frame(501, {"content": TEXT}, sid)),
+        ("ChatTextQuery 空session id", "server", protocol.build_frame(501, {"content": ""}, "")),
+        ("ConnectionStarted", "client", protocol.build_frame(50, {}, "", message_type=protocol.SERVER_FULL_RESPONSE)),
+        ("SessionStarted", "client", protocol.build_frame(150, {"dialog_id": "d-1"}, sid,
+                                                         message_type=protocol.SERVER_FULL_RESPONSE)),
+        ("TTSResponse raw", "client", protocol.build_frame(
+            352, bytes(range(200)), sid, message_type=protocol.SERVER_ACK,
+            serial_method=protocol.NO_SERIALIZATION, compression_type=protocol.NO_COMPRESSION)),
+        ("TTSResponse gzip", "client", protocol.build_frame(
+            352, bytes(800), sid, message_type=protocol.SERVER_ACK, serial_method=protocol.NO_SERIALIZATION)),
+        ("TTSResponse 空音频", "client", protocol.build_frame(
+            352, b"", sid, message_type=protocol.SERVER_ACK, serial_method=protocol.NO_SERIALIZATION,
+            compression_type=protocol.NO_COMPRESSION)),
+        ("ASRResponse json", "client", protocol.build_frame(
+            451, {"results": [{"text": TEXT, "is_interim": False}]}, sid, message_type=protocol.SERVER_FULL_RESPONSE,
+            compression_type=protocol.NO_COMPRESSION)),
+        ("ChatResponse custom", "client", protocol.build_frame(
+            550, TEXT, sid, message_type=protocol.SERVER_FULL_RESPONSE, serial_method=protocol.CUSTOM_TYPE)),
+        ("ServerError", "client", error_frame(45000001, {"error": "invalid session"})),
+        ("带序号的帧", "client", with_sequence(protocol.build_frame(
+            359, {}, sid, message_type=protocol.SERVER_FULL_RESPONSE), 7)),
+        ("未知消息类型", "client", protocol.build_frame(1, {}, sid, message_type=0b0101)),
+        ("文本帧", "client", "text frame"),
+    ]
+    good = protocol.build_frame(451, {"results": []}, sid, message_type=protocol.SERVER_FULL_RESPONSE)
+    offset = 8  # header + event
+    negative = good[:offset] + (-1).to_bytes(4, "big", signed=True) + good[offset + 4:]
+    huge_payload = good[:offset + 4 + len(sid)] + (2 ** 32 - 1).to_bytes(4, "big") + good[offset + 8 + len(sid):]
+    bad_gzip = protocol.build_frame(451, b"not gzip", sid, message_type=protocol.SERVER_FULL_RESPONSE,
+                                    serial_method=protocol.NO_SERIALIZATION, compression_type=protocol.NO_COMPRESSION)
+    bad_gzip = bad_gzip[:2] + bytes([protocol.GZIP]) + bad_gzip[3:]
+    request = protocol.build_frame(100, {}, sid)
+    cases += [
+        ("session id长度为负", "client", negative),
+        ("session id长度越界", "client", good[:offset] + (10 ** 6).to_bytes(4, "big") + good[offset + 4:]),
+        ("负载长度越界", "client", huge_payload),
+        ("负载被截断", "client", good[:-3]),
+        ("缺少负载长度", "client", good[:offset + 4 + len(sid) + 2]),
+        ("只有帧头", "client", good[:4]),
+        ("空帧", "client", b""),
+        ("帧头长度为0", "client", bytes([0x10]) + good[1:]),
+        ("帧头长度超出帧长", "client", bytes([0x1f]) + good[1:8]),
+        ("session id非utf-8", "client", good[:offset + 4] + b"\xff" * len(sid) + good[offset + 4 + len(sid):]),
+        ("负载不是gzip", "client", bad_gzip),
+        ("请求session id长度为负", "server", request[:offset] + (-1).to_bytes(4, "big", signed=True)
+         + request[offset + 4:]),
+        ("请求负载被截断", "server", request[:-1]),
+        ("请求缺少事件号", "server", request[:6]),
+    ]
+    return cases
+
+
+def check_corpus() -> list:
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    failures = []
+    for entry in corpus:
+        frame = entry["text"] if "text" in entry else bytes.fromhex(entry["frame"])
+        actual = decode(entry["side"], frame)
+        if actual != entry["expected"]:
+            failures.append(f"语料[{entry['name']}]: 期望 {entry['expected']}, 实际 {actual}")
+    print(f"语料: {len(corpus)} 帧, 不一致 {len(failures)}")
+    return failures
+
+
+def save_corpus() -> None:
+    corpus = []
+    for name, side, frame in corpus_cases():
+        entry = {"name": name, "side": side}
+        if isinstance(frame, str):
+            entry["text"] = frame
+        else:
+            entry["frame"] = frame.hex()
+        entry["expected"] = decode(side, frame)
+        corpus.append(entry)
+    with open(CORPUS, "w", encoding="utf-8") as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=1)
+    print(f"语料已写入: {CORPUS} ({len(corpus)} 帧)")
+
+
+def check_round_trip(rng: random.Random, iterations: int) -> list:
+    failures = []
+    for index in range(iterations):
+        side, frame, expected = random_case(rng)
+        try:
+            actual = parse(side, frame)
+        except protocol.ProtocolError as e:
+            failures.append(f"往返#{index}: 合法帧解码失败: {e}")
+            continue
+        if normalize(actual) != normalize(expected):
+            failures.append(f"往返#{index}: 期望 {normalize(expected)}, 实际 {normalize(actual)}")
+        message_type, event = protocol.frame_info(frame)
+        if message_type != frame[1] >> 4 or event != expected["event"]:
+            failures.append(f"往返#{index}: frame_info {message_type, event}, 期望事件 {expected['event']}")
+    print(f"往返: {iterations} 帧, 不一致 {len(failures)}")
+    return failures
+
+
+def mutate(rng: random.Random, frame: bytes) -> bytes:
+    kind = rng.choice(("truncate", "flip", "size"))
+    if kind == "truncate":
+        return frame[:rng.randrange(len(frame))]
+    if kind == "flip":
+        data = bytearray(frame)
+        for _ in range(rng.randint(1, 4)):
+            data[rng.randrange(len(data))] ^= 1 << rng.randrange(8)
+        return bytes(data)
+    # 把帧头之后任意位置的4字节改成超出帧长的值（可能落在长度字段上）
+    offset = rng.randrange(4, max(len(frame) - 4, 5))
+    value = rng.choice((2 ** 32 - 1, 2 ** 31, len(frame), len(frame) + 1))
+    return frame[:offset] + value.to_bytes(4, "big") + frame[offset + 4:]
+
+
+def check_mutations(rng: random.Random, iterations: int) -> list:
+    failures, errors = [], 0
+    for index in range(iterations):
+        side, frame, _ = random_case(rng)
+        mutated = mutate(rng, frame)
+        try:
+            parse(side, mutated)
+        except protocol.ProtocolError:
+            errors += 1
+        except Exception as e:  # noqa: BLE001
+            failures.append(f"变异#{index}: 抛出了{type(e).__name__}: {e} 帧 {mutated[:48].hex()}")
+    # 截断：合法帧的每个真前缀都必须报错
+    truncations = 0
+    for _ in range(max(iterations // 20, 1)):
+        side, frame, _ = random_case(rng)
+        for length in range(min(len(frame), 96)):
+            truncations += 1
+            try:
+                parse(side, frame[:length])
+                failures.append(f"截断: {len(frame)}字节的帧截到{length}字节仍被解析 {frame[:48].hex()}")
+            except protocol.ProtocolError:
+                pass
+            except Exception as e:  # noqa: BLE001
+                failures.append(f"截断: 抛出了{type(e).__name__}: {e}")
+    print(f"变异: {iterations} 帧 (ProtocolError {errors}), 截断 {truncations} 帧, 异常 {len(failures)}")
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="二进制帧的往返与模糊检查")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-corpus", action="store_true", help="按当前protocol.py重新生成语料")
+    args = parser.parse_args()
+
+    if args.save_corpus:
+        save_corpus()
+    rng = random.Random(args.seed)
+    failures = check_corpus() + check_round_trip(rng, args.iterations) + check_mutations(rng, args.iterations)
+    if failures:
+        print("检查失败:\n  " + "\n  ".join(failures[:20]))
+        sys.exit(1)
+    print("检查通过")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+import collections
+import threading
+from typing import Any, Deque, Dict, Optional
+
+import metrics
+
+POOL_BUFFERS = metrics.REGISTRY.counter(
+    "realtime_dialog_buffer_pool_total", "下行音频缓冲池的取用和归还次数", ["pool", "result"])
+POOL_FREE = metrics.REGISTRY.gauge("realtime_dialog_buffer_pool_free", "缓冲池中空闲的缓冲数", ["pool"])
+
+
+class PooledBuffer:
+    """从BufferPool取出的一块音频，用完后调用release()归还
+
+    view为底层缓冲的memoryview切片（不复制），可以直接交给声卡流、音频进程和文件的write，使用方不应修改；
+    需要在归还后继续保留数据的地方（如缓存录制）应先bytes(buffer)复制一份。
+    """
+    __slots__ = ("_pool", "_memory", "size")
+
+    def __init__(self, pool: Optional["BufferPool"], memory: memoryview, size: int):
+        self._pool = pool
+        self._memory = memory  # 随底层bytearray一起复用
+        self.size = size
+
+    @property
+    def view(self) -> memoryview:
+        return self._memory[:self.size]
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __bytes__(self) -> bytes:
+        return bytes(self._memory[:self.size])
+
+    def release(self) -> None:
+        """归还到缓冲池，重复调用无效"""
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool._release(self._memory)
+
+
+AUDIO_TYPES = (bytes, PooledBuffer)
+
+
+def audio_view(audio: Any) -> Any:
+    """写出音频时使用：PooledBuffer取只读视图，bytes原样返回"""
+    return audio.view if type(audio) is PooledBuffer else audio
+
+
+def release(audio: Any) -> None:
+    """sink写完或丢弃一块音频后调用，bytes不需要归还"""
+    if type(audio) is PooledBuffer:
+        audio.release()
+
+
+class BufferPool:
+    """下行音频的缓冲池：固定大小的bytearray空闲链表
+
+    接收时把帧里的音频负载复制进取出的缓冲（代替每帧切片出新的bytes），
+    播放线程写出后归还，稳态下不再为音频负载分配内存。
+    超过buffer_size的负载单独分配且不回收；空闲缓冲超过max_free时直接丢弃。
+    取出和归还分别在接收/解码线程和播放线程中进行，空闲链表和计数的更新在同一把锁内完成。
+    """
+
+    def __init__(self, buffer_size: int = 16384, max_free: int = 256, name: str = "downlink"):
+        self.buffer_size = buffer_size
+        self.max_free = max_free
+        self.name = name
+        self._free: Deque[memoryview] = collections.deque()
+        self._lock = threading.Lock()
+        # 计数直接用指标的子项，report()从中读取
+        self._reused, self._allocated, self._oversize, self._released, self._discarded = (
+            POOL_BUFFERS.labels(name, result) for result in ("reused", "allocated", "oversize", "released", "discarded"))
+        POOL_FREE.labels(name).set_function(lambda: len(self._free))
+
+    def acquire(self, size: int) -> PooledBuffer:
+        """取一块能容纳size字节的缓冲，内容未初始化"""
+        if size > self.buffer_size:
+            with self._lock:
+                self._oversize.inc()
+            return PooledBuffer(None, memoryview(bytearray(size)), size)
+        with self._lock:
+            if self._free:
+                memory = self._free.pop()
+                self._reused.inc()
+            else:
+                memory = None
+                self._allocated.inc()
+        if memory is None:
+            memory = memoryview(bytearray(self.buffer_size))
+        return PooledBuffer(self, memory, size)
+
+    def copy(self, data: Any, start: int = 0, size: Optional[int] = None) -> PooledBuffer:
+        """把data[start:start + size]复制进取出的缓冲，不产生中间的bytes"""
+        if size is None:
+            size = len(data) - start
+        pooled = self.acquire(size)
+        pooled._memory[:size] = memoryview(data)[start:start + size]
+        return pooled
+
+    def _release(self, memory: memoryview) -> None:
+        with self._lock:
+            if len(self._free) >= self.max_free:
+                self._discarded.inc()
+                return
+            self._free.append(memory)
+            self._released.inc()
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {name: int(counter.value) for name, counter in (
+                ("reused", self._reused), ("allocated", self._allocated), ("oversize", self._oversize),
+                ("released", self._released), ("discarded", self._discarded))}
+            stats["free"] = len(self._free)
+        stats["acquired"] = stats["reused"] + stats["allocated"] + stats["oversize"]
+        stats["hit_rate"] = stats["reused"] / stats["acquired"] if stats["acquired"] else 0.0
+        return stats
@@ -1,38 +1,67 @@
+import copy
+import json
+import os
 import uuid
-import pyaudio
-
-
-# 配置信息
-ws_connect_config = {
-    "base_url": "wss://openspeech.bytedance.com/api/v3/realtime/dialogue",
-    "headers": {
-        "X-Api-App-ID": "6981260316",
-        "X-Api-Access-Key": "Ife30VdFFCt03XzT8kywk625dBjkGckR",
-        "X-Api-Resource-Id": "volc.speech.dialog",
-        "X-Api-App-Key": "PlgvMymc7f3tQnJ6",
-        "X-Api-Connect-Id": str(uuid.uuid4()),
-    }
+from typing import Dict, Any, Optional, Mapping
+
+# 配置加载顺序：内置默认值 < 配置文件(JSON) < 环境变量
+# 配置文件路径可通过 REALTIME_DIALOG_CONFIG 指定，默认读取本目录下的 config.json（不存在则忽略）
+CONFIG_FILE_ENV = "REALTIME_DIALOG_CONFIG"
+DEFAULT_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+
+# 环境变量 -> (配置段, 字段路径)
+ENV_OVERRIDES = {
+    "REALTIME_DIALOG_BASE_URL": ("ws_connect_config", ("base_url",)),
+    "REALTIME_DIALOG_APP_ID": ("ws_connect_config", ("headers", "X-Api-App-ID")),
+    "REALTIME_DIALOG_ACCESS_KEY": ("ws_connect_config", ("headers", "X-Api-Access-Key")),
+    "REALTIME_DIALOG_RESOURCE_ID": ("ws_connect_config", ("headers", "X-Api-Resource-Id")),
+    "REALTIME_DIALOG_APP_KEY": ("ws_connect_config", ("headers", "X-Api-App-Key")),
+    "REALTIME_DIALOG_RECORD": ("ws_connect_config", ("record_path",)),
+    "AZURE_OPENAI_API_KEY": ("azure_openai_config", ("api_key",)),
+    "AZURE_OPENAI_ENDPOINT": ("azure_openai_config", ("azure_endpoint",)),
+    "AZURE_OPENAI_API_VERSION": ("azure_openai_config", ("api_version",)),
+    "AZURE_OPENAI_MODEL": ("azure_openai_config", ("model",)),
 }
 
-start_session_req = {
-    "tts": {
-        "audio_config": {
-            "channel": 1,
-            "format": "pcm",
-            "sample_rate": 24000
-        },
+# 默认配置（不包含任何密钥，密钥请通过环境变量或配置文件提供）
+DEFAULTS = {
+    "ws_connect_config": {
+        "base_url": "wss://openspeech.bytedance.com/api/v3/realtime/dialogue",
+        "headers": {
+            "X-Api-App-ID": "",
+            "X-Api-Access-Key": "",
+            "X-Api-Resource-Id": "volc.speech.dialog",
+            "X-Api-App-Key": "PlgvMymc7f3tQnJ6",
+        }
     },
-    "dialog": {
-        "bot_name": "豆包",
+    "start_session_req": {
+        "tts": {
+            "audio_config": {
+                "channel": 1,
+                "format": "pcm",
+                "sample_rate": 24000
+            },
+        },
+        "dialog": {
+            "bot_name": "豆包",
         }
+    },
+    "azure_openai_config": {
+        "api_key": "",
+        "azure_endpoint": "",
+        "api_version": "2024-08-01-preview",
+        "model": "gpt-4o-mini",
+        "timeout": 30.0,
+    },
 }
 
+# 采样格式使用pyaudio常量名表示，打开音频设备时再解析，导入本模块不会加载pyaudio
 input_audio_config = {
     "chunk": 3200,
     "format": "pcm",
     "channels": 1,
     "sample_rate": 16000,
-    "bit_size": pyaudio.paInt16
+    "bit_size": "paInt16"
 }
 
 output_audio_config = {
@@ -40,5 +69,62 @@ output_audio_config = {
     "format": "pcm",
     "channels": 1,
     "sample_rate": 24000,
-    "bit_size": pyaudio.paFloat32
+    "bit_size": "paFloat32"
+}
+
+SAMPLE_WIDTHS = {
+    "paInt16": 2,
+    "paFloat32": 4,
 }
+
+
+def sample_width(bit_size: str) -> int:
+    """返回采样格式对应的字节数"""
+    return SAMPLE_WIDTHS[bit_size]
+
+
+def _merge(base: Dict[str, Any], override: Mapping[str, Any]) -> Dict[str, Any]:
+    """递归合并配置字典"""
+    for key, value in override.items():
+        if isinstance(value, Mapping) and isinstance(base.get(key), dict):
+            _merge(base[key], value)
+        else:
+            base[key] = copy.deepcopy(value)
+    return base
+
+
+def load(path: Optional[str] = None, environ: Optional[Mapping[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+    """加载配置，每次调用返回新的字典"""
+    environ = os.environ if environ is None else environ
+    settings = copy.deepcopy(DEFAULTS)
+
+    path = path or environ.get(CONFIG_FILE_ENV) or DEFAULT_CONFIG_FILE
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            _merge(settings, json.load(f))
+    elif path != DEFAULT_CONFIG_FILE:
+        raise FileNotFoundError(f"配置文件不存在: {path}")
+
+    for env_name, (section, keys) in ENV_OVERRIDES.items():
+        value = environ.get(env_name)
+        if value is None:
+            continue
+        target = settings[section]
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return settings
+
+
+def connect_headers(headers: Mapping[str, str]) -> Dict[str, str]:
+    """为每个WebSocket连接生成独立的X-Api-Connect-Id"""
+    return {**headers, "X-Api-Connect-Id": str(uuid.uuid4())}
+
+
+def __getattr__(name: str) -> Any:
+    """首次访问配置段时才读取配置文件和环境变量"""
+    if name in DEFAULTS:
+        settings = load()
+        globals().update(settings)
+        return settings[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,1227 @@
+# configurable_training_manager.py
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional, List, Awaitable, AsyncIterator, Tuple
+from audio_manager import DialogSession
+from audio_engine import shared_engine
+from buffer_pool import AUDIO_TYPES, BufferPool, release
+from audio_process import AudioProcess
+import config as app_config
+import loop_monitor
+import metrics
+from llm_backend import LLMBackend, LLMClient, LLMResult, create_backend
+from response_cache import ResponseCache
+from conversation_memory import ConversationMemory, message_tokens
+from tts_segmenter import StreamingSegmenter, split_text
+from turn_manager import TurnManager
+from intent import Intent, IntentMatch, IntentMatcher, IntentTracker
+from speculation import SpeculativeResponder, SpeculativeGeneration
+from uplink_controller import AdaptiveUplink
+from uplink_gate import UplinkGate
+
+SUMMARY_PARAMS = {"temperature": 0.7, "max_tokens": 400, "top_p": 0.95}
+SUMMARY_PREFIX = "培训总结："
+SUMMARY_CLOSING = "\n\n感谢大家参与今天的《企业出海》培训课程！"
+
+TURN_LATENCY = metrics.REGISTRY.histogram(
+    "realtime_dialog_turn_latency_seconds",
+    "每轮从收到最终ASR结果到首段TTS文本发出(first_tts)和全部发出(total)的延迟", ["mode", "stage"])
+
+
+class ConfigurableTrainingManager:
+    def __init__(self, ws_config: Dict[str, Any], config: Dict[str, Any] = None,
+                 llm_backend: Optional[LLMBackend] = None, session: Optional[DialogSession] = None):
+        self.session = session
+        self.conversation_state = "greeting"
+        self.current_topic = None
+        self.conversation_history = []
+        self.round_count = 0
+        self.max_rounds = 6
+        self.douban_initialized = False
+        self.role_init_attempts = 0  # 角色初始化尝试次数(弃用）
+        self.max_init_attempts = 3  # 最大初始化尝试次数（弃用）
+        self.training_completed = False  # 新增：标记培训是否完成
+        self.summary_sent = False  # 新增：标记总结是否已发送
+        self.first_tts_time = None  # 本轮首段TTS发出时刻
+        self.turns = TurnManager()  # GPT-4o模式下的回合序号与取消
+        self.replied_round = 0  # GPT-4o模式下最近一次完成回复的轮数
+        self.last_reply_end_round = 0  # 豆包模式下最近一次回复结束(559)时的轮数
+        self.summary_task = None  # 后台更新滚动总结的任务
+        self.running_summary = ""  # 滚动更新的培训总结正文
+        self.summarized_entries = 0  # 已合并进滚动总结的对话历史条数
+        self.summary_target = 0  # 后台任务需要合并到的对话历史条数
+        self.turn_latencies = []  # 每轮的首段TTS延迟记录
+
+        # 配置参数
+        default_config = {
+            "use_gpt4o": True,
+            "enable_gpt4o_logging": True,
+            "enable_douban_logging": True,
+            "max_rounds": 6,
+            "response_length_limit": 200,
+            "temperature": 0.85,
+            "enable_round_control": True,
+            "douban_role_init": True,
+            "auto_disconnect": False,  # 新增：是否自动断开连接
+            "llm_backend": "azure",  # LLM后端：azure / stub / scripted，或register_backend注册的名称
+            "llm_backend_options": {},  # 传给后端工厂的参数，如scripted的ttft、tokens_per_second
+            "llm_timeout": 30.0,  # 单次LLM调用超时（秒）
+            "llm_max_concurrency": 2,  # 单个会话同时进行的LLM调用上限
+            "stream_tts": True,  # GPT-4o流式输出，边生成边分句发送TTS
+            "tts_max_length": 120,  # 单次ChatTTSText的最大字数
+            "tts_first_chunk_length": 8,  # 流式首段达到该字数即可在分句标点处发送
+            "speculative_asr": False,  # 基于稳定的ASR中间结果提前生成回复（需开启stream_tts）
+            "speculation_stable_count": 2,  # 中间结果连续不变多少次视为稳定
+            "speculation_similarity": 0.85,  # 最终结果与推测文本的相似度阈值
+            "enable_response_cache": True,  # 缓存固定内容的LLM文本和TTS音频
+            "response_cache_dir": os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "responses"),
+            "enable_conversation_memory": True,  # 按token预算保留近期对话，较早的对话折叠为摘要
+            "memory_token_budget": 1200,  # 对话历史（不含system prompt）的token预算
+            "memory_keep_recent": 4,  # 始终保留原文的最近消息条数
+            "precompute_summary": True,  # 每轮问答结束后在后台把本轮对话增量合并进培训总结
+            "reply_wait_timeout": 3.0,  # 发送总结前等待最后一轮回复结束的最长时间（秒）
+            "metrics_port": None,  # 设置后在该端口提供Prometheus格式的/metrics
+            "loop_watchdog": True,  # 监测事件循环阻塞并输出阻塞处的调用栈
+            "loop_lag_threshold": 0.1,  # 事件循环阻塞超过该时长（秒）时抓取调用栈
+            "loop_profile": False,  # 采样剖析事件循环，会话结束时输出本会话各函数占用的时间
+            # 上行门控：播放TTS期间丢弃(half_duplex)或静音(duck)麦克风上行，用户插话时按能量打开（见uplink_gate.py）
+            "uplink_gate": {"mode": "off", "hold": 0.4, "barge_in_rms": 2000, "barge_in_frames": 2},
+            "audio_process": False,  # 在独立进程中读写声卡，通过共享内存环形缓冲交换PCM（见audio_process.py）
+            "audio_engine": False,  # 使用进程内共享的音频引擎（一个调度线程、按字节预算的播放缓冲，见audio_engine.py）
+            "buffer_pool": False,  # 下行音频解码进可复用的缓冲池，播放后归还（见buffer_pool.py）
+            # 拥塞自适应上行：按ping往返时延和积压合并帧、降低采样精度、静音置零、丢弃过期帧（见uplink_controller.py）
+            "uplink_controller": {"mode": "off", "degrade_delay": 0.3, "max_lag": 2.0},
+            # 控制意图：短语命中覆盖整句的比例即置信度，中间结果达到interim_confidence即生效（见intent.py）
+            "intents": {
+                "end": {
+                    "phrases": ["结束", "结束培训", "培训结束", "结束会话", "结束对话",
+                                "bye", "goodbye", "再见", "结束了", "停止", "退出"],
+                    "interim_confidence": 0.6,
+                    "interim_stable": 2,  # 误结束代价高：连续两个中间结果都命中才生效
+                },
+                "skip": {  # 仅GPT-4o模式
+                    "phrases": ["跳过", "下一题", "换个问题", "换一个问题", "skip"],
+                    "interim_confidence": 0.6,
+                },
+            },
+            "intent_on_interim": True,  # 在ASR中间结果上识别控制意图
+            # 豆包角色初始化回复中的确认关键词
+            "role_keywords": ["明白", "培训师", "企业", "出海", "课程", "中能科技", "讲师",
+                              "做企业培训", "培训", "教", "负责", "学习", "案例"],
+        }
+
+        self.config = {**default_config, **(config or {})}
+        self.max_rounds = self.config["max_rounds"]
+        if self.session is None:
+            self.session = DialogSession(ws_config,
+                                         audio_process=AudioProcess() if self.config["audio_process"] else None,
+                                         audio_engine=shared_engine() if self.config["audio_engine"] else None,
+                                         buffer_pool=BufferPool() if self.config["buffer_pool"] else None)
+
+        self.print_config()
+
+        # 初始化异步LLM客户端；未注入后端时按配置创建（azure后端仅在此时导入openai）
+        if self.config["use_gpt4o"] or self.config["douban_role_init"]:
+            if llm_backend is None:
+                llm_backend = create_backend(self.config["llm_backend"], self.config["llm_backend_options"])
+                print(f"LLM后端 {self.config['llm_backend']} 初始化成功")
+            self.llm = LLMClient(
+                llm_backend,
+                max_concurrency=self.config["llm_max_concurrency"],
+                timeout=self.config["llm_timeout"],
+            )
+        else:
+            self.llm = None
+            print("使用豆包原生回复模式")
+
+        # 对话记忆：近期原文 + 后台增量摘要，控制每轮请求的token数
+        self.memory = None
+        if self.config["enable_conversation_memory"]:
+            self.memory = ConversationMemory(
+                summarize=self.summarize_history if self.llm else None,
+                budget_tokens=self.config["memory_token_budget"],
+                keep_recent=self.config["memory_keep_recent"],
+            )
+        self.last_prompt_tokens = 0  # 最近一次讲师回复请求的估算token数
+
+        # 固定内容缓存：开场白、角色初始化指令、备用总结等
+        self.cache = ResponseCache(self.config["response_cache_dir"]) if self.config["enable_response_cache"] else None
+        self.tts_capture = None  # 正在录制的下行TTS音频 {"key": 缓存键, "chunks": 音频块, "started": 是否已收到350}
+
+        # 控制意图与角色确认关键词各编译为一个多模式匹配器
+        self.intents = IntentTracker(IntentMatcher.from_config(self.config["intents"]))
+        self.role_matcher = IntentMatcher([Intent("role_confirmed", self.config["role_keywords"])])
+
+        if self.config["uplink_gate"].get("mode", "off") != "off" and self.session.uplink_gate is None:
+            self.session.set_uplink_gate(UplinkGate.from_config(self.config["uplink_gate"]))
+        if self.config["uplink_controller"].get("mode", "off") != "off" and self.session.uplink_controller is None:
+            self.session.uplink_controller = AdaptiveUplink.from_config(self.config["uplink_controller"])
+
+        # 推测生成只作用于GPT-4o流式回复
+        self.speculator = None
+        if self.config["speculative_asr"] and self.config["use_gpt4o"] and self.config["stream_tts"]:
+            self.speculator = SpeculativeResponder(
+                self.start_speculative_stream,
+                stable_count=self.config["speculation_stable_count"],
+                similarity_threshold=self.config["speculation_similarity"],
+            )
+
+        # 培训讲师的System Prompt
+        self.system_prompt = """
+你现在的角色是一个资深企业培训师，你的学生来培训的目标是学习一门课程，课程的名字是：《出海》。你的任务是和你的学员进行互动问答，任务要求如下：
+1.和学员进行总轮数为6轮的互动问答，最终目的是让学员结合案例学习到课程《出海》中的知识内容。
+2.如果学员回复的答案不好，要有耐心，并引导学员往正确的学习方向回答。
+3.学员通过案例要回答的问题为：企业如何正确地审视自身，并根据自身的条件和外部环境制定出海战略？
+4.你的第一次回复应该是提问问题。当认为学员学习完成了本次课程的内容，基于学员对问题的回答做一个总结和概括学员的学习情况。
+5.每次提问和回答都尽量结合案例，让用户结合本次材料的案例来回答和分析。
+
+案例故事：中能科技
+[2021年初，中能科技的董事长李总在企业战略会上指出，国内新能源电池行业已经高度饱和，国内竞争异常激烈，利润空间大幅缩小。通过市场分析，欧洲新能源产业正在快速崛起，并且欧洲多国对新能源电池行业表现出强烈的政策支持。
+  董事会决定由战略部门、研发部门、法务部门共同成立海外事业小组，专门负责欧洲市场的拓展工作。海外事业小组花费半年时间进行市场调研、风险分析和政策研究，最终决定选择在德国建立首个示范工厂和研发中心。
+  他们首先聘请了国际咨询公司，明确了当地政策环境、竞争格局以及准入门槛。同时，迅速开展商务法律谈判，严格锁定了土地成本和基础设施配套费用，避免了不可控的成本上涨风险。
+中能科技积极推行"属地化"管理，聘请了许多当地资深技术和管理人才，组建了国际化团队，以融合当地文化和市场。李总还积极地参加当地新能源产业论坛，与当地政府和企业领袖建立起良好的个人关系和信任基础。
+  示范项目的成功，引起了德国及周边国家的关注，逐渐中能科技在欧洲市场声誉鹊起。同时企业发现，欧洲政府特别看重智能化和绿色能源方案，于是中能科技进一步加大研发投入，将企业原有的新能源技术与人工智能结合起来，打造出了"智慧储能解决方案"。该解决方案在当地大受欢迎，进一步提升了企业竞争优势和品牌影响力。
+  在成功运营的基础上，中能科技又牵头带动国内上下游相关企业一起出海欧洲，构建了完整的新能源产业链集群，与当地政府签订了长期战略合作协议，形成了"政企合作"的良性发展格局。]
+
+请根据当前是第几轮对话来调整你的提问深度和引导方式。每次回复请控制在150-200字以内，保持培训讲师的专业性和亲和力。
+"""
+
+    def print_config(self):
+        """打印当前配置"""
+        print("\n" + "=" * 50)
+        print("参数设置")
+        print("=" * 50)
+        print(f"回复模型: {'GPT-4o' if self.config['use_gpt4o'] else '豆包'}")
+        print(f"豆包角色初始化: {'开启' if self.config['douban_role_init'] else '关闭'}")
+        print(f"最大轮数: {self.config['max_rounds']}")
+        print(f"回复长度限制: {self.config['response_length_limit']}字")
+        print(f"GPT-4o Temperature: {self.config['temperature']}")
+        print(f"GPT-4o日志: {'开启' if self.config['enable_gpt4o_logging'] else '关闭'}")
+        print(f"豆包日志: {'开启' if self.config['enable_douban_logging'] else '关闭'}")
+        print(f"轮数控制: {'开启' if self.config['enable_round_control'] else '关闭'}")
+        print(f"自动断开连接: {'开启' if self.config['auto_disconnect'] else '关闭'}")
+        print(f"LLM后端: {self.config['llm_backend']}")
+        print(f"LLM调用超时: {self.config['llm_timeout']}秒, 并发上限: {self.config['llm_max_concurrency']}")
+        print(f"流式TTS: {'开启' if self.config['stream_tts'] else '关闭'}, "
+              f"分段上限: {self.config['tts_max_length']}字, 首段: {self.config['tts_first_chunk_length']}字")
+        print(f"推测生成: {'开启' if self.config['speculative_asr'] else '关闭'}")
+        print(f"固定内容缓存: {'开启' if self.config['enable_response_cache'] else '关闭'}")
+        print(f"对话记忆: {'开启, 预算' + str(self.config['memory_token_budget']) + 'token' if self.config['enable_conversation_memory'] else '关闭'}")
+        print("=" * 50 + "\n")
+
+    async def initialize_douban_role(self):
+        """使用GPT-4o生成豆包角色初始化内容"""
+        try:
+            print("开始初始化豆包角色...")
+
+            role_init_prompt = """
+请生成一段明确的角色设定指令，用来告诉豆包AI它现在要扮演的角色。
+
+具体要求：
+1. 直接告诉它："你现在是一位资深企业培训师"
+2. 明确课程名称：《企业出海》培训课程
+3. 说明培训目标：通过中能科技案例学习企业出海战略制定
+4. 要求它进行6轮互动问答
+5. 让它在理解后回复："明白了，我现在是企业培训师，负责《企业出海》课程培训"
+6. 语气要像给AI下达明确指令，使用"你现在要..."、"你的任务是..."等
+7. 控制在150字以内，确保指令清晰明确
+
+请直接给出这段角色设定指令。
+"""
+
+            messages = [
+                {"role": "system", "content": "你是一个AI指令生成助手，专门生成清晰明确的角色设定指令。"},
+                {"role": "user", "content": role_init_prompt}
+            ]
+
+            response = await self.cached_complete(
+                messages,
+                temperature=0.1,  # 降低温度确保指令更准确
+                max_tokens=200,
+            )
+
+            role_init_text = response.text
+            print(f"角色初始化指令生成完成")
+            print(f"指令内容: {role_init_text}")
+
+            return role_init_text
+
+        except Exception as e:
+            print(f"生成豆包角色初始化失败: {e}")
+            # 提供更明确的备用初始化文本
+            return """你现在要扮演一位资深企业培训师，负责《企业出海》培训课程。你的任务是基于中能科技进军欧洲的案例，与学员进行6轮互动问答，引导他们学习企业如何制定出海战略。请用培训师的专业语气回复，每次150字左右。请回复"明白了，我现在是企业培训师，负责《企业出海》课程培训"确认你的角色。"""
+
+    async def start_configurable_session(self):
+        """启动可配置的培训会话"""
+        startup = self.session.startup
+        if self.config["metrics_port"]:
+            print(f"指标服务: {metrics.serve(self.config['metrics_port']).url}")
+        watchdog = None
+        if self.config["loop_watchdog"] or self.config["loop_profile"]:
+            watchdog = loop_monitor.acquire(threshold=self.config["loop_lag_threshold"])
+            if self.config["loop_profile"]:
+                watchdog.start_profiler()
+        try:
+            # 根据配置选择响应处理器；开场白/角色初始化指令的生成与握手、打开音频设备并行执行
+            if self.config["use_gpt4o"]:
+                self.session.handle_server_response = self.gpt4o_response_handler
+                print("使用 GPT-4o 响应处理器")
+                print("开始生成GPT-4o开场白...")
+                startup.add_stage("opening_line", self.generate_gpt4o_response("开始培训"))
+            else:
+                self.session.handle_server_response = self.douban_response_handler
+                print("使用豆包原生响应处理器")
+                if self.config["douban_role_init"] and self.llm:
+                    startup.add_stage("role_init", self.initialize_douban_role())
+
+            # 就绪屏障：握手和音频设备就绪后即可收发音频
+            await self.session.prepare()
+            self.session.start_receiving()
+
+            if self.config["use_gpt4o"]:
+                try:
+                    opening_response = await startup.result("opening_line")
+                    print(f"开场白生成成功")
+                    await self.send_training_content(opening_response, cacheable=True)
+                except Exception as e:
+                    print(f"GPT-4o开场白生成失败，使用默认开场白: {e}")
+                    default_opening = "大家好！欢迎参加《企业出海》培训课程。让我们从中能科技的案例开始，请问您认为企业在制定出海战略时，首先应该考虑哪些因素？"
+                    await self.send_training_content(default_opening, cacheable=True)
+            elif "role_init" in startup.stage_tasks:
+                await self.perform_role_initialization(startup.result("role_init"))
+
+            # 启动麦克风
+            if self.session.use_microphone:
+                asyncio.create_task(self.session.process_microphone_input())
+
+            while self.session.is_running:
+                # 修改：移除自动断开逻辑，改为手动控制
+                if (self.config["enable_round_control"] and
+                        self.round_count >= self.max_rounds and
+                        not self.training_completed):
+
+                    print(f"已完成 {self.max_rounds} 轮对话，准备发送培训总结...")
+                    self.training_completed = True
+
+                    # 等待最后一轮回复发送完成（总结已在后台预先生成）
+                    await self.wait_for_current_reply()
+
+                    # 发送培训总结
+                    if not self.summary_sent:
+                        await self.send_training_summary()
+                        self.summary_sent = True
+
+                # 检查是否需要自动断开（可配置）
+                if (self.config["auto_disconnect"] and
+                        self.training_completed and
+                        self.summary_sent):
+                    print("培训已完成，5秒后自动断开连接...")
+                    await asyncio.sleep(5)
+                    break
+
+                await asyncio.sleep(0.1)
+
+        except Exception as e:
+            print(f"培训会话错误: {e}")
+        finally:
+            startup.cancel()
+            if self.memory is not None:
+                self.memory.close()
+            if self.summary_task is not None:
+                self.summary_task.cancel()
+            self.turns.cancel("会话结束")
+            self.print_cache_report()
+            self.print_turn_report()
+            self.print_intent_report()
+            if self.session.uplink_gate is not None:
+                print(self.session.uplink_gate.format_report())
+            if self.session.uplink_controller is not None:
+                await self.session.stop_uplink()
+                print(self.session.uplink_controller.format_report())
+            if watchdog is not None:
+                self.print_loop_report(watchdog)
+                loop_monitor.release(watchdog)
+            # 只有在配置为自动断开时才关闭连接
+            if self.config["auto_disconnect"]:
+                try:
+                    print("正在关闭会话连接...")
+                    await self.session.client.close()
+                except Exception as e:
+                    print(f"关闭连接时出错: {e}")
+            else:
+                print("培训已完成，连接保持开启。可继续对话或手动结束。")
+
+    async def send_training_summary(self):
+        """发送培训总结"""
+        try:
+            if self.config["use_gpt4o"] and self.llm:
+                try:
+                    if self.config["stream_tts"]:
+                        summary, _ = await self.stream_tts_text(self.training_summary_stream())
+                    else:
+                        summary = await self.get_training_summary()
+                        await self.send_training_content(summary)
+                    print(f"培训总结内容: {summary}")
+                    print("GPT-4o培训总结发送完成")
+                except Exception as e:
+                    print(f"生成GPT-4o总结失败: {e}")
+                    # 使用备用总结
+                    await self.send_fallback_summary()
+            else:
+                try:
+                    douban_summary = f"请作为培训讲师对学员在{self.max_rounds}轮《企业出海》培训中的表现进行总结。评价学员对中能科技案例的理解和对企业出海战略制定的掌握情况。给出鼓励性的结束语，控制在200字以内。"
+                    print(f"豆包总结指令: {douban_summary}")
+                    # 总结指令要由服务端模型执行，不能用缓存的音频代替
+                    await self.send_training_content(douban_summary)
+                    print("豆包培训总结发送完成")
+                except Exception as e:
+                    print(f"发送豆包总结失败: {e}")
+                    await self.send_fallback_summary()
+        except Exception as e:
+            print(f"发送培训总结失败: {e}")
+
+    async def send_fallback_summary(self):
+        """发送备用总结"""
+        fallback_summary = """感谢大家参加今天的《企业出海》培训课程！
+        
+    通过刚才的6轮互动交流，我们一起深入分析了中能科技成功进军欧洲市场的案例。希望大家能够从中领悟到企业制定出海战略的关键要素：深入的市场调研、准确的自我定位、属地化的经营策略，以及持续的创新能力。
+    
+    祝愿大家在今后的工作中能够运用这些知识，为企业的国际化发展贡献力量！如果还有任何问题，欢迎继续交流讨论。"""
+
+        print(f"备用培训总结内容: {fallback_summary}")  # 新增这行
+        await self.send_training_content(fallback_summary, cacheable=True)
+        print("备用培训总结发送完成")
+
+    async def perform_role_initialization(self, role_init: Optional[Awaitable[str]] = None):
+        """执行角色初始化流程，role_init为启动阶段预取的指令生成任务"""
+        try:
+            role_init_text = await (role_init or self.initialize_douban_role())
+            print("发送豆包角色初始化指令...")
+            # 角色初始化指令要送达服务端模型，不能用缓存的音频代替
+            await self.send_training_content(role_init_text)
+
+            # 等待豆包处理角色设定
+            print("等待豆包确认角色...")
+            await asyncio.sleep(3)
+
+            # 设置初始化超时
+            self.role_init_start_time = time.time()
+
+        except Exception as e:
+            print(f"豆包角色初始化失败: {e}")
+            # 如果初始化失败，直接标记为已初始化，开始正常培训
+            self.douban_initialized = True
+
+    def gpt4o_response_handler(self, response: Dict[str, Any]):
+        """GPT-4o模式的响应处理器"""
+        if response == {}:
+            return
+        self.capture_tts_audio(response)
+
+        if self.config["enable_gpt4o_logging"]:
+            pass
+
+        if response['message_type'] == 'SERVER_ACK' and isinstance(response.get('payload_msg'), AUDIO_TYPES):
+            self.session.audio_queue.put(response['payload_msg'])
+            if self.config["enable_gpt4o_logging"]:
+                # print("音频数据已加入播放队列")
+                pass
+
+        elif response['message_type'] == 'SERVER_FULL_RESPONSE':
+            if response.get('event') == 451:  # ASR结果
+                if self.config["enable_gpt4o_logging"]:
+                    print("收到ASR识别结果")
+
+                user_text = self.extract_asr_text(response)
+                if user_text:
+                    print(f"ASR识别成功: {user_text}")
+                    # 检查是否是控制指令（可能已在中间结果上生效）
+                    intent, handled = self.intents.on_final(user_text, self.control_intents())
+                    if handled:
+                        print(f"意图{intent.name}已在中间结果上生效")
+                    elif intent is not None:
+                        self.handle_intent(intent)
+                    else:
+                        speculation = self.speculator.on_final(user_text) if self.speculator else None
+                        # 新的最终结果取消仍在生成的上一回合
+                        self.turns.start(
+                            self.process_user_input_with_gpt4o(user_text, time.perf_counter(), speculation),
+                            user_text)
+                else:
+                    interim_text = self.extract_interim_text(response)
+                    if interim_text and not self.check_interim_intent(interim_text) and self.speculator:
+                        self.speculator.on_interim(interim_text)
+                    elif not interim_text and self.config["enable_gpt4o_logging"]:
+                        print("ASR识别为空或临时结果")
+
+            elif response.get('event') == 450:  # 清空音频缓存
+                if self.config["enable_gpt4o_logging"]:
+                    print("清空音频缓存")
+                # 用户打断：停止仍在生成的回复
+                self.turns.cancel("用户打断")
+                while not self.session.audio_queue.empty():
+                    try:
+                        release(self.session.audio_queue.get_nowait())
+                    except:
+                        continue
+                    self.session.audio_queue.task_done()
+
+            elif response.get('event') == 550:  # 拦截豆包模型回复
+                if self.config["enable_douban_logging"]:
+                    try:
+                        douban_content = response.get('payload_msg', {}).get('content', '')
+                        print(f"拦截豆包回复: {douban_content}")
+                    except:
+                        print("拦截豆包回复（无法解析内容）")
+                return
+
+        elif response['message_type'] in ['SERVER_ERROR', 'SERVER_FULL_RESPONSE']:
+            if response.get('event') in [152, 153]:
+                print("会话结束信号")
+                self.session.is_session_finished = True
+
+    def douban_response_handler(self, response: Dict[str, Any]):
+        """豆包原生模式的响应处理器"""
+        if response == {}:
+            return
+        self.capture_tts_audio(response)
+
+        # 处理ASR结果和轮数统计
+        if response['message_type'] == 'SERVER_FULL_RESPONSE':
+            if response.get('event') == 451:  # ASR结果
+                user_text = self.extract_asr_text(response)
+                if user_text:
+                    # 检查是否是结束指令（可能已在中间结果上生效）
+                    intent, handled = self.intents.on_final(user_text, self.control_intents())
+                    if intent is not None and not handled:
+                        self.handle_intent(intent)
+                    elif intent is None:
+                        self.handle_user_input_in_douban_mode(user_text)
+                else:
+                    interim_text = self.extract_interim_text(response)
+                    if interim_text:
+                        self.check_interim_intent(interim_text)
+
+            elif response.get('event') == 550:  # 豆包回复
+                if self.config["enable_douban_logging"]:
+                    try:
+                        douban_content = response.get('payload_msg', {}).get('content', '')
+                        self.handle_douban_response(douban_content)
+                    except Exception as e:
+                        print(f"豆包回复: [无法解析内容] {e}")
+
+            elif response.get('event') == 559:  # 豆包回复结束
+                self.handle_douban_response_end()
+
+        # 使用原始的默认处理逻辑
+        try:
+            if response['message_type'] == 'SERVER_ACK' and isinstance(response.get('payload_msg'), AUDIO_TYPES):
+                self.session.audio_queue.put(response['payload_msg'])
+            elif response['message_type'] in ['SERVER_ERROR', 'SERVER_FULL_RESPONSE']:
+                if response.get('event') in [152, 153]:
+                    print("会话结束信号")
+                    self.session.is_session_finished = True
+        except Exception as e:
+            print(f"豆包响应处理警告: {e}")
+
+    def control_intents(self) -> tuple:
+        """当前模式下可以处理的控制意图"""
+        return ("end", "skip") if self.config["use_gpt4o"] else ("end",)
+
+    def check_interim_intent(self, interim_text: str) -> bool:
+        """在ASR中间结果上识别控制意图，识别到时立即处理"""
+        if not self.config["intent_on_interim"]:
+            return False
+        intent = self.intents.on_interim(interim_text, self.control_intents())
+        if intent is None:
+            return False
+        self.handle_intent(intent)
+        return True
+
+    def handle_intent(self, intent: IntentMatch):
+        """执行控制意图"""
+        print(f"识别到意图{intent.name}（{'中间结果' if intent.interim else '最终结果'}，"
+              f"短语: {intent.phrase}，置信度: {intent.confidence:.2f}）")
+        if self.speculator:
+            self.speculator.cancel()
+        if intent.name == "end":
+            self.turns.cancel("结束指令")
+            asyncio.create_task(self.handle_manual_end())
+        elif intent.name == "skip":
+            # 跳过当前问题：作为本轮回答交给GPT-4o，由讲师换一个问题
+            self.turns.start(
+                self.process_user_input_with_gpt4o("我想跳过这个问题，请换一个问题", time.perf_counter()), "skip")
+
+    async def handle_manual_end(self):
+        """处理手动结束指令"""
+        print("收到结束指令，准备结束会话...")
+
+        # 发送结束确认
+        end_message = "好的，培训会话即将结束。感谢您的参与！再见！"
+        await self.send_training_content(end_message, cacheable=True)
+
+        # 等待播放完成
+        await asyncio.sleep(3)
+
+        # 关闭连接
+        try:
+            print("正在关闭会话连接...")
+            await self.session.client.close()
+            self.session.is_running = False
+        except Exception as e:
+            print(f"关闭连接时出错: {e}")
+
+    def handle_user_input_in_douban_mode(self, user_text: str):
+        """在豆包模式下处理用户输入"""
+        if not self.douban_initialized:
+            # 角色初始化阶段（仅在启用初始化时）
+            print(f"角色初始化阶段 - 用户说: {user_text}")
+
+            # 增加初始化尝试次数
+            self.role_init_attempts += 1
+
+            # 降低超时时间，更快进入培训模式
+            timeout_duration = 15  # 从30秒降低到15秒
+
+            # 超时或尝试次数过多时强制开始正常培训
+            if (hasattr(self, 'role_init_start_time') and
+                time.time() - self.role_init_start_time > timeout_duration) or \
+                    self.role_init_attempts >= self.max_init_attempts:
+                print("角色初始化超时或尝试次数过多，强制开始培训")
+                self.douban_initialized = True
+                asyncio.create_task(self.send_force_start_message())
+
+        else:
+            # 正常对话阶段（关闭初始化时直接进入此阶段）
+            if self.config["enable_round_control"]:
+                self.round_count += 1
+                print(f"第{self.round_count}轮 - 用户说: {user_text}")
+
+                self.add_history({
+                    "role": "user",
+                    "content": f"第{self.round_count}轮学员回答: {user_text}"
+                })
+
+    def handle_douban_response(self, douban_content: str):
+        """处理豆包的回复内容"""
+        if not douban_content:
+            return
+
+        if not self.douban_initialized:
+            print(f"角色初始化回复: {douban_content}")
+
+            # 检查是否包含角色相关的关键词（更宽松的角色确认检测）
+            if self.role_matcher.contains(douban_content):
+                print("检测到角色相关关键词，豆包可能已理解角色")
+                self.douban_initialized = True
+                # 发送第一个培训问题
+                asyncio.create_task(self.send_first_training_question())
+
+        else:
+            print(f"豆包回复: {douban_content}")
+
+            if not hasattr(self, '_current_douban_response'):
+                self._current_douban_response = ""
+            self._current_douban_response += douban_content
+
+    def handle_douban_response_end(self):
+        """处理豆包回复结束"""
+        self.last_reply_end_round = self.round_count
+        if (hasattr(self, '_current_douban_response') and
+                self._current_douban_response and
+                self.douban_initialized and
+                self.round_count > 0):
+            self.add_history({
+                "role": "assistant",
+                "content": f"第{self.round_count}轮讲师回复: {self._current_douban_response}"
+            })
+            delattr(self, '_current_douban_response')
+
+    async def send_force_start_message(self):
+        """强制开始培训消息"""
+        try:
+            start_message = "现在开始《企业出海》培训课程。我们将通过中能科技进军欧洲市场的案例来学习企业出海战略。请问，您认为中能科技在决定出海时，首先分析了哪些关键因素？"
+            await self.send_training_content(start_message, cacheable=True)
+            print("发送强制开始培训消息")
+        except Exception as e:
+            print(f"发送强制开始消息失败: {e}")
+
+    async def send_first_training_question(self):
+        """发送第一个培训问题"""
+        try:
+            first_question = "很好！现在让我们开始《企业出海》课程的学习。基于中能科技的案例，请您分析一下：企业在制定出海战略时，应该首先考虑哪些内外部因素？"
+            await self.send_training_content(first_question, cacheable=True)
+            print("发送第一个培训问题")
+        except Exception as e:
+            print(f"发送第一个培训问题失败: {e}")
+
+    async def process_user_input_with_gpt4o(self, user_text: str, speech_end_time: Optional[float] = None,
+                                            speculation: Optional[SpeculativeGeneration] = None):
+        """使用Azure GPT-4o处理用户输入，speech_end_time为收到最终ASR结果的时刻(perf_counter)
+
+        speculation为基于ASR中间结果已提交的推测生成，直接回放其输出。
+        """
+        speech_end_time = speech_end_time or time.perf_counter()
+        self.first_tts_time = None
+        # 上一轮的回复被取消时，本次输入仍属于同一轮
+        if self.replied_round == self.round_count:
+            self.round_count += 1
+        print(f"第{self.round_count}轮 - 用户说: {user_text}")
+        print(f"开始处理用户输入...")
+
+        self.add_history({
+            "role": "user",
+            "content": f"第{self.round_count}轮学员回答: {user_text}"
+        })
+
+        try:
+            print("正在调用GPT-4o...")
+            if speculation is not None:
+                print(f"命中推测生成（基于中间结果: {speculation.text}）")
+                await self.stream_gpt4o_response(user_text, speculation.replay())
+            elif self.config["stream_tts"]:
+                await self.stream_gpt4o_response(user_text)
+            else:
+                start_time = time.time()
+                response_text = await self.generate_gpt4o_response(user_text)
+                generation_time = time.time() - start_time
+                print(f"GPT-4o生成完成，耗时: {generation_time:.2f}秒")
+
+                start_tts = time.time()
+                await self.send_training_content(response_text)
+                tts_time = time.time() - start_tts
+                print(f"TTS发送完成，耗时: {tts_time:.2f}秒")
+                print(f"总响应时间: {(generation_time + tts_time):.2f}秒")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"GPT-4o生成回复失败: {e}")
+            import traceback
+            print(f"详细错误: {traceback.format_exc()}")
+
+            fallback_response = "非常好的思考！让我们继续深入探讨这个话题。"
+            print(f"使用备用回复: {fallback_response}")
+            await self.send_training_content(fallback_response, cacheable=True)
+
+        self.replied_round = self.round_count
+        self.record_turn_latency(speech_end_time)
+        # 最后一轮的问答留给收尾时合并，以便直接流式发出总结
+        if not (self.config["enable_round_control"] and self.round_count >= self.max_rounds):
+            self.schedule_summary_update()
+
+    def record_turn_latency(self, speech_end_time: float):
+        """记录本轮从用户说完到首段TTS发出的延迟"""
+        now = time.perf_counter()
+        latency = {
+            "round": self.round_count,
+            "mode": "stream" if self.config["stream_tts"] else "full",
+            "first_tts": (self.first_tts_time or now) - speech_end_time,
+            "total": now - speech_end_time,
+            "prompt_tokens": self.last_prompt_tokens,
+        }
+        self.turn_latencies.append(latency)
+        TURN_LATENCY.labels(latency["mode"], "first_tts").observe(latency["first_tts"])
+        TURN_LATENCY.labels(latency["mode"], "total").observe(latency["total"])
+        print(f"首段TTS延迟: {latency['first_tts']:.2f}秒, 全部TTS发送完成: {latency['total']:.2f}秒 "
+              f"({'流式' if latency['mode'] == 'stream' else '整段'})")
+
+    def add_history(self, entry: Dict[str, str]):
+        """记录一条对话消息"""
+        self.conversation_history.append(entry)
+        if self.memory is not None:
+            self.memory.append(entry)
+
+    def history_messages(self, pending: Optional[List[Dict[str, str]]] = None) -> List[Dict[str, str]]:
+        """system prompt + 对话历史，pending为尚未记入历史的假设消息"""
+        pending = pending or []
+        if self.memory is not None:
+            return self.memory.messages(self.system_prompt) + pending
+        history = self.conversation_history + pending
+        recent_history = history[-10:] if len(history) > 10 else history
+        return [{"role": "system", "content": self.system_prompt}] + recent_history
+
+    async def summarize_history(self, summary: str, entries: List[Dict[str, str]]) -> str:
+        """把较早的对话增量合并进摘要（由ConversationMemory在后台调用）"""
+        dialog = "\n".join(entry["content"] for entry in entries)
+        prompt = f"""
+已有摘要：{summary or "无"}
+
+新增对话：
+{dialog}
+
+请把新增对话合并进已有摘要，保留学员在每一轮的主要观点、讲师的评价和引导方向，控制在200字以内，直接输出摘要。
+"""
+        response = await self.llm.complete(
+            [{"role": "system", "content": "你是培训对话记录员，负责维护简洁的对话摘要。"},
+             {"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=300,
+        )
+        return response.text
+
+    def start_speculative_stream(self, interim_text: str) -> AsyncIterator[str]:
+        """按“中间结果即为本轮最终输入”的假设发起流式生成，不修改对话历史"""
+        round_number = self.round_count + 1
+        pending = [{
+            "role": "user",
+            "content": f"第{round_number}轮学员回答: {interim_text}"
+        }]
+        messages = self.build_gpt4o_messages(interim_text, pending=pending, round_number=round_number)
+        return self.llm.stream(messages, **self.gpt4o_params())
+
+    def build_gpt4o_messages(self, user_input: str, pending: Optional[List[Dict[str, str]]] = None,
+                             round_number: Optional[int] = None) -> List[Dict[str, str]]:
+        """构造培训讲师回复的GPT-4o请求消息，推测生成时传入假设的pending消息和round_number"""
+        round_number = self.round_count if round_number is None else round_number
+        messages = self.history_messages(pending)
+
+        if user_input == "开始培训":
+            current_prompt = """
+这是培训的开始，请作为资深企业培训师，结合中能科技的案例，给出一个专业的开场白。
+
+要求：
+1. 欢迎学员参加《企业出海》培训课程
+2. 简要介绍课程目标：学习企业如何制定出海战略
+3. 提出第一个引导性问题，让学员思考中能科技案例中的关键决策
+4. 语气要专业但亲和，控制在150-200字
+
+请直接给出开场白，不要说"好的"、"当然"等多余的话。
+"""
+        else:
+            current_prompt = f"""
+当前是第{round_number}轮对话（总共{self.max_rounds}轮）。
+学员刚才说: "{user_input}"
+
+请根据以下情况生成合适的培训讲师回复：
+1. 如果这是第1轮，请提出开场问题
+2. 如果是中间轮次（2-{self.max_rounds - 1}轮），请针对学员回答给出评价和进一步引导
+3. 如果是第{self.max_rounds}轮，请准备总结和评价学员的整体表现
+
+请结合中能科技的案例，引导学员思考企业如何制定出海战略。
+回复请控制在{self.config['response_length_limit']}字以内，保持培训讲师的专业性和亲和力。
+请直接给出回复内容，不要说"好的"、"当然"等多余的话。
+"""
+
+        messages.append({"role": "user", "content": current_prompt})
+
+        if self.config["enable_gpt4o_logging"]:
+            print(f"GPT-4o 请求信息:")
+            print(f"轮数: {round_number}/{self.max_rounds}")
+            print(f"用户输入: {user_input}")
+            print(f"Temperature: {self.config['temperature']}")
+
+        self.last_prompt_tokens = message_tokens(messages)
+        if self.config["enable_gpt4o_logging"]:
+            print(f"Prompt估算token: {self.last_prompt_tokens}")
+        return messages
+
+    def gpt4o_params(self) -> Dict[str, Any]:
+        """培训讲师回复的采样参数"""
+        return {
+            "temperature": self.config["temperature"],
+            "max_tokens": 300,
+            "top_p": 0.95,
+            "frequency_penalty": 0,
+            "presence_penalty": 0,
+        }
+
+    def record_gpt4o_reply(self, user_input: str, generated_text: str):
+        """检查回复并记入对话历史（开场白不计入）"""
+        if len(generated_text) < 20:
+            print(f"GPT-4o回复过短，可能有问题: '{generated_text}'")
+
+        if user_input != "开始培训":
+            self.add_history({
+                "role": "assistant",
+                "content": f"第{self.round_count}轮讲师回复: {generated_text}"
+            })
+
+    async def generate_gpt4o_response(self, user_input: str) -> str:
+        """使用Azure GPT-4o生成培训讲师回复"""
+        try:
+            messages = self.build_gpt4o_messages(user_input)
+            # 开场白的提示词固定，可直接使用缓存
+            is_opening = user_input == "开始培训" and not self.conversation_history
+            complete = self.cached_complete if is_opening else self.llm.complete
+            response = await complete(messages, **self.gpt4o_params())
+            api_time = response.latency
+
+            generated_text = response.text
+
+            if self.config["enable_gpt4o_logging"]:
+                print(f"GPT-4o API调用耗时: {api_time:.2f}秒")
+                print(f"响应状态: 成功")
+                print(f"响应内容: {generated_text}")
+                print(f"响应长度: {len(generated_text)}字")
+                print(f"Token使用: {response.total_tokens if response.total_tokens is not None else '未知'}")
+
+            self.record_gpt4o_reply(user_input, generated_text)
+            return generated_text
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if self.config["enable_gpt4o_logging"]:
+                print(f"GPT-4o 调用失败:")
+                print(f"错误信息: {e}")
+                import traceback
+                print(f"详细traceback: {traceback.format_exc()}")
+            return "让我们继续深入讨论这个重要话题。请分享您的具体想法。"
+
+    async def stream_gpt4o_response(self, user_input: str, deltas: Optional[AsyncIterator[str]] = None) -> str:
+        """流式生成培训讲师回复，边生成边按句/分句切分并发送ChatTTSText
+
+        deltas为已提交的推测生成的回放流，未提供时新发起LLM流式调用。
+        尚未发送任何片段时出错会抛出异常，由调用方改用备用回复；已发送部分内容时补发结束帧并返回已生成的文本。
+        """
+        if deltas is None:
+            deltas = self.llm.stream(self.build_gpt4o_messages(user_input), **self.gpt4o_params())
+        generated_text, sent = await self.stream_tts_text(deltas, count_tokens=True)
+        if self.config["enable_gpt4o_logging"]:
+            print(f"GPT-4o流式响应内容: {generated_text}")
+            print(f"响应长度: {len(generated_text)}字, TTS分段: {sent}段")
+        self.record_gpt4o_reply(user_input, generated_text)
+        return generated_text
+
+    async def stream_tts_text(self, deltas: AsyncIterator[str], count_tokens: bool = False) -> Tuple[str, int]:
+        """把文本流按句/分句切分并发送ChatTTSText，返回(完整文本, 发送段数)
+
+        尚未发送任何片段时出错会抛出异常；已发送部分内容时补发结束帧并返回已生成的文本。
+        """
+        segmenter = StreamingSegmenter(max_length=self.config["tts_max_length"],
+                                       first_chunk_length=self.config["tts_first_chunk_length"])
+        parts = []
+        sent = 0
+        try:
+            async for delta in deltas:
+                parts.append(delta)
+                if count_tokens:
+                    self.turns.add_tokens()
+                for segment in segmenter.push(delta):
+                    await self.send_chat_tts_chunk(segment, sent == 0, False)
+                    sent += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            if sent == 0:
+                raise
+            print(f"流式生成中断，结束当前TTS: {e}")
+            segmenter.flush()  # 丢弃未完成的半句
+
+        remaining = segmenter.flush()
+        for i, segment in enumerate(remaining):
+            await self.send_chat_tts_chunk(segment, sent == 0, i == len(remaining) - 1)
+            sent += 1
+        if not remaining and sent:
+            # 最后一段已在句末标点处发出，补发空的结束帧
+            await self.send_chat_tts_chunk("", False, True)
+        return "".join(parts).strip(), sent
+
+    def summary_precompute_enabled(self) -> bool:
+        return bool(self.config["precompute_summary"] and self.config["use_gpt4o"] and self.llm)
+
+    def schedule_summary_update(self):
+        """本轮问答记入历史后，在后台把新增对话合并进滚动总结；已有更新任务时由它继续合并"""
+        if not self.summary_precompute_enabled():
+            return
+        self.summary_target = len(self.conversation_history)
+        if self.summary_task is None or self.summary_task.done():
+            self.summary_task = asyncio.ensure_future(self._update_running_summary())
+
+    async def _update_running_summary(self):
+        while self.summarized_entries < self.summary_target:
+            entries = self.conversation_history[self.summarized_entries:self.summary_target]
+            try:
+                response = await self.llm.complete(self.summary_update_messages(entries), **SUMMARY_PARAMS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"后台更新培训总结失败: {e}")
+                return
+            self.running_summary = response.text.strip()
+            self.summarized_entries += len(entries)
+            if self.config["enable_gpt4o_logging"]:
+                print(f"培训总结已合并{self.summarized_entries}条对话")
+
+    def summary_update_messages(self, entries: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """把新增对话合并进滚动总结的请求：只带已有总结和新增对话，不带完整历史"""
+        dialog = "\n".join(entry["content"] for entry in entries)
+        prompt = f"""
+已有的培训总结草稿：{self.running_summary or "无"}
+
+新增对话：
+{dialog}
+
+请把新增对话合并进培训总结草稿，作为培训讲师对学员在{self.max_rounds}轮培训中的学习情况进行总结评价：
+1. 总结学员对"企业如何制定出海战略"这个核心问题的理解程度
+2. 评价学员在案例分析方面的表现
+3. 指出学员的进步和需要继续加强的地方
+4. 给出鼓励性的结束语
+
+请保持培训讲师的风格，语言要专业但亲和，总结控制在250字以内，直接输出完整的总结。
+"""
+        return [{"role": "system", "content": "你是《企业出海》培训课程的培训讲师，负责根据培训对话维护对学员的总结评价。"},
+                {"role": "user", "content": prompt}]
+
+    async def wait_summary_update(self):
+        """等待后台的滚动总结更新完成"""
+        if self.summary_task is not None and not self.summary_task.done():
+            try:
+                await asyncio.shield(self.summary_task)
+            except asyncio.CancelledError:
+                if not self.summary_task.cancelled():
+                    raise
+
+    async def training_summary_stream(self) -> AsyncIterator[str]:
+        """培训总结（含开头和结束语）的文本流
+
+        开启预生成时等后台的滚动总结追上，只把剩余的新增对话（通常是最后一轮问答）合并进去，
+        流式TTS开启时边生成边输出；没有剩余对话时直接输出滚动总结。未开启时按完整对话生成。
+        """
+        yield SUMMARY_PREFIX
+        if not self.summary_precompute_enabled():
+            yield await self.request_training_summary()
+        else:
+            await self.wait_summary_update()
+            entries = self.conversation_history[self.summarized_entries:]
+            if entries or not self.running_summary:
+                messages = self.summary_update_messages(entries)
+                parts = []
+                if self.config["stream_tts"]:
+                    async for delta in self.llm.stream(messages, **SUMMARY_PARAMS):
+                        parts.append(delta)
+                        yield delta
+                else:
+                    parts.append((await self.llm.complete(messages, **SUMMARY_PARAMS)).text)
+                    yield parts[0]
+                self.running_summary = "".join(parts).strip()
+                self.summarized_entries += len(entries)
+                print(f"培训总结增量合并了最后{len(entries)}条对话")
+            else:
+                yield self.running_summary
+        yield SUMMARY_CLOSING
+
+    async def get_training_summary(self) -> str:
+        """完整的培训总结文本，失败时抛出异常"""
+        return "".join([part async for part in self.training_summary_stream()])
+
+    async def wait_for_current_reply(self):
+        """等待最后一轮回复结束，替代固定的等待时间"""
+        timeout = self.config["reply_wait_timeout"]
+        if self.config["use_gpt4o"]:
+            if not await self.turns.wait(timeout):
+                print("等待最后一轮回复超时，直接发送总结")
+            return
+        deadline = time.perf_counter() + timeout
+        while self.last_reply_end_round < self.round_count and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def generate_training_summary(self) -> str:
+        """生成培训总结"""
+        try:
+            return await self.request_training_summary()
+        except Exception as e:
+            print(f"生成培训总结失败: {e}")
+            return "通过今天的深入交流，我看到了大家对企业出海战略的深入思考。希望大家能够将今天学到的知识应用到实际工作中。感谢参与！"
+
+    async def request_training_summary(self) -> str:
+        """请求LLM生成培训总结，失败时抛出异常"""
+        summary_prompt = f"""
+基于以上{self.max_rounds}轮对话，请作为培训讲师对学员的学习情况进行总结评价：
+
+1. 总结学员对"企业如何制定出海战略"这个核心问题的理解程度
+2. 评价学员在案例分析方面的表现
+3. 指出学员的进步和需要继续加强的地方
+4. 给出鼓励性的结束语
+
+请保持培训讲师的风格，语言要专业但亲和，总结控制在250字以内。
+"""
+
+        if self.memory is not None:
+            messages = self.history_messages()
+        else:
+            messages = [{"role": "system", "content": self.system_prompt}]
+            messages.extend(self.conversation_history)
+        messages.append({"role": "user", "content": summary_prompt})
+
+        if self.config["enable_gpt4o_logging"]:
+            print(f"生成培训总结...")
+
+        response = await self.llm.complete(messages, **SUMMARY_PARAMS)
+
+        summary = response.text
+
+        if self.config["enable_gpt4o_logging"]:
+            print(f"培训总结生成完成: {len(summary)}字")
+
+        return summary
+
+    async def send_training_content(self, content: str, cacheable: bool = False):
+        """发送培训内容进行TTS，cacheable的固定内容命中音频缓存时直接本地播放
+
+        只有纯播放的固定文本可以cacheable；发给服务端模型的指令（角色初始化、总结指令）必须每次发送。
+        """
+        try:
+            if cacheable and self.cache is not None:
+                key = self.cache.audio_key(content, self.voice_config())
+                audio = self.cache.audio.get(key)
+                if audio is not None:
+                    print(f"TTS音频缓存命中，本地播放 {len(audio)} 字节")
+                    self.play_cached_audio(audio)
+                    return
+                # 还有TTS在下发或在录制时不录，以免把别的音频存到这段内容的键下
+                if self.tts_capture is None and not self.session.tts_playing:
+                    self.tts_capture = {"key": key, "chunks": [], "started": False}
+
+            print(f"准备发送TTS内容")
+            chunks = split_text(content, self.config["tts_max_length"])
+            print(f"文本分段完成，共{len(chunks)}段")
+
+            for i, chunk in enumerate(chunks):
+                is_start = (i == 0)
+                is_end = (i == len(chunks) - 1)
+                print(f"发送第{i + 1}/{len(chunks)}段")
+                await self.send_chat_tts_chunk(chunk, is_start, is_end)
+
+            print("所有TTS内容发送完成")
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"发送培训内容失败: {e}")
+            import traceback
+            print(f"详细错误: {traceback.format_exc()}")
+
+    @staticmethod
+    def voice_config() -> Dict[str, Any]:
+        """影响TTS音频的配置，作为音频缓存键的一部分"""
+        return {
+            "tts": app_config.start_session_req.get("tts"),
+            "output_audio": app_config.output_audio_config,
+        }
+
+    def play_cached_audio(self, audio: bytes):
+        """将缓存的音频按输出块大小放入播放队列"""
+        output = app_config.output_audio_config
+        chunk_bytes = output["chunk"] * output["channels"] * app_config.sample_width(output["bit_size"])
+        for i in range(0, len(audio), chunk_bytes):
+            self.session.audio_queue.put(audio[i:i + chunk_bytes])
+
+    def capture_tts_audio(self, response: Dict[str, Any]):
+        """录制缓存未命中的固定内容的下行音频
+
+        只录发送后第一个TTSStarted(350)到TTSEnded(359)之间的音频，359时写入缓存；
+        被打断(450)或359之前又收到350（另一段TTS交错）时放弃。
+        """
+        capture = self.tts_capture
+        if capture is None:
+            return
+        event = response.get('event')
+        if response['message_type'] == 'SERVER_ACK' and isinstance(response.get('payload_msg'), AUDIO_TYPES):
+            if capture["started"]:
+                # 池中的缓冲播放后会被复用，录制时复制一份
+                capture["chunks"].append(bytes(response['payload_msg']))
+        elif event == 350:
+            if capture["started"]:
+                self.tts_capture = None
+            else:
+                capture["started"] = True
+        elif event == 450:
+            self.tts_capture = None
+        elif event == 359 and capture["started"]:
+            self.tts_capture = None
+            if capture["chunks"]:
+                self.cache.audio.put(capture["key"], b"".join(capture["chunks"]))
+
+    async def cached_complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        """提示词固定的LLM调用，命中缓存时不发起请求"""
+        if self.cache is None:
+            return await self.llm.complete(messages, **params)
+        model = getattr(self.llm.backend, "model", type(self.llm.backend).__name__)
+        key = self.cache.text_key(messages, params, model)
+        text = self.cache.get_text(key)
+        if text is not None:
+            print("LLM文本缓存命中")
+            return LLMResult(text=text)
+        result = await self.llm.complete(messages, **params)
+        self.cache.put_text(key, result.text)
+        return result
+
+    def print_cache_report(self):
+        """打印缓存命中统计"""
+        if self.cache is None:
+            return
+        for name, stats in self.cache.report().items():
+            print(f"{name}缓存: 内存命中 {stats['memory_hits']}, 磁盘命中 {stats['disk_hits']}, "
+                  f"未命中 {stats['misses']}, 写入 {stats['writes']}")
+
+    def print_intent_report(self):
+        """打印控制意图统计"""
+        stats = self.intents.report()
+        if stats["interim_fired"] or stats["final_fired"]:
+            print(f"控制意图: 中间结果触发 {stats['interim_fired']}, 最终结果触发 {stats['final_fired']}, "
+                  f"误触发 {stats['false_positives']}, 平均提前 {stats['avg_time_saved']:.2f}秒")
+
+    def print_loop_report(self, watchdog: loop_monitor.LoopWatchdog):
+        """打印事件循环延迟、本会话的阻塞次数和采样剖析结果"""
+        stats = watchdog.report()
+        print(f"事件循环: 平均延迟 {stats['avg_lag'] * 1000:.1f}ms, 最大延迟 {stats['max_lag'] * 1000:.1f}ms, "
+              f"本会话阻塞 {stats['by_session'].get(self.session.session_id, 0)} 次")
+        if self.config["loop_profile"] and watchdog.profiler is not None:
+            print(watchdog.profiler.format_report(self.session.session_id))
+
+    def print_turn_report(self):
+        """打印回合取消与浪费统计"""
+        stats = self.turns.report()
+        if stats["turns"]:
+            print(f"回合: {stats['turns']}, 取消: {stats['cancelled']}, 丢弃过期TTS块: {stats['stale_chunks']}, "
+                  f"浪费token: {stats['wasted_tokens']}, 浪费时间: {stats['wasted_time']:.2f}秒")
+
+    async def send_chat_tts_chunk(self, content: str, start: bool, end: bool):
+        """发送ChatTTSText事件块，已被取消或取代的回合的块直接丢弃"""
+        if not self.turns.allow_chunk():
+            return
+        try:
+            await self.session.client.chat_tts_text(content, start, end)
+            if self.first_tts_time is None:
+                self.first_tts_time = time.perf_counter()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"发送TTS块失败: {e}")
+            import traceback
+            print(f"详细错误: {traceback.format_exc()}")
+
+    def extract_interim_text(self, response: Dict[str, Any]) -> Optional[str]:
+        """提取ASR中间结果文本"""
+        try:
+            for result in response.get('payload_msg', {}).get('results', []):
+                text = result.get('text', '').strip()
+                if result.get('is_interim', True) and text:
+                    return text
+            return None
+        except Exception as e:
+            print(f"提取ASR中间结果失败: {e}")
+            return None
+
+    def extract_asr_text(self, response: Dict[str, Any]) -> Optional[str]:
+        """提取ASR识别文本"""
+        try:
+            payload_msg = response.get('payload_msg', {})
+            results = payload_msg.get('results', [])
+            if not results:
+                return None
+
+            for result in results:
+                is_interim = result.get('is_interim', True)
+                text = result.get('text', '')
+
+                if not is_interim and text.strip():
+                    return text.strip()
+
+            return None
+        except Exception as e:
+            print(f"提取ASR文本失败: {e}")
+            return None
@@ -0,0 +1,110 @@
+import asyncio
+import re
+from typing import Awaitable, Callable, Dict, List, Optional
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+Summarizer = Callable[[str, List[Dict[str, str]]], Awaitable[str]]
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文字符及全角标点约1个token，其余字符约4个字符1个token"""
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def message_tokens(messages: List[Dict[str, str]], count_tokens: Callable[[str], int] = estimate_tokens) -> int:
+    """估算消息列表的token数（每条消息额外计4个token的格式开销）"""
+    return sum(count_tokens(m["content"]) + 4 for m in messages)
+
+
+class ConversationMemory:
+    """带token预算的对话记忆
+
+    近期keep_recent条消息保留原文；原文部分超出budget_tokens时，在后台把较早的消息
+    增量折叠进摘要。构造的请求以固定的system prompt开头，便于服务端缓存公共前缀。
+    摘要尚未完成时，请求中只保留能放进预算的最新消息。
+    """
+
+    def __init__(self, summarize: Optional[Summarizer] = None, budget_tokens: int = 1200,
+                 keep_recent: int = 4, count_tokens: Callable[[str], int] = estimate_tokens):
+        self.summarize = summarize
+        self.budget_tokens = budget_tokens
+        self.keep_recent = keep_recent
+        self.count_tokens = count_tokens
+        self.entries: List[Dict[str, str]] = []
+        self.summary = ""
+        self.folded_count = 0
+        self._fold_task: Optional[asyncio.Task] = None
+
+    def append(self, entry: Dict[str, str]) -> None:
+        """追加一条消息，超出预算时触发后台摘要"""
+        self.entries.append(entry)
+        if not self._over_budget() or (self._fold_task is not None and not self._fold_task.done()):
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环时同步丢弃最早的消息
+            self._drop_oldest()
+            return
+        self._fold_task = loop.create_task(self._fold())
+
+    def _tokens(self) -> int:
+        summary_tokens = self.count_tokens(self.summary) + 4 if self.summary else 0
+        return summary_tokens + message_tokens(self.entries, self.count_tokens)
+
+    def _over_budget(self) -> bool:
+        return len(self.entries) > self.keep_recent and self._tokens() > self.budget_tokens
+
+    def _drop_oldest(self) -> None:
+        while self._over_budget():
+            self.entries.pop(0)
+            self.folded_count += 1
+
+    async def _fold(self) -> None:
+        """把最早的消息折叠进摘要，直到原文部分回到预算内"""
+        while self._over_budget():
+            fold = self.entries[:len(self.entries) - self.keep_recent]
+            if self.summarize is None:
+                self._drop_oldest()
+                return
+            try:
+                self.summary = await self.summarize(self.summary, fold)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"对话摘要失败，丢弃最早的消息: {e}")
+                self._drop_oldest()
+                return
+            # 摘要期间可能追加了新消息，只移除已折叠的部分
+            del self.entries[:len(fold)]
+            self.folded_count += len(fold)
+
+    async def wait_idle(self) -> None:
+        """等待后台摘要完成"""
+        if self._fold_task is not None:
+            await asyncio.shield(self._fold_task)
+
+    def messages(self, system_prompt: str) -> List[Dict[str, str]]:
+        """构造请求消息：固定system prompt + 摘要 + 预算内的近期原文"""
+        messages = [{"role": "system", "content": system_prompt}]
+        budget = self.budget_tokens
+        if self.summary:
+            summary_message = {"role": "system", "content": f"此前对话摘要：{self.summary}"}
+            messages.append(summary_message)
+            budget -= message_tokens([summary_message], self.count_tokens)
+
+        recent = []
+        for entry in reversed(self.entries):
+            cost = message_tokens([entry], self.count_tokens)
+            if recent and cost > budget:
+                break
+            recent.append(entry)
+            budget -= cost
+        messages.extend(reversed(recent))
+        return messages
+
+    def close(self) -> None:
+        if self._fold_task is not None and not self._fold_task.done():
+            self._fold_task.cancel()
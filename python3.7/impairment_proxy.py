@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import collections
+import http
+import json
+import os
+import random
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Callable, Dict, List, Optional
+
+import websockets
+
+import protocol
+
+DISTRIBUTIONS = ("fixed", "uniform", "normal", "pareto")
+PARETO_ALPHA = 3.0
+# 不转发给上游的握手头
+HOP_HEADERS = {"host", "upgrade", "connection", "content-length", "sec-websocket-key", "sec-websocket-version",
+               "sec-websocket-extensions", "sec-websocket-protocol", "sec-websocket-accept"}
+CONTROL_FRAME_BYTES = 16  # ping/pong在链路上按这个大小计算
+
+
+@dataclass
+class LinkProfile:
+    """单方向的链路损伤
+
+    - delay/jitter/distribution: 每条消息的单向时延；fixed为固定delay，uniform为delay+U(0, jitter)，
+      normal为delay+N(0, jitter)（截断到0），pareto为delay加上尺度为jitter的长尾抖动（均值jitter/2）
+    - loss/retransmit: WebSocket跑在TCP上，丢包不会丢消息，而是以loss的概率让这条消息多等retransmit秒（一次重传超时），
+      并且按顺序送达，后面的消息跟着排队（队头阻塞）
+    - bandwidth: 字节/秒，0为不限；消息按大小占用链路，超出带宽的部分排队
+    - disconnect_after/disconnect_probability: 连接建立disconnect_after秒后、或每条消息以disconnect_probability的概率，
+      在这个方向上断开连接（两端都看到异常断开，如切换网络或进电梯）
+    """
+    delay: float = 0.0
+    jitter: float = 0.0
+    distribution: str = "normal"
+    loss: float = 0.0
+    retransmit: float = 0.2
+    bandwidth: float = 0.0
+    disconnect_after: float = 0.0
+    disconnect_probability: float = 0.0
+
+    def __post_init__(self):
+        if self.distribution not in DISTRIBUTIONS:
+            raise ValueError(f"不支持的时延分布: {self.distribution}，可选 {DISTRIBUTIONS}")
+
+    @classmethod
+    def from_dict(cls, options: Optional[Dict[str, Any]]) -> "LinkProfile":
+        names = {field.name for field in fields(cls)}
+        unknown = set(options or {}) - names
+        if unknown:
+            raise ValueError(f"未知的链路参数: {sorted(unknown)}")
+        return cls(**(options or {}))
+
+    def sample_delay(self, rng: random.Random) -> float:
+        if self.distribution == "uniform":
+            return self.delay + rng.uniform(0.0, self.jitter)
+        if self.distribution == "normal":
+            return max(0.0, self.delay + rng.gauss(0.0, self.jitter))
+        if self.distribution == "pareto":
+            return self.delay + self.jitter * (rng.paretovariate(PARETO_ALPHA) - 1.0)
+        return self.delay
+
+
+# 常见链路的近似参数（单向）；下行TTS音频为24kHz float32，约96KB/s
+SCENARIOS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "lan": {},
+    "wifi": {
+        "uplink": {"delay": 0.008, "jitter": 0.004, "loss": 0.002},
+        "downlink": {"delay": 0.008, "jitter": 0.004, "loss": 0.002},
+    },
+    "busy_wifi": {
+        "uplink": {"delay": 0.02, "jitter": 0.03, "distribution": "pareto", "loss": 0.02, "bandwidth": 250_000},
+        "downlink": {"delay": 0.02, "jitter": 0.03, "distribution": "pareto", "loss": 0.02, "bandwidth": 500_000},
+    },
+    "4g": {
+        "uplink": {"delay": 0.035, "jitter": 0.01, "loss": 0.005, "bandwidth": 200_000},
+        "downlink": {"delay": 0.035, "jitter": 0.01, "loss": 0.005, "bandwidth": 1_000_000},
+    },
+    "3g": {
+        "uplink": {"delay": 0.1, "jitter": 0.04, "loss": 0.01, "bandwidth": 48_000},
+        "downlink": {"delay": 0.1, "jitter": 0.04, "loss": 0.01, "bandwidth": 120_000},
+    },
+    "flaky_4g": {
+        "uplink": {"delay": 0.035, "jitter": 0.02, "distribution": "pareto", "loss": 0.01, "bandwidth": 200_000},
+        "downlink": {"delay": 0.035, "jitter": 0.02, "distribution": "pareto", "loss": 0.01, "bandwidth": 1_000_000,
+                     "disconnect_after": 8.0},
+    },
+    # 上行被同一网络里的其他流量挤占：可用带宽低于麦克风音频（16kHz int16约32KB/s，gzip后约29KB/s）
+    "congested_uplink": {
+        "uplink": {"delay": 0.05, "jitter": 0.02, "loss": 0.01, "bandwidth": 20_000},
+        "downlink": {"delay": 0.05, "jitter": 0.02, "loss": 0.005, "bandwidth": 1_000_000},
+    },
+}
+
+
+def load_scenario(name: str) -> Dict[str, LinkProfile]:
+    """按名称取预置场景，或从JSON文件读取 {"uplink": {...}, "downlink": {...}}"""
+    if name in SCENARIOS:
+        options = SCENARIOS[name]
+    elif os.path.exists(name):
+        with open(name, encoding="utf-8") as f:
+            options = json.load(f)
+    else:
+        raise ValueError(f"未知的网络场景: {name}，可选 {', '.join(SCENARIOS)} 或JSON文件路径")
+    return {direction: LinkProfile.from_dict(options.get(direction)) for direction in ("uplink", "downlink")}
+
+
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(int(q * len(values)), len(values) - 1)] if values else 0.0
+
+
+class _Link:
+    """一个连接上一个方向的损伤：计算每条消息的送达时刻，按顺序送达"""
+
+    def __init__(self, proxy: "ImpairmentProxy", direction: str, opened_at: float):
+        self.proxy = proxy
+        self.direction = direction
+        self.profile: LinkProfile = proxy.profiles[direction]
+        self.stats = proxy.stats[direction]
+        self.opened_at = opened_at
+        self.link_free_at = 0.0
+        self.last_delivery = 0.0
+        self.backlog = 0
+        self.queue: "asyncio.Queue" = asyncio.Queue()
+        self.pending_control: collections.deque = collections.deque()  # [还要等的消息数, callback]
+
+    def submit(self, message) -> bool:
+        """收到一条消息，返回False表示这个方向决定断开连接"""
+        profile, rng = self.profile, self.proxy.rng
+        now = time.perf_counter()
+        if (profile.disconnect_after and now - self.opened_at >= profile.disconnect_after) or (
+                profile.disconnect_probability and rng.random() < profile.disconnect_probability):
+            return False
+        self._schedule(now, len(message), message)
+        for entry in self.pending_control:
+            entry[0] -= 1
+        while self.pending_control and self.pending_control[0][0] <= 0:
+            self._schedule(now, CONTROL_FRAME_BYTES, self.pending_control.popleft()[1])
+        return True
+
+    def submit_control(self, callback: Callable[[], Any], after: int = 0) -> None:
+        """控制帧（ping/pong）：和消息一样占用链路、按顺序排队，送达时调用callback（可以返回协程）
+        after为控制帧之前已收到、还没有submit的消息数，控制帧排在这些消息之后"""
+        if after > 0:
+            self.pending_control.append([after, callback])
+        else:
+            self._schedule(time.perf_counter(), CONTROL_FRAME_BYTES, callback)
+
+    def _schedule(self, now: float, size: int, item) -> None:
+        profile, rng = self.profile, self.proxy.rng
+        start = now
+        if profile.bandwidth:
+            # 链路空闲后才开始发送这条消息，发完才开始计算传播时延
+            start = max(now, self.link_free_at) + size / profile.bandwidth
+            self.link_free_at = start
+        delay = profile.sample_delay(rng)
+        if profile.loss and rng.random() < profile.loss:
+            delay += profile.retransmit
+            self.stats["retransmits"] += 1
+        deliver_at = max(start + delay, self.last_delivery)
+        self.last_delivery = deliver_at
+        self.backlog += size
+        self.stats["max_backlog"] = max(self.stats["max_backlog"], self.backlog)
+        self.queue.put_nowait((deliver_at, now, size, item))
+
+    async def deliver(self, destination) -> None:
+        """按送达时刻把消息写给对端；收到None时结束"""
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            deliver_at, received_at, size, message = item
+            wait = deliver_at - time.perf_counter()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if callable(message):
+                result = message()
+                if asyncio.iscoroutine(result):
+                    await result
+                self.backlog -= size
+                self.stats["control"] += 1
+                continue
+            await destination.send(message)
+            delivered_at = time.perf_counter()
+            self.backlog -= len(message)
+            self.stats["messages"] += 1
+            self.stats["bytes"] += len(message)
+            self.stats["delays"].append(delivered_at - received_at)
+            if self.proxy.trace is not None:
+                message_type, event = (None, None) if isinstance(message, str) else protocol.frame_info(message)
+                self.proxy.trace.append((self.direction, message_type, event, len(message), received_at,
+                                         delivered_at))
+
+
+class _ClientProtocol(websockets.WebSocketServerProtocol):
+    """代理面向客户端的连接：收到ping时不立即回pong，交给relay_ping按链路损伤往返一次后再回
+    relay_ping的参数为(ping之前已收到、还没有读出的消息数, ping的数据)"""
+    relay_ping: Optional[Callable[[int, bytes], None]] = None
+
+    async def pong(self, data=b"") -> None:
+        if self.relay_ping is None:
+            await super().pong(data)
+        else:
+            self.relay_ping(len(self.messages), data)
+
+    async def send_pong(self, data: bytes) -> None:
+        await super().pong(data)
+
+
+class ImpairmentProxy:
+    """本地WebSocket代理：在客户端和任意服务端（如local_dialog_server）之间按方向施加时延、抖动、丢包重传、限速和断线
+
+    客户端把base_url指向proxy.url即可；每个客户端连接对应一个到target的上游连接，握手头（X-Api-*等）原样转发，
+    上游响应的X-Tt-Logid回传给客户端。uplink为客户端->服务端，downlink为服务端->客户端。
+    record_trace为True时记录每条消息的(方向, 消息类型, 事件, 字节数, 代理收到时刻, 送达时刻)，
+    时刻为time.perf_counter()，可以和本地服务记录的各轮时间对齐，算出客户端一侧的延迟。
+    客户端的ping先按上行链路、再按下行链路排队后才回pong，测到的往返时延包含两个方向上的排队。
+    """
+
+    def __init__(self, target: str, uplink: Optional[LinkProfile] = None, downlink: Optional[LinkProfile] = None,
+                 host: str = "127.0.0.1", port: int = 0, seed: Optional[int] = None, record_trace: bool = True):
+        self.target = target
+        self.profiles = {"uplink": uplink or LinkProfile(), "downlink": downlink or LinkProfile()}
+        self.host = host
+        self.port = port
+        self.rng = random.Random(seed)
+        self.trace: Optional[list] = [] if record_trace else None
+        self.stats = {direction: {"messages": 0, "bytes": 0, "control": 0, "retransmits": 0, "max_backlog": 0,
+                                  "disconnects": 0, "delays": []} for direction in self.profiles}
+        self.connections = 0
+        self.upstream_failures = 0
+        self.server = None
+        self._upstreams: Dict[int, Any] = {}
+
+    @classmethod
+    def from_scenario(cls, target: str, scenario: str, **options: Any) -> "ImpairmentProxy":
+        profiles = load_scenario(scenario)
+        return cls(target, uplink=profiles["uplink"], downlink=profiles["downlink"], **options)
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None, ping_interval=None,
+                                             process_request=self._connect_upstream,
+                                             extra_headers=self._response_headers, create_protocol=_ClientProtocol)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _connect_upstream(self, path: str, request_headers):
+        """握手前先连上游：握手本身也经过一个往返的损伤，上游连不上时返回502"""
+        headers = [(name, value) for name, value in request_headers.raw_items() if name.lower() not in HOP_HEADERS]
+        await asyncio.sleep(self.profiles["uplink"].sample_delay(self.rng)
+                            + self.profiles["downlink"].sample_delay(self.rng))
+        try:
+            upstream = await websockets.connect(self.target, extra_headers=headers, max_size=None, ping_interval=None)
+        except Exception as e:
+            self.upstream_failures += 1
+            return http.HTTPStatus.BAD_GATEWAY, [], f"上游连接失败: {e}".encode("utf-8")
+        self._upstreams[id(request_headers)] = upstream
+        return None
+
+    def _response_headers(self, path: str, request_headers):
+        upstream = self._upstreams.get(id(request_headers))
+        logid = upstream.response_headers.get("X-Tt-Logid") if upstream is not None else None
+        return {"X-Tt-Logid": logid} if logid else {}
+
+    async def _handle(self, client, path: str = None) -> None:
+        upstream = self._upstreams.pop(id(client.request_headers), None)
+        if upstream is None:
+            return
+        self.connections += 1
+        opened_at = time.perf_counter()
+        links = {"uplink": _Link(self, "uplink", opened_at), "downlink": _Link(self, "downlink", opened_at)}
+        client.relay_ping = lambda unread, data: links["uplink"].submit_control(
+            lambda: links["downlink"].submit_control(lambda: client.send_pong(data), len(upstream.messages)), unread)
+        tasks = [asyncio.ensure_future(self._pump(client, links["uplink"], client, upstream)),
+                 asyncio.ensure_future(self._pump(upstream, links["downlink"], client, upstream)),
+                 asyncio.ensure_future(links["uplink"].deliver(upstream)),
+                 asyncio.ensure_future(links["downlink"].deliver(client))]
+        try:
+            await asyncio.wait(tasks[:2], return_when=asyncio.FIRST_COMPLETED)
+            # 一端关闭：已在途的消息仍按时送达后再关闭
+            for link in links.values():
+                link.queue.put_nowait(None)
+            await asyncio.wait(tasks[2:], timeout=10.0)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await upstream.close()
+
+    async def _pump(self, source, link: _Link, client, upstream) -> None:
+        try:
+            async for message in source:
+                if not link.submit(message):
+                    link.stats["disconnects"] += 1
+                    # 模拟链路中断：两端的TCP连接直接断开，不发送关闭帧
+                    for ws in (client, upstream):
+                        if ws.transport is not None:
+                            ws.transport.abort()
+                    return
+        except websockets.ConnectionClosed:
+            pass
+
+    def report(self) -> Dict[str, Any]:
+        report: Dict[str, Any] = {"connections": self.connections, "upstream_failures": self.upstream_failures}
+        for direction, stats in self.stats.items():
+            delays = stats["delays"]
+            report[direction] = {
+                "profile": asdict(self.profiles[direction]),
+                "messages": stats["messages"], "bytes": stats["bytes"], "control": stats["control"],
+                "retransmits": stats["retransmits"],
+                "disconnects": stats["disconnects"], "max_backlog": stats["max_backlog"],
+                "delay_mean": sum(delays) / len(delays) if delays else 0.0,
+                "delay_p50": percentile(delays, 0.5), "delay_p95": percentile(delays, 0.95),
+                "delay_max": max(delays) if delays else 0.0,
+            }
+        return report
+
+    def format_report(self) -> str:
+        report = self.report()
+        lines = [f"代理: {report['connections']} 个连接, 上游连接失败 {report['upstream_failures']}"]
+        for direction in ("uplink", "downlink"):
+            r = report[direction]
+            lines.append(f"  {direction:<9}{r['messages']:>7} 条 {r['bytes'] / 1024:>9.0f}KB  "
+                         f"附加时延 p50 {r['delay_p50'] * 1000:.0f}ms p95 {r['delay_p95'] * 1000:.0f}ms "
+                         f"max {r['delay_max'] * 1000:.0f}ms  重传 {r['retransmits']}  断线 {r['disconnects']}  "
+                         f"最大积压 {r['max_backlog'] / 1024:.0f}KB")
+        return "\n".join(lines)
+
+    def first_delivery(self, direction: str, event: int, after: float) -> Optional[float]:
+        """代理在after时刻之后收到的第一条该事件消息送达对端的时刻，没有时返回None"""
+        for trace_direction, _, trace_event, _, received_at, delivered_at in self.trace or ():
+            if trace_direction == direction and trace_event == event and received_at >= after:
+                return delivered_at
+        return None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="在客户端和服务端之间施加网络损伤的WebSocket代理")
+    parser.add_argument("--target", required=True, help="上游地址，如 ws://127.0.0.1:8765 或线上地址")
+    parser.add_argument("--scenario", default="4g", help=f"预置场景({', '.join(SCENARIOS)})或JSON文件路径")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    proxy = ImpairmentProxy.from_scenario(args.target, args.scenario, host=args.host, port=args.port,
+                                          seed=args.seed, record_trace=False)
+    print(f"网络损伤代理已启动: {await proxy.start()} -> {args.target} (场景 {args.scenario})")
+    print(f"客户端设置 REALTIME_DIALOG_BASE_URL={proxy.url} 即可经过代理连接")
+    try:
+        await asyncio.Future()
+    finally:
+        print(proxy.format_report())
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,205 @@
+import re
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Collection, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 计算覆盖率时忽略的字符
+_IGNORED = r"[\s，。！？、；：,.!?;:\"'“”‘’…~～]+"
+_IGNORED_CHARS = re.compile(_IGNORED)
+# 两个英文单词之间的标点空白，保留为一个分隔符，以免英文短语跨词命中
+_WORD_GAP = re.compile(r"(?<=[a-z0-9])" + _IGNORED + r"(?=[a-z0-9])")
+_SEPARATOR = "_"
+
+
+def _is_word_char(char: str) -> bool:
+    return "a" <= char <= "z" or "0" <= char <= "9"
+
+
+def normalize(text: str) -> str:
+    """转小写并去掉标点空白，英文单词之间的换成分隔符"""
+    return _IGNORED_CHARS.sub("", _WORD_GAP.sub(_SEPARATOR, text.lower()))
+
+
+class AhoCorasick:
+    """Aho-Corasick多模式匹配：一次扫描找出文本中所有模式的出现位置"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[Tuple[str, Any]]] = [[]]
+        for pattern, value in patterns:
+            if pattern:
+                self._add(pattern, value)
+        self._build()
+
+    def _add(self, pattern: str, value: Any) -> None:
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append((pattern, value))
+
+    def _build(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> Iterator[Tuple[int, str, Any]]:
+        """依次产出(起始位置, 模式, 值)"""
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern, value in self._output[state]:
+                yield i - len(pattern) + 1, pattern, value
+
+
+@dataclass
+class Intent:
+    """一个意图：触发短语及置信度门限
+
+    置信度为命中短语覆盖的字数占整句（去掉标点空白）的比例；
+    中间结果要求连续interim_stable个结果都达到interim_confidence才触发，最终结果要求达到final_confidence。
+    """
+    name: str
+    phrases: Sequence[str]
+    interim_confidence: float = 0.6
+    final_confidence: float = 0.0
+    on_interim: bool = True
+    interim_stable: int = 1
+
+
+@dataclass
+class IntentMatch:
+    name: str
+    phrase: str
+    confidence: float
+    interim: bool
+
+
+class IntentMatcher:
+    """把所有意图的短语编译为一个Aho-Corasick自动机，可以在每个ASR中间结果上运行"""
+
+    def __init__(self, intents: Iterable[Intent]):
+        self.intents: Dict[str, Intent] = {intent.name: intent for intent in intents}
+        self._automaton = AhoCorasick(
+            (normalize(phrase), intent.name) for intent in self.intents.values() for phrase in intent.phrases)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Dict[str, Any]]) -> "IntentMatcher":
+        """由{意图名: {phrases, interim_confidence, ...}}形式的配置构造"""
+        return cls(Intent(name, **options) for name, options in config.items())
+
+    def match(self, text: str, interim: bool = False,
+              names: Optional[Collection[str]] = None) -> Optional[IntentMatch]:
+        """返回通过置信度门限的最佳意图（names限定可选的意图），没有时返回None"""
+        normalized = normalize(text)
+        if not normalized:
+            return None
+        covered: Dict[str, set] = {}
+        phrases: Dict[str, str] = {}
+        for start, phrase, name in self._find(normalized):
+            covered.setdefault(name, set()).update(range(start, start + len(phrase)))
+            if len(phrase) > len(phrases.get(name, "")):
+                phrases[name] = phrase
+
+        best = None
+        for name, positions in covered.items():
+            intent = self.intents[name]
+            if (names is not None and name not in names) or (interim and not intent.on_interim):
+                continue
+            confidence = len(positions) / len(normalized)
+            if confidence < (intent.interim_confidence if interim else intent.final_confidence):
+                continue
+            if best is None or confidence > best.confidence:
+                best = IntentMatch(name, phrases[name], confidence, interim)
+        return best
+
+    def contains(self, text: str) -> bool:
+        """文本是否包含任一短语（不做置信度门限）"""
+        return next(self._find(normalize(text)), None) is not None
+
+    def _find(self, normalized: str) -> Iterator[Tuple[int, str, Any]]:
+        """自动机的命中中去掉英文短语在单词中间的命中（如bus top中的stop、byebye中的bye）"""
+        for start, phrase, name in self._automaton.find(normalized):
+            end = start + len(phrase)
+            if start > 0 and _is_word_char(phrase[0]) and _is_word_char(normalized[start - 1]):
+                continue
+            if end < len(normalized) and _is_word_char(phrase[-1]) and _is_word_char(normalized[end]):
+                continue
+            yield start, phrase, name
+
+
+class IntentTracker:
+    """在一句话的中间结果和最终结果上跟踪意图
+
+    中间结果上触发的意图会立即返回，同一句话的最终结果随后到达时不再重复触发，
+    并据此统计提前的时间（最终结果到达时刻 - 中间结果触发时刻）以及中间结果误触发次数。
+    """
+
+    def __init__(self, matcher: IntentMatcher):
+        self.matcher = matcher
+        self.fired: Optional[Tuple[IntentMatch, float]] = None
+        self._candidate: Optional[str] = None
+        self._hits = 0
+        self.stats: Dict[str, float] = {
+            "interim_fired": 0,
+            "final_fired": 0,
+            "confirmed": 0,
+            "false_positives": 0,
+            "time_saved": 0.0,
+        }
+
+    def on_interim(self, text: str, names: Optional[Collection[str]] = None) -> Optional[IntentMatch]:
+        if self.fired is not None:
+            return None
+        match = self.matcher.match(text, interim=True, names=names)
+        if match is None or match.name != self._candidate:
+            self._candidate, self._hits = (match.name if match else None), 0
+        if match is None:
+            return None
+        self._hits += 1
+        if self._hits < self.matcher.intents[match.name].interim_stable:
+            return None
+        self.fired = (match, time.perf_counter())
+        self.stats["interim_fired"] += 1
+        return match
+
+    def on_final(self, text: str, names: Optional[Collection[str]] = None) -> Tuple[Optional[IntentMatch], bool]:
+        """返回(意图, 是否已在中间结果上触发过)"""
+        fired, self.fired = self.fired, None
+        self._candidate, self._hits = None, 0
+        match = self.matcher.match(text, interim=False, names=names)
+        if fired is not None:
+            if match is not None and match.name == fired[0].name:
+                self.stats["confirmed"] += 1
+                self.stats["time_saved"] += time.perf_counter() - fired[1]
+            else:
+                self.stats["false_positives"] += 1
+            return fired[0], True
+        if match is not None:
+            self.stats["final_fired"] += 1
+        return match, False
+
+    def reset(self) -> None:
+        self.fired = None
+        self._candidate, self._hits = None, 0
+
+    def report(self) -> Dict[str, float]:
+        confirmed = self.stats["confirmed"]
+        return {**self.stats, "avg_time_saved": self.stats["time_saved"] / confirmed if confirmed else 0.0}
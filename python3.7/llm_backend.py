@@ -0,0 +1,295 @@
+import asyncio
+import functools
+import itertools
+import re
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+import metrics
+
+LLM_LATENCY = metrics.REGISTRY.histogram(
+    "realtime_dialog_llm_latency_seconds", "LLM调用延迟（不含并发排队）：first为首个结果，total为整次调用",
+    ["call", "stage"])
+LLM_CALLS = metrics.REGISTRY.counter("realtime_dialog_llm_calls_total", "LLM调用次数", ["call", "outcome"])
+
+
+@dataclass
+class LLMResult:
+    """一次LLM调用的结果"""
+    text: str
+    total_tokens: Optional[int] = None
+    latency: float = 0.0
+
+
+class LLMTimeoutError(Exception):
+    """LLM调用超时"""
+
+
+class LLMBackend:
+    """LLM后端基类，所有实现都必须是非阻塞的协程接口"""
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        raise NotImplementedError
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        """流式生成文本增量，默认实现退化为一次性返回完整结果"""
+        result = await self.complete(messages, **params)
+        yield result.text
+
+    async def close(self) -> None:
+        pass
+
+
+def _result_from_completion(response: Any) -> LLMResult:
+    """将openai的ChatCompletion转换为LLMResult"""
+    try:
+        total_tokens = response.usage.total_tokens
+    except AttributeError:
+        total_tokens = None
+    return LLMResult(text=response.choices[0].message.content.strip(), total_tokens=total_tokens)
+
+
+class AzureOpenAIBackend(LLMBackend):
+    """基于AsyncAzureOpenAI的异步后端，openai在构造时才导入"""
+
+    def __init__(self, azure_config: Dict[str, Any]):
+        from openai import AsyncAzureOpenAI
+        self.model = azure_config["model"]
+        self.client = AsyncAzureOpenAI(
+            api_key=azure_config["api_key"],
+            azure_endpoint=azure_config["azure_endpoint"],
+            api_version=azure_config["api_version"],
+            timeout=azure_config["timeout"],
+        )
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        response = await self.client.chat.completions.create(model=self.model, messages=messages, **params)
+        return _result_from_completion(response)
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(
+            model=self.model, messages=messages, stream=True, **params)
+        async for chunk in response:
+            # Azure会下发不含choices的内容过滤块
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self) -> None:
+        await self.client.close()
+
+
+class ExecutorLLMBackend(LLMBackend):
+    """将同步的completion函数放到线程池中执行
+
+    取消或超时只会丢弃结果，线程中的同步调用仍会执行到结束。
+    """
+
+    def __init__(self, create_fn: Callable[..., Any], model: str, executor: Optional[Executor] = None):
+        self.create_fn = create_fn
+        self.model = model
+        self.executor = executor
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        loop = asyncio.get_running_loop()
+        response = await loop.run_in_executor(
+            self.executor, functools.partial(self.create_fn, model=self.model, messages=messages, **params))
+        return _result_from_completion(response)
+
+
+class StubLLMBackend(LLMBackend):
+    """本地桩后端：固定延迟后返回预设回复，用于离线测试事件循环行为
+
+    流式输出时首个片段在latency秒后到达，之后每token_interval秒输出chunk_size个字符。
+    """
+
+    def __init__(self, reply: str = "这是一个本地桩回复。", latency: float = 0.5,
+                 token_interval: float = 0.0, chunk_size: int = 2):
+        self.reply = reply
+        self.latency = latency
+        self.token_interval = token_interval
+        self.chunk_size = chunk_size
+        self.calls = 0
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        self.calls += 1
+        chunks = -(-len(self.reply) // self.chunk_size)
+        await asyncio.sleep(self.latency + self.token_interval * max(chunks - 1, 0))
+        return LLMResult(text=self.reply, total_tokens=len(self.reply))
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        for i in range(0, len(self.reply), self.chunk_size):
+            if i:
+                await asyncio.sleep(self.token_interval)
+            yield self.reply[i:i + self.chunk_size]
+
+
+# 近似的token切分：英文单词（含尾随空白）、连续空白或单个字符（中文字、标点）各算一个token
+_TOKEN = re.compile(r"[A-Za-z0-9_']+\s*|\s+|.", re.S)
+
+
+def split_tokens(text: str) -> List[str]:
+    return _TOKEN.findall(text)
+
+
+class ScriptedLLMBackend(LLMBackend):
+    """确定性的本地脚本后端，用于离线的端到端延迟测试
+
+    script为(正则, 回复)列表时按最后一条消息内容匹配第一个命中的回复，未命中时依次循环replies；
+    流式输出在ttft秒后输出首个token，之后按tokens_per_second匀速输出（按绝对时间排程，不累积误差）。
+    """
+
+    def __init__(self, replies: Sequence[str] = ("这是一个本地脚本回复。",),
+                 script: Sequence[Tuple[str, str]] = (), ttft: float = 0.3, tokens_per_second: float = 30.0):
+        self.replies = list(replies)
+        self.script = [(re.compile(pattern), reply) for pattern, reply in script]
+        self.ttft = ttft
+        self.tokens_per_second = tokens_per_second
+        self._cycle = itertools.cycle(self.replies)
+        self.calls = 0
+
+    def reply_for(self, messages: List[Dict[str, str]]) -> str:
+        content = messages[-1]["content"] if messages else ""
+        for pattern, reply in self.script:
+            if pattern.search(content):
+                return reply
+        return next(self._cycle)
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        self.calls += 1
+        tokens = split_tokens(self.reply_for(messages))
+        await asyncio.sleep(self.ttft + max(len(tokens) - 1, 0) / self.tokens_per_second)
+        return LLMResult(text="".join(tokens), total_tokens=len(tokens))
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        self.calls += 1
+        tokens = split_tokens(self.reply_for(messages))
+        loop = asyncio.get_running_loop()
+        first = loop.time() + self.ttft
+        for i, token in enumerate(tokens):
+            await asyncio.sleep(max(first + i / self.tokens_per_second - loop.time(), 0))
+            yield token
+
+
+def _azure_backend(options: Dict[str, Any]) -> LLMBackend:
+    import config
+    return AzureOpenAIBackend({**config.azure_openai_config, **options})
+
+
+# 可通过配置选择的后端：名称 -> 工厂函数(options)
+BACKENDS: Dict[str, Callable[[Dict[str, Any]], LLMBackend]] = {
+    "azure": _azure_backend,
+    "stub": lambda options: StubLLMBackend(**options),
+    "scripted": lambda options: ScriptedLLMBackend(**options),
+}
+
+
+def register_backend(name: str, factory: Callable[[Dict[str, Any]], LLMBackend]) -> None:
+    """注册自定义后端，之后可在配置中按名称选择"""
+    BACKENDS[name] = factory
+
+
+def create_backend(name: Union[str, LLMBackend] = "azure", options: Optional[Dict[str, Any]] = None) -> LLMBackend:
+    """按名称创建LLM后端，已是LLMBackend实例时原样返回"""
+    if isinstance(name, LLMBackend):
+        return name
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"未知的LLM后端: {name}，可选: {', '.join(sorted(BACKENDS))}")
+    return factory(dict(options or {}))
+
+
+class LLMClient:
+    """LLM调用入口：统一处理单次调用超时、取消和并发上限"""
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int = 4, timeout: float = 30.0):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        # 信号量在首次调用时于运行中的事件循环里创建
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"calls": 0, "in_flight": 0, "timeouts": 0, "cancelled": 0, "errors": 0}
+
+    async def complete(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                       **params: Any) -> LLMResult:
+        """调用后端生成回复，超时抛出LLMTimeoutError，任务取消时同时取消后端调用"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        timeout = self.timeout if timeout is None else timeout
+
+        self.stats["calls"] += 1
+        async with self._semaphore:
+            self.stats["in_flight"] += 1
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(self.backend.complete(messages, **params), timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                LLM_CALLS.labels("complete", "timeout").inc()
+                raise LLMTimeoutError(f"LLM调用超时({timeout}s)")
+            except asyncio.CancelledError:
+                self.stats["cancelled"] += 1
+                LLM_CALLS.labels("complete", "cancelled").inc()
+                raise
+            except Exception:
+                self.stats["errors"] += 1
+                LLM_CALLS.labels("complete", "error").inc()
+                raise
+            finally:
+                self.stats["in_flight"] -= 1
+        result.latency = time.perf_counter() - start
+        LLM_CALLS.labels("complete", "ok").inc()
+        LLM_LATENCY.labels("complete", "total").observe(result.latency)
+        return result
+
+    async def stream(self, messages: List[Dict[str, str]], timeout: Optional[float] = None,
+                     **params: Any) -> AsyncIterator[str]:
+        """流式调用后端，timeout限制整次生成的总时长；消费方提前退出或任务取消时关闭后端流"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        timeout = self.timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+
+        self.stats["calls"] += 1
+        async with self._semaphore:
+            self.stats["in_flight"] += 1
+            deadline = loop.time() + timeout
+            start = time.perf_counter()
+            first = True
+            deltas = self.backend.stream(messages, **params)
+            try:
+                while True:
+                    try:
+                        delta = await asyncio.wait_for(deltas.__anext__(), max(deadline - loop.time(), 0))
+                    except StopAsyncIteration:
+                        break
+                    except asyncio.TimeoutError:
+                        self.stats["timeouts"] += 1
+                        LLM_CALLS.labels("stream", "timeout").inc()
+                        raise LLMTimeoutError(f"LLM流式调用超时({timeout}s)")
+                    if first:
+                        first = False
+                        LLM_LATENCY.labels("stream", "first").observe(time.perf_counter() - start)
+                    yield delta
+                LLM_CALLS.labels("stream", "ok").inc()
+                LLM_LATENCY.labels("stream", "total").observe(time.perf_counter() - start)
+            except (asyncio.CancelledError, GeneratorExit):
+                self.stats["cancelled"] += 1
+                LLM_CALLS.labels("stream", "cancelled").inc()
+                raise
+            except LLMTimeoutError:
+                raise
+            except Exception:
+                self.stats["errors"] += 1
+                LLM_CALLS.labels("stream", "error").inc()
+                raise
+            finally:
+                self.stats["in_flight"] -= 1
+                await deltas.aclose()
+
+    async def close(self) -> None:
+        await self.backend.close()
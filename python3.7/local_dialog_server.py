@@ -0,0 +1,229 @@
+import argparse
+import asyncio
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+import websockets
+
+import config
+import protocol
+
+DEFAULT_UTTERANCES = (
+    "我认为首先要分析国内市场是否已经饱和",
+    "中能科技选择德国是因为当地政策支持新能源",
+    "属地化管理可以帮助企业融入当地文化",
+    "他们通过咨询公司锁定了成本和准入门槛",
+    "智慧储能方案体现了技术和当地需求的结合",
+    "带动上下游企业出海形成了产业链优势",
+)
+
+
+class LocalDialogServer:
+    """本地模拟的端到端实时对话服务，用于离线的全链路延迟测试
+
+    按协议处理StartConnection/StartSession/音频/ChatTTSText/FinishSession/FinishConnection：
+    - 空闲（不在等待回复、没有在合成TTS）时每收到frames_per_utterance帧上行音频，按顺序“识别”出一句脚本文本：
+      先发450和ASR中间结果(451)，asr_latency秒后发最终结果。帧数按音频时长折算（一帧为麦克风的一个chunk），
+      客户端合并发送的多帧音频按实际时长计入
+    - 收到ChatTTSText(500)后在tts_first_audio秒后开始下发音频(SERVER_ACK)，按合成速度输出，
+      收到结束块且音频发完后发TTSEnded(359)，本轮结束；reply_timeout秒内没有完成回复也视为本轮结束
+    - native_reply不为空时，最终结果之后由服务端自己回复(550/559)并合成音频，模拟豆包原生模式
+    - 收到ChatTextQuery(501)时直接把文本当作本轮的最终结果，回复native_reply（为空时回显“收到：文本”），
+      按reply_chunk_chars分块下发550，然后559；text_tts为True时再合成回复的音频
+    每轮记录最终结果、首个ChatTTSText、首包音频和TTS结束的时间(perf_counter)，以及识别时已收到的上行音频消息数，见turns。
+    stats统计连接数、当前打开的连接数和收到的FinishSession/FinishConnection数，用于检查客户端是否正常结束会话。
+    """
+
+    def __init__(self, utterances: Sequence[str] = DEFAULT_UTTERANCES, frames_per_utterance: int = 5,
+                 asr_latency: float = 0.1, tts_first_audio: float = 0.15, tts_chars_per_second: float = 5.0,
+                 synthesis_speed: float = 10.0, reply_timeout: float = 10.0, native_reply: Optional[str] = None,
+                 reply_chunk_chars: int = 8, text_tts: bool = True, host: str = "127.0.0.1", port: int = 0):
+        self.utterances = list(utterances)
+        self.frames_per_utterance = frames_per_utterance
+        self.asr_latency = asr_latency
+        self.tts_first_audio = tts_first_audio
+        self.tts_chars_per_second = tts_chars_per_second
+        self.synthesis_speed = synthesis_speed  # 相对实时的合成倍速
+        self.reply_timeout = reply_timeout
+        self.native_reply = native_reply
+        self.reply_chunk_chars = reply_chunk_chars
+        self.text_tts = text_tts
+        self.host = host
+        self.port = port
+        output = config.output_audio_config
+        self.audio_bytes_per_second = output["sample_rate"] * output["channels"] * config.sample_width(output["bit_size"])
+        self.audio_chunk_bytes = output["chunk"] * output["channels"] * config.sample_width(output["bit_size"])
+        source = config.input_audio_config
+        self.input_chunk_bytes = source["chunk"] * source["channels"] * config.sample_width(source["bit_size"])
+        self.turns: List[Dict[str, Any]] = []
+        self.stats = {"connections": 0, "open": 0, "finish_session": 0, "finish_connection": 0}
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    async def _handle(self, ws, path: str = None) -> None:
+        state = {
+            "session_id": "",
+            "frames": 0,
+            "audio_messages": 0,
+            "next_utterance": 0,
+            "tts_queue": None,
+            "tts_task": None,
+            "turn": None,
+            "awaiting_since": None,  # 最终结果已下发、等待回复结束的起始时刻
+        }
+        self.stats["connections"] += 1
+        self.stats["open"] += 1
+        try:
+            async for message in ws:
+                await self._dispatch(ws, state, protocol.parse_request(message))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.stats["open"] -= 1
+            if state["tts_task"] is not None:
+                state["tts_task"].cancel()
+
+    async def _send(self, ws, state: Dict[str, Any], event: int, payload: Any = None) -> None:
+        await ws.send(protocol.build_frame(event, payload if payload is not None else {}, state["session_id"],
+                                           message_type=protocol.SERVER_FULL_RESPONSE))
+
+    async def _send_audio(self, ws, state: Dict[str, Any], audio: bytes) -> None:
+        await ws.send(protocol.build_frame(352, audio, state["session_id"], message_type=protocol.SERVER_ACK,
+                                           serial_method=protocol.NO_SERIALIZATION,
+                                           compression_type=protocol.NO_COMPRESSION))
+
+    async def _dispatch(self, ws, state: Dict[str, Any], request: Dict[str, Any]) -> None:
+        event = request["event"]
+        if event == 1:  # StartConnection
+            await self._send(ws, state, 50)
+        elif event == 100:  # StartSession
+            state["session_id"] = request["session_id"]
+            await self._send(ws, state, 150, {"dialog_id": str(uuid.uuid4())})
+        elif event == 200:  # 上行音频
+            state["audio_messages"] += 1
+            await self._on_audio(ws, state, len(request["payload_msg"]))
+        elif event == 500:  # ChatTTSText
+            self._enqueue_tts(ws, state, request["payload_msg"])
+        elif event == 501:  # ChatTextQuery
+            await self._on_text_query(ws, state, request["payload_msg"].get("content", ""))
+        elif event == 102:  # FinishSession
+            self.stats["finish_session"] += 1
+            await self._send(ws, state, 152)
+        elif event == 2:  # FinishConnection
+            self.stats["finish_connection"] += 1
+            await self._send(ws, state, 52)
+
+    async def _on_audio(self, ws, state: Dict[str, Any], size: int) -> None:
+        if state["next_utterance"] >= len(self.utterances) or self._synthesizing(state):
+            return
+        if state["awaiting_since"] is not None and time.perf_counter() - state["awaiting_since"] < self.reply_timeout:
+            return
+        before = state["frames"]
+        state["frames"] += size / self.input_chunk_bytes
+        text = self.utterances[state["next_utterance"]]
+        if before < max(self.frames_per_utterance // 2, 1) <= state["frames"]:
+            # 检测到用户开口：清空播放缓存并下发中间结果
+            await self._send(ws, state, 450, {})
+            await self._send(ws, state, 451, {"results": [{"text": text[:len(text) // 2], "is_interim": True}]})
+        if state["frames"] < self.frames_per_utterance:
+            return
+        state["frames"] = 0
+        state["next_utterance"] += 1
+        await self._send(ws, state, 451, {"results": [{"text": text, "is_interim": True}]})
+        await asyncio.sleep(self.asr_latency)
+        turn = {"utterance": text, "asr_final": time.perf_counter(), "first_tts_text": None,
+                "first_audio": None, "tts_end": None, "audio_messages": state["audio_messages"]}
+        self.turns.append(turn)
+        state["turn"] = turn
+        state["awaiting_since"] = turn["asr_final"]
+        await self._send(ws, state, 451, {"results": [{"text": text, "is_interim": False}]})
+        if self.native_reply:
+            await self._send(ws, state, 550, {"content": self.native_reply})
+            await self._send(ws, state, 559, {})
+            self._enqueue_tts(ws, state, {"start": True, "content": self.native_reply, "end": True})
+
+    async def _on_text_query(self, ws, state: Dict[str, Any], text: str) -> None:
+        turn = {"utterance": text, "asr_final": time.perf_counter(), "first_tts_text": None,
+                "first_audio": None, "tts_end": None, "audio_messages": state["audio_messages"]}
+        self.turns.append(turn)
+        state["turn"] = turn
+        reply = self.native_reply or f"收到：{text}"
+        for start in range(0, len(reply), self.reply_chunk_chars):
+            await self._send(ws, state, 550, {"content": reply[start:start + self.reply_chunk_chars]})
+        await self._send(ws, state, 559, {})
+        if self.text_tts:
+            self._enqueue_tts(ws, state, {"start": True, "content": reply, "end": True})
+        else:
+            turn["tts_end"] = time.perf_counter()
+
+    def _synthesizing(self, state: Dict[str, Any]) -> bool:
+        return state["tts_task"] is not None and not state["tts_task"].done()
+
+    def _enqueue_tts(self, ws, state: Dict[str, Any], payload: Dict[str, Any]) -> None:
+        turn = state["turn"]
+        if turn is not None and turn["first_tts_text"] is None:
+            turn["first_tts_text"] = time.perf_counter()
+        if payload.get("start") or not self._synthesizing(state):
+            state["tts_queue"] = asyncio.Queue()
+            if state["tts_task"] is not None:
+                state["tts_task"].cancel()
+            state["tts_task"] = asyncio.ensure_future(self._synthesize(ws, state, state["tts_queue"], turn))
+        state["tts_queue"].put_nowait(payload)
+
+    async def _synthesize(self, ws, state: Dict[str, Any], queue: "asyncio.Queue", turn: Optional[Dict]) -> None:
+        """按合成速度下发音频，直到收到结束块"""
+        await asyncio.sleep(self.tts_first_audio)
+        loop = asyncio.get_running_loop()
+        next_send = loop.time()
+        await self._send(ws, state, 350, {"tts_type": "chat_tts_text"})
+        while True:
+            payload = await queue.get()
+            next_send = max(next_send, loop.time())
+            seconds = len(payload.get("content", "")) / self.tts_chars_per_second
+            remaining = int(seconds * self.audio_bytes_per_second) // 4 * 4
+            while remaining > 0:
+                size = min(self.audio_chunk_bytes, remaining)
+                await asyncio.sleep(max(next_send - loop.time(), 0))
+                await self._send_audio(ws, state, bytes(size))
+                if turn is not None and turn["first_audio"] is None:
+                    turn["first_audio"] = time.perf_counter()
+                next_send += size / self.audio_bytes_per_second / self.synthesis_speed
+                remaining -= size
+            if payload.get("end"):
+                break
+        await self._send(ws, state, 359, {})
+        if turn is not None:
+            turn["tts_end"] = time.perf_counter()
+        if turn is state["turn"]:
+            state["awaiting_since"] = None
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="本地模拟的实时对话服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--native-reply", default=None, help="服务端自行回复的文本（模拟豆包原生模式）")
+    args = parser.parse_args()
+
+    server = LocalDialogServer(host=args.host, port=args.port, native_reply=args.native_reply)
+    print(f"本地对话服务已启动: {await server.start()}")
+    print(f"客户端设置 REALTIME_DIALOG_BASE_URL={server.url} 即可连接")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,253 @@
+import asyncio
+import collections
+import sys
+import threading
+import time
+import traceback
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+LOOP_LAG = metrics.REGISTRY.histogram(
+    "realtime_dialog_loop_lag_seconds", "事件循环调度延迟（心跳实际唤醒时间 - 预期唤醒时间）",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+LOOP_STALLS = metrics.REGISTRY.counter("realtime_dialog_loop_stalls_total", "事件循环阻塞超过阈值的次数")
+
+
+def session_of(frame) -> Optional[str]:
+    """沿调用栈向外找第一个带session id的self（DialogSession、客户端或训练管理器）"""
+    while frame is not None:
+        owner = frame.f_locals.get("self")
+        if owner is not None:
+            session_id = getattr(owner, "session_id", None) or getattr(getattr(owner, "session", None),
+                                                                        "session_id", None)
+            if isinstance(session_id, str):
+                return session_id
+        frame = frame.f_back
+    return None
+
+
+def _function_key(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{code.co_firstlineno})"
+
+
+def _is_idle(frame) -> bool:
+    """事件循环线程停在selector上等待IO即为空闲"""
+    return frame.f_code.co_filename.endswith("selectors.py")
+
+
+@dataclass
+class Stall:
+    """一次事件循环阻塞"""
+    detected: float  # 检测到时的time.time()
+    duration: float  # 阻塞时长，阻塞结束前为检测时已阻塞的时长（近似，误差在心跳间隔以内）
+    session_id: Optional[str]
+    location: str  # 阻塞时最内层的函数
+    stack: str
+    finished: bool = False
+
+
+class SamplingProfiler:
+    """采样剖析事件循环线程：按固定间隔记录线程当前调用栈，按会话和函数汇总
+
+    停在selector上的采样视为空闲不计入，其余采样数 x 间隔近似为函数占用事件循环的时间
+    （包括阻塞IO）；self为函数位于栈顶的时间，total为函数出现在栈中的时间。
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        self.idle = 0
+        self.self_samples: Dict[Optional[str], collections.Counter] = collections.defaultdict(collections.Counter)
+        self.total_samples: Dict[Optional[str], collections.Counter] = collections.defaultdict(collections.Counter)
+        self._running = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="loop-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def _run(self) -> None:
+        while self._running:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            self.samples += 1
+            if _is_idle(frame):
+                self.idle += 1
+                continue
+            session_id = session_of(frame)
+            self.self_samples[session_id][_function_key(frame)] += 1
+            seen = set()
+            while frame is not None:
+                key = _function_key(frame)
+                if key not in seen:
+                    seen.add(key)
+                    self.total_samples[session_id][key] += 1
+                frame = frame.f_back
+
+    def report(self, session_id: Optional[str] = None, top: int = 20) -> List[Tuple[str, float, float]]:
+        """返回[(函数, self秒数, total秒数)]，按self时间降序；session_id为None时汇总所有会话"""
+        if session_id is None:
+            self_counts = sum(self.self_samples.values(), collections.Counter())
+            total_counts = sum(self.total_samples.values(), collections.Counter())
+        else:
+            self_counts = self.self_samples.get(session_id, collections.Counter())
+            total_counts = self.total_samples.get(session_id, collections.Counter())
+        rows = sorted(total_counts, key=lambda key: (self_counts[key], total_counts[key]), reverse=True)[:top]
+        return [(key, self_counts[key] * self.interval, total_counts[key] * self.interval) for key in rows]
+
+    def format_report(self, session_id: Optional[str] = None, top: int = 20) -> str:
+        rows = self.report(session_id, top)
+        busy = (self.samples - self.idle) * self.interval
+        lines = [f"事件循环采样 {self.samples} 次（间隔{self.interval * 1000:.0f}ms），非空闲 {busy:.2f}秒"
+                 + (f"，会话 {session_id}" if session_id else "")]
+        lines.append(f"{'self(s)':>9}{'total(s)':>10}  函数")
+        lines.extend(f"{self_time:>9.3f}{total_time:>10.3f}  {key}" for key, self_time, total_time in rows)
+        return "\n".join(lines)
+
+
+class LoopWatchdog:
+    """事件循环延迟看门狗
+
+    心跳协程每interval秒醒来一次，记录实际唤醒的延迟；监视线程发现心跳超过threshold秒没有更新时，
+    抓取事件循环线程此刻的调用栈（即正在阻塞的协程或同步调用），连同所属会话id一起记录并输出。
+    同一位置的阻塞在cooldown秒内只输出一次调用栈。
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, cooldown: float = 5.0,
+                 stack_limit: int = 12, log: Callable[[str], Any] = print, history: int = 100):
+        self.interval = interval
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.stack_limit = stack_limit
+        self.log = log
+        self.stalls: collections.deque = collections.deque(maxlen=history)
+        self.stats = {"beats": 0, "lag_sum": 0.0, "max_lag": 0.0, "stalls": 0, "suppressed": 0}
+        self.profiler: Optional[SamplingProfiler] = None
+        self.thread_id: Optional[int] = None
+        self._beat = time.monotonic()
+        self._current: Optional[Stall] = None
+        self._last_logged: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+    def start(self) -> None:
+        """在事件循环中调用"""
+        if self._running:
+            return
+        self._running = True
+        self.thread_id = threading.get_ident()
+        self._beat = time.monotonic()
+        self._task = asyncio.ensure_future(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._running = False
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+        self.stop_profiler()
+
+    def start_profiler(self, interval: float = 0.005) -> SamplingProfiler:
+        if self.profiler is None:
+            self.profiler = SamplingProfiler(self.thread_id or threading.get_ident(), interval)
+        self.profiler.start()
+        return self.profiler
+
+    def stop_profiler(self) -> None:
+        if self.profiler is not None:
+            self.profiler.stop()
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            before = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(loop.time() - before - self.interval, 0.0)
+            previous, self._beat = self._beat, time.monotonic()
+            LOOP_LAG.observe(lag)
+            self.stats["beats"] += 1
+            self.stats["lag_sum"] += lag
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            stall = self._current
+            if stall is not None:
+                self._current = None
+                stall.duration = self._beat - previous - self.interval
+                stall.finished = True
+
+    def _watch(self) -> None:
+        while self._running:
+            time.sleep(self.threshold / 4)
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked < self.threshold or self._current is not None:
+                continue
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stall = Stall(detected=time.time(), duration=blocked, session_id=session_of(frame),
+                          location=_function_key(frame),
+                          stack="".join(traceback.format_stack(frame, limit=self.stack_limit)))
+            self._current = stall
+            self.stalls.append(stall)
+            self.stats["stalls"] += 1
+            LOOP_STALLS.inc()
+            last = self._last_logged.get(stall.location)
+            if last is not None and stall.detected - last < self.cooldown:
+                self.stats["suppressed"] += 1
+                continue
+            self._last_logged[stall.location] = stall.detected
+            self.log(f"[会话 {stall.session_id or '-'}] 事件循环已阻塞 {blocked:.3f}秒，位置: {stall.location}\n"
+                     f"{stall.stack}")
+
+    def report(self) -> Dict[str, Any]:
+        beats = self.stats["beats"]
+        by_session = collections.Counter(stall.session_id for stall in self.stalls)
+        return {**self.stats, "avg_lag": self.stats["lag_sum"] / beats if beats else 0.0,
+                "by_session": dict(by_session)}
+
+
+# 每个事件循环共用一个看门狗，按引用计数启停
+_watchdogs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[LoopWatchdog, List[int]]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def acquire(**options: Any) -> LoopWatchdog:
+    """取得当前事件循环的看门狗（首次调用时按options创建并启动）"""
+    loop = asyncio.get_running_loop()
+    entry = _watchdogs.get(loop)
+    if entry is None:
+        entry = _watchdogs[loop] = (LoopWatchdog(**options), [0])
+        entry[0].start()
+    entry[1][0] += 1
+    return entry[0]
+
+
+def release(watchdog: LoopWatchdog) -> None:
+    """最后一个使用者释放后停止看门狗"""
+    for loop, (candidate, refs) in list(_watchdogs.items()):
+        if candidate is watchdog:
+            refs[0] -= 1
+            if refs[0] <= 0:
+                watchdog.stop()
+                del _watchdogs[loop]
+            return
@@ -0,0 +1,398 @@
+import asyncio
+import collections
+import contextlib
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from audio_engine import AudioEngine
+from audio_manager import DialogSession
+from configurable_training_manager import ConfigurableTrainingManager
+from llm_backend import LLMBackend, LLMResult, create_backend
+
+
+class AdmissionRejected(Exception):
+    """会话因容量或延迟SLO未被接纳"""
+
+
+class TokenBucket:
+    """令牌桶限速：平均每秒rate个请求，最多突发burst个，按到达顺序放行"""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        # 锁在首次调用时于运行中的事件循环里创建
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def acquire(self) -> float:
+        """取得一个令牌，返回等待的秒数"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return time.monotonic() - started
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SharedLLMPool:
+    """多个会话共享的LLM后端：全局并发配额、全局限速和按租户的并发上限
+
+    记录最近window秒内每次调用从发起到首个结果的延迟（含排队），供准入控制判断延迟SLO。
+    """
+
+    def __init__(self, backend: LLMBackend, max_concurrency: int = 32, requests_per_second: float = 0.0,
+                 burst: Optional[int] = None, window: float = 30.0):
+        self.backend = backend
+        self.model = getattr(backend, "model", type(backend).__name__)
+        self.max_concurrency = max_concurrency
+        self.limiter = TokenBucket(requests_per_second, burst) if requests_per_second > 0 else None
+        self.window = window
+        self.tenant_limits: Dict[str, int] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tenant_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._samples: Deque[Tuple[float, float]] = collections.deque()
+        self.stats = {"calls": 0, "in_flight": 0, "waiting": 0, "errors": 0, "wait_time": 0.0}
+
+    def set_tenant_limit(self, tenant: str, max_concurrency: int) -> None:
+        self.tenant_limits[tenant] = max_concurrency
+        self._tenant_semaphores.pop(tenant, None)
+
+    def for_tenant(self, tenant: str) -> "TenantLLMBackend":
+        """返回租户视角的后端，可直接注入ConfigurableTrainingManager"""
+        return TenantLLMBackend(self, tenant)
+
+    @contextlib.asynccontextmanager
+    async def _slot(self, tenant: str):
+        """依次取得租户并发、全局限速和全局并发配额"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        tenant_semaphore = self._tenant_semaphores.get(tenant)
+        if tenant_semaphore is None:
+            tenant_semaphore = asyncio.Semaphore(self.tenant_limits.get(tenant, self.max_concurrency))
+            self._tenant_semaphores[tenant] = tenant_semaphore
+
+        started = time.monotonic()
+        self.stats["waiting"] += 1
+        try:
+            await tenant_semaphore.acquire()
+            try:
+                if self.limiter is not None:
+                    await self.limiter.acquire()
+                await self._semaphore.acquire()
+            except BaseException:
+                tenant_semaphore.release()
+                raise
+        finally:
+            self.stats["waiting"] -= 1
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["wait_time"] += time.monotonic() - started
+        try:
+            yield started
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        finally:
+            self.stats["in_flight"] -= 1
+            self._semaphore.release()
+            tenant_semaphore.release()
+
+    def _record(self, latency: float) -> None:
+        now = time.monotonic()
+        self._samples.append((now, latency))
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+
+    async def complete(self, tenant: str, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        async with self._slot(tenant) as started:
+            result = await self.backend.complete(messages, **params)
+        self._record(time.monotonic() - started)
+        return result
+
+    async def stream(self, tenant: str, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        async with self._slot(tenant) as started:
+            deltas = self.backend.stream(messages, **params)
+            first = True
+            try:
+                async for delta in deltas:
+                    if first:
+                        # 流式调用以首个增量的延迟衡量
+                        self._record(time.monotonic() - started)
+                        first = False
+                    yield delta
+            finally:
+                await deltas.aclose()
+
+    def latency_percentile(self, q: float = 0.95) -> Optional[float]:
+        """最近window秒内调用延迟的分位数，没有样本时返回None"""
+        now = time.monotonic()
+        while self._samples and self._samples[0][0] < now - self.window:
+            self._samples.popleft()
+        if not self._samples:
+            return None
+        latencies = sorted(latency for _, latency in self._samples)
+        return latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "p50": self.latency_percentile(0.5),
+            "p95": self.latency_percentile(0.95),
+        }
+
+
+class TenantLLMBackend(LLMBackend):
+    """租户对共享LLM池的访问入口"""
+
+    def __init__(self, pool: SharedLLMPool, tenant: str):
+        self.pool = pool
+        self.tenant = tenant
+        self.model = pool.model
+
+    async def complete(self, messages: List[Dict[str, str]], **params: Any) -> LLMResult:
+        return await self.pool.complete(self.tenant, messages, **params)
+
+    async def stream(self, messages: List[Dict[str, str]], **params: Any) -> AsyncIterator[str]:
+        deltas = self.pool.stream(self.tenant, messages, **params)
+        try:
+            async for delta in deltas:
+                yield delta
+        finally:
+            await deltas.aclose()
+
+    async def close(self) -> None:
+        # 共享后端由编排器关闭
+        pass
+
+
+@dataclass
+class TenantLimits:
+    """单个租户的配额"""
+    max_sessions: int = 50
+    llm_concurrency: int = 8
+
+
+class SessionHandle:
+    """编排器中运行的一个培训会话"""
+
+    def __init__(self, tenant: str, manager: ConfigurableTrainingManager, queued_for: float = 0.0):
+        self.tenant = tenant
+        self.manager = manager
+        self.session_id = manager.session.session_id
+        self.admitted_at = time.monotonic()
+        self.queued_for = queued_for
+        self.task: Optional[asyncio.Task] = None
+
+    def stop(self) -> None:
+        """通知会话主循环退出"""
+        self.manager.session.is_running = False
+
+
+SessionRunner = Callable[[ConfigurableTrainingManager], Awaitable[Any]]
+
+
+class TrainingOrchestrator:
+    """在一个进程内并发运行多个培训会话
+
+    所有会话共享一个LLM后端池（全局并发配额与限速）和一个音频引擎；每个租户有会话数和LLM并发上限。
+    会话的播放缓冲都接到同一个AudioEngine（见audio_engine.py）：提供output_sink_factory时由引擎的调度线程
+    写到各会话的输出，否则混音到引擎共享的声卡输出，会话不再各自打开PyAudio和输出流。
+    未提供audio_engine时编排器自己创建一个，shutdown()时一并停止。
+    准入控制：会话数达到上限，或共享LLM池近期延迟p95超过latency_slo时，新会话排队等待，
+    队列已满或排队超时则拒绝(AdmissionRejected)。
+    """
+
+    def __init__(self, ws_config: Dict[str, Any], llm_backend: Optional[LLMBackend] = None,
+                 training_config: Optional[Dict[str, Any]] = None, max_sessions: int = 200,
+                 max_queue: int = 100, queue_timeout: float = 60.0, latency_slo: float = 2.0,
+                 llm_concurrency: int = 32, requests_per_second: float = 0.0,
+                 audio_engine: Optional[AudioEngine] = None,
+                 output_sink_factory: Optional[Callable[[str], Callable[[bytes], Any]]] = None,
+                 default_limits: Optional[TenantLimits] = None,
+                 tenant_limits: Optional[Dict[str, TenantLimits]] = None):
+        # 未提供后端时按培训配置中的llm_backend创建，所有会话共用
+        if llm_backend is None:
+            training_config = training_config or {}
+            llm_backend = create_backend(training_config.get("llm_backend", "azure"),
+                                         training_config.get("llm_backend_options"))
+        self.ws_config = ws_config
+        self.training_config = training_config or {}
+        self.max_sessions = max_sessions
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.latency_slo = latency_slo
+        self.output_sink_factory = output_sink_factory
+        self.default_limits = default_limits or TenantLimits()
+        self.tenant_limits = dict(tenant_limits or {})
+        self.pool = SharedLLMPool(llm_backend, llm_concurrency, requests_per_second)
+        self._owns_engine = audio_engine is None
+        self.audio_engine = audio_engine or AudioEngine()
+        self.sessions: Dict[str, SessionHandle] = {}
+        self._queue: Deque[Dict[str, Any]] = collections.deque()
+        self._pump_task: Optional[asyncio.Task] = None
+        self.poll_interval = 0.2
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "completed": 0, "failed": 0}
+
+    def limits(self, tenant: str) -> TenantLimits:
+        return self.tenant_limits.get(tenant, self.default_limits)
+
+    def tenant_sessions(self, tenant: str) -> int:
+        return sum(1 for handle in self.sessions.values() if handle.tenant == tenant)
+
+    def check_admission(self, tenant: str) -> Optional[str]:
+        """返回不能立即接纳的原因，可以接纳时返回None"""
+        return self._tenant_reason(tenant) or self._global_reason()
+
+    def _tenant_reason(self, tenant: str) -> Optional[str]:
+        if self.tenant_sessions(tenant) >= self.limits(tenant).max_sessions:
+            return f"租户{tenant}会话数已达上限{self.limits(tenant).max_sessions}"
+        return None
+
+    def _global_reason(self) -> Optional[str]:
+        if len(self.sessions) >= self.max_sessions:
+            return f"会话数已达上限{self.max_sessions}"
+        p95 = self.pool.latency_percentile(0.95)
+        if p95 is not None and p95 > self.latency_slo:
+            return f"LLM延迟p95 {p95:.2f}s 超过SLO {self.latency_slo}s"
+        return None
+
+    async def submit(self, tenant: str, config: Optional[Dict[str, Any]] = None,
+                     run: Optional[SessionRunner] = None, wait: bool = True) -> SessionHandle:
+        """提交一个培训会话：可以接纳时立即启动，否则排队；wait为False或队列已满时直接拒绝"""
+        reason = self.check_admission(tenant)
+        if reason is None and not self._queue:
+            return self._launch(tenant, config, run)
+        reason = reason or "已有会话在排队"
+        if not wait or len(self._queue) >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(reason if wait else f"无法立即接纳: {reason}")
+
+        entry = {
+            "tenant": tenant,
+            "config": config,
+            "run": run,
+            "queued_at": time.monotonic(),
+            "future": asyncio.get_running_loop().create_future(),
+        }
+        self._queue.append(entry)
+        self.stats["queued"] += 1
+        print(f"租户{tenant}的会话进入排队（{reason}），队列长度 {len(self._queue)}")
+        if self._pump_task is None or self._pump_task.done():
+            self._pump_task = asyncio.ensure_future(self._pump())
+        try:
+            return await asyncio.wait_for(entry["future"], self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.stats["rejected"] += 1
+            raise AdmissionRejected(f"排队超过{self.queue_timeout}秒")
+        finally:
+            if entry in self._queue:
+                self._queue.remove(entry)
+
+    def _admit_queued(self) -> None:
+        """按排队顺序接纳可以运行的会话，跳过已达上限的租户"""
+        for entry in list(self._queue):
+            if entry["future"].done():
+                self._queue.remove(entry)
+                continue
+            if self._global_reason() is not None:
+                break  # 全局容量或延迟不满足，后面的会话也无法接纳
+            if self._tenant_reason(entry["tenant"]) is None:
+                self._queue.remove(entry)
+                handle = self._launch(entry["tenant"], entry["config"], entry["run"],
+                                      time.monotonic() - entry["queued_at"])
+                entry["future"].set_result(handle)
+
+    async def _pump(self) -> None:
+        """有会话排队时定期重新检查准入条件（延迟样本会随时间窗口过期）"""
+        while self._queue:
+            self._admit_queued()
+            await asyncio.sleep(self.poll_interval)
+
+    def _launch(self, tenant: str, config: Optional[Dict[str, Any]], run: Optional[SessionRunner],
+                queued_for: float = 0.0) -> SessionHandle:
+        limits = self.limits(tenant)
+        if tenant not in self.pool.tenant_limits:
+            self.pool.set_tenant_limit(tenant, limits.llm_concurrency)
+        session = DialogSession(
+            self.ws_config,
+            use_microphone=False,
+            handle_signals=False,
+            audio_engine=self.audio_engine,
+        )
+        if self.output_sink_factory is not None:
+            # 会话id在构造时生成；输出在prepare()/open_audio_output()时才接到引擎上
+            session.output_sink = self.output_sink_factory(session.session_id)
+        manager = ConfigurableTrainingManager(
+            self.ws_config,
+            {**self.training_config, **(config or {})},
+            llm_backend=self.pool.for_tenant(tenant),
+            session=session,
+        )
+        handle = SessionHandle(tenant, manager, queued_for)
+        self.sessions[handle.session_id] = handle
+        self.stats["admitted"] += 1
+        run = run or (lambda m: m.start_configurable_session())
+        handle.task = asyncio.ensure_future(self._run(handle, run))
+        return handle
+
+    async def _run(self, handle: SessionHandle, run: SessionRunner) -> Any:
+        try:
+            result = await run(handle.manager)
+            self.stats["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.stats["failed"] += 1
+            print(f"租户{handle.tenant}的会话{handle.session_id}异常结束: {e}")
+            raise
+        finally:
+            # 培训管理器只在auto_disconnect时断开连接，托管的会话结束或被停止时都由编排器结束会话并关闭连接
+            await handle.manager.session.finish()
+            handle.manager.session.close_audio_output()
+            self.sessions.pop(handle.session_id, None)
+            self._admit_queued()
+
+    async def shutdown(self) -> None:
+        """拒绝排队中的会话，停止所有运行中的会话并释放共享资源"""
+        for entry in self._queue:
+            if not entry["future"].done():
+                entry["future"].set_exception(AdmissionRejected("编排器已关闭"))
+        self._queue.clear()
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+        handles = list(self.sessions.values())
+        tasks = [handle.task for handle in handles if handle.task is not None]
+        for handle in handles:
+            handle.stop()
+            handle.task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # 还没开始运行就被取消的任务不会执行_run的finally，这里再关闭一次（已关闭的连接直接跳过）
+        await asyncio.gather(*(handle.manager.session.finish() for handle in handles), return_exceptions=True)
+        for handle in handles:
+            handle.manager.session.close_audio_output()
+            self.sessions.pop(handle.session_id, None)
+        if self._owns_engine:
+            self.audio_engine.stop()
+        await self.pool.backend.close()
+
+    def report(self) -> Dict[str, Any]:
+        tenants: Dict[str, int] = collections.Counter(handle.tenant for handle in self.sessions.values())
+        return {
+            **self.stats,
+            "active": len(self.sessions),
+            "queue": len(self._queue),
+            "tenants": dict(tenants),
+            "llm": self.pool.report(),
+            "audio": dict(self.audio_engine.stats),
+        }
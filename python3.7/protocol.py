@@ -1,5 +1,10 @@
 import gzip
 import json
+import struct
+import time
+import zlib
+
+import metrics
 
 PROTOCOL_VERSION = 0b0001
 DEFAULT_HEADER_SIZE = 0b0001
@@ -39,6 +44,52 @@ NO_COMPRESSION = 0b0000
 GZIP = 0b0001
 CUSTOM_COMPRESSION = 0b1111
 
+MESSAGE_TYPE_NAMES = {
+    CLIENT_FULL_REQUEST: "CLIENT_FULL_REQUEST",
+    CLIENT_AUDIO_ONLY_REQUEST: "CLIENT_AUDIO_ONLY_REQUEST",
+    SERVER_FULL_RESPONSE: "SERVER_FULL_RESPONSE",
+    SERVER_ACK: "SERVER_ACK",
+    SERVER_ERROR_RESPONSE: "SERVER_ERROR",
+}
+
+CODEC_SECONDS = metrics.REGISTRY.histogram(
+    "realtime_dialog_codec_seconds", "帧编码/解码耗时（含压缩和序列化）", ["op"])
+GZIP_SECONDS = metrics.REGISTRY.histogram("realtime_dialog_gzip_seconds", "gzip压缩/解压耗时", ["op"])
+_ENCODE_SECONDS = CODEC_SECONDS.labels("encode")
+_DECODE_SECONDS = CODEC_SECONDS.labels("decode")
+_COMPRESS_SECONDS = GZIP_SECONDS.labels("compress")
+_DECOMPRESS_SECONDS = GZIP_SECONDS.labels("decompress")
+
+
+class ProtocolError(ValueError):
+    """帧格式错误：帧被截断、长度字段越界或负载无法解码"""
+
+
+_U32 = struct.Struct(">I")
+
+
+def compress(data, level=9):
+    start = time.perf_counter()
+    data = gzip.compress(data, level)
+    _COMPRESS_SECONDS.observe(time.perf_counter() - start)
+    return data
+
+
+def decompress(data):
+    start = time.perf_counter()
+    data = gzip.decompress(data)
+    _DECOMPRESS_SECONDS.observe(time.perf_counter() - start)
+    return data
+
+
+def frame_info(frame):
+    """只读帧头，返回(消息类型, 事件号)，没有事件字段时事件号为None"""
+    flags = frame[1] & 0x0f
+    if not flags & MSG_WITH_EVENT or frame[1] >> 4 == SERVER_ERROR_RESPONSE:
+        return frame[1] >> 4, None
+    offset = (frame[0] & 0x0f) * 4 + (4 if flags & NEG_SEQUENCE else 0)
+    return frame[1] >> 4, int.from_bytes(frame[offset:offset + 4], "big")
+
 
 def generate_header(
         version=PROTOCOL_VERSION,
@@ -66,7 +117,57 @@ def generate_header(
     return header
 
 
-def parse_response(res):
+def parse_response(res, pool=None):
+    """解析服务端返回的帧，并统计解码耗时
+
+    提供pool(buffer_pool.BufferPool)时，未压缩的原始音频负载复制进池中的缓冲，
+    payload_msg为PooledBuffer，写出后应调用release()归还
+    """
+    start = time.perf_counter()
+    try:
+        return _parse_response(res, pool)
+    except struct.error as e:
+        raise ProtocolError(f"帧被截断: {e}") from e
+    finally:
+        _DECODE_SECONDS.observe(time.perf_counter() - start)
+
+
+def _check_size(size, offset, frame, name):
+    """检查offset处的长度字段(值为size)之后还有这么多字节"""
+    if offset + 4 + size > len(frame):
+        raise ProtocolError(f"{name}长度 {size} 超出帧长 {len(frame)}(offset {offset + 4})")
+
+
+def _header_size(frame):
+    if len(frame) < 4:
+        raise ProtocolError(f"帧长 {len(frame)} 不足4字节帧头")
+    header_size = (frame[0] & 0x0f) * 4
+    if header_size < 4 or header_size > len(frame):
+        raise ProtocolError(f"帧头长度 {header_size} 无效(帧长 {len(frame)})")
+    return header_size
+
+
+def _decode_session_id(frame, offset, size):
+    try:
+        return str(frame[offset:offset + size], "utf-8")
+    except UnicodeDecodeError as e:
+        raise ProtocolError(f"session id不是有效的utf-8: {e}") from e
+
+
+def _decode_payload(payload_msg, serialization_method, message_compression):
+    try:
+        if message_compression == GZIP:
+            payload_msg = decompress(payload_msg)
+        if serialization_method == JSON:
+            return json.loads(str(payload_msg, "utf-8"))
+        if serialization_method != NO_SERIALIZATION:
+            return str(payload_msg, "utf-8")
+    except (OSError, EOFError, zlib.error, ValueError) as e:
+        raise ProtocolError(f"负载解码失败: {e}") from e
+    return payload_msg
+
+
+def _parse_response(res, pool=None):
     """
     - header
         - (4bytes)header
@@ -84,52 +185,111 @@ def parse_response(res):
           -- session ID data
         - (4 bytes)data len
         - data
+    长度字段按无符号数读取并检查是否越界，帧被截断或长度字段无效时抛出ProtocolError；
+    按偏移量读取各字段，负载只切片一次。
     """
     if isinstance(res, str):
         return {}
-    protocol_version = res[0] >> 4
-    header_size = res[0] & 0x0f
+    offset = _header_size(res)
     message_type = res[1] >> 4
     message_type_specific_flags = res[1] & 0x0f
     serialization_method = res[2] >> 4
     message_compression = res[2] & 0x0f
-    reserved = res[3]
-    header_extensions = res[4:header_size * 4]
-    payload = res[header_size * 4:]
     result = {}
-    payload_msg = None
-    payload_size = 0
-    start = 0
     if message_type == SERVER_FULL_RESPONSE or message_type == SERVER_ACK:
         result['message_type'] = 'SERVER_FULL_RESPONSE'
         if message_type == SERVER_ACK:
             result['message_type'] = 'SERVER_ACK'
         if message_type_specific_flags & NEG_SEQUENCE > 0:
-            result['seq'] = int.from_bytes(payload[:4], "big", signed=False)
-            start += 4
+            result['seq'] = _U32.unpack_from(res, offset)[0]
+            offset += 4
         if message_type_specific_flags & MSG_WITH_EVENT > 0:
-            result['event'] = int.from_bytes(payload[:4], "big", signed=False)
-            start += 4
-        payload = payload[start:]
-        session_id_size = int.from_bytes(payload[:4], "big", signed=True)
-        session_id = payload[4:session_id_size]
-        result['session_id'] = str(session_id)
-        payload = payload[4 + session_id_size:]
-        payload_size = int.from_bytes(payload[:4], "big", signed=False)
-        payload_msg = payload[4:]
+            result['event'] = _U32.unpack_from(res, offset)[0]
+            offset += 4
+        session_id_size = _U32.unpack_from(res, offset)[0]
+        _check_size(session_id_size, offset, res, "session id")
+        result['session_id'] = _decode_session_id(res, offset + 4, session_id_size)
+        offset += 4 + session_id_size
     elif message_type == SERVER_ERROR_RESPONSE:
-        code = int.from_bytes(payload[:4], "big", signed=False)
-        result['code'] = code
-        payload_size = int.from_bytes(payload[4:8], "big", signed=False)
-        payload_msg = payload[8:]
-    if payload_msg is None:
+        result['code'] = _U32.unpack_from(res, offset)[0]
+        offset += 4
+    else:
         return result
-    if message_compression == GZIP:
-        payload_msg = gzip.decompress(payload_msg)
-    if serialization_method == JSON:
-        payload_msg = json.loads(str(payload_msg, "utf-8"))
-    elif serialization_method != NO_SERIALIZATION:
-        payload_msg = str(payload_msg, "utf-8")
-    result['payload_msg'] = payload_msg
+    payload_size = _U32.unpack_from(res, offset)[0]
+    _check_size(payload_size, offset, res, "负载")
+    if serialization_method == NO_SERIALIZATION and message_compression != GZIP:
+        if pool is not None:
+            result['payload_msg'] = pool.copy(res, offset + 4, payload_size)
+        else:
+            result['payload_msg'] = res[offset + 4:offset + 4 + payload_size]
+    else:
+        result['payload_msg'] = _decode_payload(res[offset + 4:offset + 4 + payload_size],
+                                                serialization_method, message_compression)
     result['payload_size'] = payload_size
     return result
+
+
+# 连接级事件（StartConnection/FinishConnection及其响应）不携带session id
+CONNECTION_EVENTS = (1, 2, 50, 51, 52)
+
+
+def build_frame(event, payload=b"", session_id=None, message_type=CLIENT_FULL_REQUEST,
+                serial_method=JSON, compression_type=GZIP, compress_level=9):
+    """
+    按 header + event + [session id] + payload size + payload 组帧
+    - payload为dict时按JSON序列化，str按utf-8编码，bytes原样使用
+    - session_id为None时不写入session id字段
+    - compress_level为gzip压缩级别(1-9)
+    """
+    start = time.perf_counter()
+    if isinstance(payload, dict):
+        payload = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    elif isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    if compression_type == GZIP:
+        payload = compress(payload, compress_level)
+    frame = generate_header(message_type=message_type, serial_method=serial_method,
+                            compression_type=compression_type)
+    frame.extend(int(event).to_bytes(4, 'big'))
+    if session_id is not None:
+        session_id_bytes = session_id.encode("utf-8")
+        frame.extend(len(session_id_bytes).to_bytes(4, 'big'))
+        frame.extend(session_id_bytes)
+    frame.extend(len(payload).to_bytes(4, 'big'))
+    frame.extend(payload)
+    frame = bytes(frame)
+    _ENCODE_SECONDS.observe(time.perf_counter() - start)
+    return frame
+
+
+def parse_request(req):
+    """
+    解析客户端发出的帧（服务端视角，用于本地模拟服务端）
+    - header(4 bytes) + event(4 bytes)
+    - 非连接级事件: session id size(4 bytes) + session id
+    - payload size(4 bytes) + payload
+    帧被截断或长度字段无效时抛出ProtocolError
+    """
+    try:
+        offset = _header_size(req)
+        message_type = req[1] >> 4
+        serialization_method = req[2] >> 4
+        message_compression = req[2] & 0x0f
+        result = {'message_type': message_type}
+        result['event'] = _U32.unpack_from(req, offset)[0]
+        offset += 4
+        if result['event'] not in CONNECTION_EVENTS:
+            session_id_size = _U32.unpack_from(req, offset)[0]
+            _check_size(session_id_size, offset, req, "session id")
+            result['session_id'] = _decode_session_id(req, offset + 4, session_id_size)
+            offset += 4 + session_id_size
+        payload_size = _U32.unpack_from(req, offset)[0]
+    except struct.error as e:
+        raise ProtocolError(f"帧被截断: {e}") from e
+    _check_size(payload_size, offset, req, "负载")
+    payload_msg = req[offset + 4:offset + 4 + payload_size]
+    if serialization_method != JSON:
+        # 客户端只发JSON和原始音频，其余序列化方式不解码
+        serialization_method = NO_SERIALIZATION
+    result['payload_msg'] = _decode_payload(payload_msg, serialization_method, message_compression)
+    return result
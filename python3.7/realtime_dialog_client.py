@@ -1,97 +1,164 @@
 import websockets
-import gzip
-import json
 import asyncio
+import time
+import weakref
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 import protocol
 import config
+import metrics
+import wire_recorder
+from wire_recorder import WireRecorder
+
+FRAMES = metrics.REGISTRY.counter(
+    "realtime_dialog_frames_total", "收发的帧数", ["direction", "message_type", "event"])
+FRAME_BYTES = metrics.REGISTRY.counter(
+    "realtime_dialog_frame_bytes_total", "收发的帧字节数", ["direction", "message_type", "event"])
+SEND_BUFFER = metrics.REGISTRY.gauge(
+    "realtime_dialog_send_buffer_bytes", "所有连接WebSocket发送缓冲区中尚未写出的字节数")
+CONNECTIONS = metrics.REGISTRY.gauge("realtime_dialog_connections", "当前打开的WebSocket连接数")
+
+# 抓取时遍历存活的客户端计算发送缓冲和连接数，收发路径上不做额外统计
+_clients: "weakref.WeakSet[RealtimeDialogClient]" = weakref.WeakSet()
+
+
+def _open_sockets():
+    return [client.ws for client in list(_clients) if client.ws is not None and client.ws.open]
+
+
+def _send_buffer_bytes() -> int:
+    return sum(ws.transport.get_write_buffer_size() for ws in _open_sockets() if ws.transport is not None)
+
+
+SEND_BUFFER.set_function(_send_buffer_bytes)
+CONNECTIONS.set_function(lambda: len(_open_sockets()))
+
+
+# (方向, 消息类型, 事件) -> (帧数, 字节数)子指标，避免每帧格式化标签
+_frame_series: Dict[tuple, tuple] = {}
+
+
+def _count_frame(direction: str, frame: bytes) -> None:
+    key = (direction,) + protocol.frame_info(frame)
+    series = _frame_series.get(key)
+    if series is None:
+        labels = (direction, protocol.MESSAGE_TYPE_NAMES.get(key[1], key[1]), key[2])
+        series = _frame_series[key] = (FRAMES.labels(*labels), FRAME_BYTES.labels(*labels))
+    series[0].inc()
+    series[1].inc(len(frame))
 
 
 class RealtimeDialogClient:
-    def __init__(self, config: Dict[str, Any], session_id: str):
+    """实时对话WebSocket客户端
+
+    配置了record_path（可包含{session_id}）或传入recorder时，收发的每一帧都写入录制文件，
+    可用wire_replay.py回放。
+    buffer_pool不为None时，下行的原始音频解码进池中的缓冲（见buffer_pool.py）。
+    """
+
+    def __init__(self, config: Dict[str, Any], session_id: str, recorder: Optional[WireRecorder] = None):
         self.config = config
         self.logid = ""
         self.session_id = session_id
         self.ws = None
+        self.recorder = recorder or wire_recorder.open_recorder(config.get("record_path"), session_id)
+        self.buffer_pool = None
+        _clients.add(self)
+
+    async def _send(self, frame: bytes) -> None:
+        _count_frame("out", frame)
+        if self.recorder is not None:
+            self.recorder.record(wire_recorder.OUTBOUND, bytes(frame))
+        await self.ws.send(frame)
+
+    async def _recv(self) -> bytes:
+        frame = await self.ws.recv()
+        if not isinstance(frame, str):
+            _count_frame("in", frame)
+        if self.recorder is not None:
+            # 文本帧由录制器按UTF-8编码并在记录头中标记
+            self.recorder.record(wire_recorder.INBOUND, frame)
+        return frame
 
-    async def connect(self) -> None:
-        """建立WebSocket连接"""
-        print(f"url: {self.config['base_url']}, headers: {self.config['headers']}")
+    async def connect(self, start_session: Optional[Dict[str, Any]] = None) -> None:
+        """建立WebSocket连接，start_session为StartSession的参数，默认使用config.start_session_req"""
+        # 每个连接使用独立的X-Api-Connect-Id
+        headers = config.connect_headers(self.config['headers'])
+        print(f"url: {self.config['base_url']}, connect id: {headers['X-Api-Connect-Id']}")
         self.ws = await websockets.connect(
             self.config['base_url'],
-            extra_headers=self.config['headers'],
+            extra_headers=headers,
             ping_interval=None
         )
         self.logid = self.ws.response_headers.get("X-Tt-Logid")
         print(f"dialog server response logid: {self.logid}")
 
         # StartConnection request
-        start_connection_request = bytearray(protocol.generate_header())
-        start_connection_request.extend(int(1).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        start_connection_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        start_connection_request.extend(payload_bytes)
-        await self.ws.send(start_connection_request)
-        response = await self.ws.recv()
+        await self._send(protocol.build_frame(1, {}))
+        response = await self._recv()
         print(f"StartConnection response: {protocol.parse_response(response)}")
 
         # StartSession request
-        request_params = config.start_session_req
-        payload_bytes = str.encode(json.dumps(request_params))
-        payload_bytes = gzip.compress(payload_bytes)
-        start_session_request = bytearray(protocol.generate_header())
-        start_session_request.extend(int(100).to_bytes(4, 'big'))
-        start_session_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        start_session_request.extend(str.encode(self.session_id))
-        start_session_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        start_session_request.extend(payload_bytes)
-        await self.ws.send(start_session_request)
-        response = await self.ws.recv()
+        await self._send(protocol.build_frame(100, start_session or config.start_session_req, self.session_id))
+        response = await self._recv()
         print(f"StartSession response: {protocol.parse_response(response)}")
 
-    async def task_request(self, audio: bytes) -> None:
-        task_request = bytearray(
-            protocol.generate_header(message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
-                                     serial_method=protocol.NO_SERIALIZATION))
-        task_request.extend(int(200).to_bytes(4, 'big'))
-        task_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        task_request.extend(str.encode(self.session_id))
-        payload_bytes = gzip.compress(audio)
-        task_request.extend((len(payload_bytes)).to_bytes(4, 'big'))  # payload size(4 bytes)
-        task_request.extend(payload_bytes)
-        await self.ws.send(task_request)
+    async def task_request(self, audio: bytes, compress_level: int = 9) -> None:
+        await self._send(protocol.build_frame(200, audio, self.session_id,
+                                              message_type=protocol.CLIENT_AUDIO_ONLY_REQUEST,
+                                              serial_method=protocol.NO_SERIALIZATION,
+                                              compress_level=compress_level))
+
+    async def measure_rtt(self, timeout: float = 5.0) -> Optional[float]:
+        """发一个WebSocket ping，返回收到pong的耗时(s)；ping排在已发出的帧之后，包含发送缓冲和链路上的排队。
+        超时或连接已关闭时返回None"""
+        if self.ws is None or not self.ws.open:
+            return None
+        start = time.perf_counter()
+        try:
+            waiter = await self.ws.ping()
+        except websockets.ConnectionClosed:
+            return None
+        try:
+            # asyncio.wait不会像wait_for那样在pong和取消同时到达时吞掉取消
+            await asyncio.wait([waiter], timeout=timeout)
+            if not waiter.done():
+                return None
+            waiter.result()
+        except websockets.ConnectionClosed:
+            return None
+        finally:
+            waiter.cancel()
+        return time.perf_counter() - start
+
+    async def chat_tts_text(self, content: str, start: bool, end: bool) -> None:
+        """发送ChatTTSText事件(500)，由服务端合成指定文本"""
+        payload = {
+            "start": start,
+            "content": content,
+            "end": end
+        }
+        await self._send(protocol.build_frame(500, payload, self.session_id))
+
+    async def chat_text_query(self, content: str) -> None:
+        """发送ChatTextQuery事件(501)，以文本代替语音作为用户输入"""
+        await self._send(protocol.build_frame(501, {"content": content}, self.session_id))
 
     async def receive_server_response(self) -> Dict[str, Any]:
         try:
-            response = await self.ws.recv()
-            data = protocol.parse_response(response)
+            response = await self._recv()
+            data = protocol.parse_response(response, self.buffer_pool)
             return data
         except Exception as e:
             raise Exception(f"Failed to receive message: {e}")
 
     async def finish_session(self):
-        finish_session_request = bytearray(protocol.generate_header())
-        finish_session_request.extend(int(102).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        finish_session_request.extend((len(self.session_id)).to_bytes(4, 'big'))
-        finish_session_request.extend(str.encode(self.session_id))
-        finish_session_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        finish_session_request.extend(payload_bytes)
-        await self.ws.send(finish_session_request)
+        await self._send(protocol.build_frame(102, {}, self.session_id))
 
     async def finish_connection(self):
-        finish_connection_request = bytearray(protocol.generate_header())
-        finish_connection_request.extend(int(2).to_bytes(4, 'big'))
-        payload_bytes = str.encode("{}")
-        payload_bytes = gzip.compress(payload_bytes)
-        finish_connection_request.extend((len(payload_bytes)).to_bytes(4, 'big'))
-        finish_connection_request.extend(payload_bytes)
-        await self.ws.send(finish_connection_request)
-        response = await self.ws.recv()
+        await self._send(protocol.build_frame(2, {}))
+        response = await self._recv()
         print(f"FinishConnection response: {protocol.parse_response(response)}")
 
     async def close(self) -> None:
@@ -99,3 +166,6 @@ class RealtimeDialogClient:
         if self.ws:
             print(f"Closing WebSocket connection...")
             await self.ws.close()
+        if self.recorder is not None:
+            self.recorder.close()
+            print(f"已录制 {self.recorder.frames} 帧: {self.recorder.path}")
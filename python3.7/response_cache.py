@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def cache_key(*parts: Any) -> str:
+    """由可JSON序列化的内容计算缓存键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TwoLevelCache:
+    """内存LRU + 磁盘持久化的两级缓存，值为bytes"""
+
+    def __init__(self, directory: Optional[str], max_entries: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+        if self.directory:
+            try:
+                with open(self._path(key), "rb") as f:
+                    value = f.read()
+            except FileNotFoundError:
+                value = None
+            if value is not None:
+                self.stats["disk_hits"] += 1
+                self._remember(key, value)
+                return value
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, value: bytes) -> None:
+        self._remember(key, value)
+        self.stats["writes"] += 1
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # 先写临时文件再替换，避免并发读到半个文件
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(value)
+        os.replace(tmp_path, path)
+
+    def _remember(self, key: str, value: bytes) -> None:
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= len(old)
+            self._memory[key] = value
+            self._memory_bytes += len(value)
+            while self._memory and (len(self._memory) > self.max_entries or self._memory_bytes > self.max_bytes):
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+
+class ResponseCache:
+    """培训固定内容的缓存：LLM文本按提示词/参数哈希，下行TTS音频按文本+音色配置哈希"""
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = 128):
+        self.text = TwoLevelCache(os.path.join(directory, "llm") if directory else None, max_entries)
+        self.audio = TwoLevelCache(os.path.join(directory, "tts") if directory else None, max_entries)
+
+    @staticmethod
+    def text_key(messages: Any, params: Dict[str, Any], model: str = "") -> str:
+        return cache_key("llm", model, messages, params)
+
+    @staticmethod
+    def audio_key(content: str, voice_config: Dict[str, Any]) -> str:
+        return cache_key("tts", content, voice_config)
+
+    def get_text(self, key: str) -> Optional[str]:
+        value = self.text.get(key)
+        return value.decode("utf-8") if value is not None else None
+
+    def put_text(self, key: str, text: str) -> None:
+        self.text.put(key, text.encode("utf-8"))
+
+    def report(self) -> Dict[str, Dict[str, int]]:
+        return {"llm": dict(self.text.stats), "tts": dict(self.audio.stats)}
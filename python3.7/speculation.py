@@ -0,0 +1,171 @@
+import asyncio
+import difflib
+import re
+import time
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+_IGNORED_CHARS = re.compile(r"[\s，。！？、；：,.!?;:\"'“”‘’]+")
+
+
+def text_similarity(a: str, b: str) -> float:
+    """忽略标点和空白后的文本相似度(0~1)"""
+    a = _IGNORED_CHARS.sub("", a.lower())
+    b = _IGNORED_CHARS.sub("", b.lower())
+    if not a and not b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+class SpeculativeGeneration:
+    """一次推测生成：在后台消费LLM流并缓存增量，提交后可从头回放"""
+
+    def __init__(self, text: str, deltas: AsyncIterator[str]):
+        self.text = text
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.committed_at: Optional[float] = None
+        self.deltas: List[str] = []
+        self.error: Optional[BaseException] = None
+        self._updated = asyncio.Event()
+        self._finished = False
+        self.task = asyncio.ensure_future(self._consume(deltas))
+
+    async def _consume(self, deltas: AsyncIterator[str]) -> None:
+        try:
+            async for delta in deltas:
+                if self.first_token_at is None:
+                    self.first_token_at = time.perf_counter()
+                self.deltas.append(delta)
+                self._updated.set()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self._finished = True
+            self._updated.set()
+
+    async def replay(self) -> AsyncIterator[str]:
+        """先输出已缓存的增量，再跟随后台生成继续输出"""
+        index = 0
+        while True:
+            while index < len(self.deltas):
+                yield self.deltas[index]
+                index += 1
+            if self._finished:
+                break
+            self._updated.clear()
+            await self._updated.wait()
+        if self.error is not None:
+            raise self.error
+
+    def saved_latency(self) -> Optional[float]:
+        """提交后首token比新发起请求提前的时间，首token未到时为None
+
+        新请求的首token延迟按本次推测自身的首token延迟估计（同一后端、同样的输入），
+        提交后还需等待的时间为max(0, 首token时刻 - 提交时刻)，两者相减即min(提交时刻, 首token时刻) - 开始时刻。
+        """
+        if self.committed_at is None or self.first_token_at is None:
+            return None
+        return min(self.committed_at, self.first_token_at) - self.started
+
+    def cancel(self) -> None:
+        self.task.cancel()
+
+
+class SpeculativeResponder:
+    """基于ASR中间结果的推测式回复生成
+
+    中间结果连续stable_count次不变且长度不少于min_chars时开始推测生成；
+    最终结果与推测文本的相似度达到similarity_threshold则直接提交，否则取消推测由调用方重新生成。
+    流式增量数近似计为token数。节省的延迟为用户可感知的首token提前量（见SpeculativeGeneration.saved_latency），
+    提交时首token还没到的推测在首token到达后计入。
+    """
+
+    def __init__(self, start_stream: Callable[[str], AsyncIterator[str]], stable_count: int = 2,
+                 similarity_threshold: float = 0.85, min_chars: int = 4):
+        self.start_stream = start_stream
+        self.stable_count = stable_count
+        self.similarity_threshold = similarity_threshold
+        self.min_chars = min_chars
+        self.current: Optional[SpeculativeGeneration] = None
+        self._last_interim = ""
+        self._repeats = 0
+        self._committed: List[SpeculativeGeneration] = []  # 已提交、首token还没到的推测
+        self.stats: Dict[str, float] = {
+            "speculations": 0,
+            "hits": 0,
+            "misses": 0,
+            "restarts": 0,
+            "wasted_tokens": 0,
+            "latency_saved": 0.0,
+        }
+
+    def on_interim(self, text: str) -> None:
+        """处理ASR中间结果，假设稳定后开始（或重新开始）推测生成"""
+        text = text.strip()
+        if text == self._last_interim:
+            self._repeats += 1
+        else:
+            self._last_interim = text
+            self._repeats = 1
+        if self._repeats < self.stable_count or len(text) < self.min_chars:
+            return
+        if self.current is not None:
+            if text_similarity(self.current.text, text) >= self.similarity_threshold:
+                return
+            self.stats["restarts"] += 1
+            self._discard(self.current)
+        self.stats["speculations"] += 1
+        self.current = SpeculativeGeneration(text, self.start_stream(text))
+
+    def on_final(self, text: str) -> Optional[SpeculativeGeneration]:
+        """处理最终结果：匹配则返回可回放的推测生成，否则取消推测并返回None"""
+        self._last_interim = ""
+        self._repeats = 0
+        speculation, self.current = self.current, None
+        if speculation is None:
+            return None
+        if speculation.error is None and text_similarity(speculation.text, text) >= self.similarity_threshold:
+            self.stats["hits"] += 1
+            speculation.committed_at = time.perf_counter()
+            self._committed.append(speculation)
+            self._settle()
+            return speculation
+        self.stats["misses"] += 1
+        self._discard(speculation)
+        return None
+
+    def cancel(self) -> None:
+        """放弃当前推测（如识别到结束指令或用户打断）"""
+        self._last_interim = ""
+        self._repeats = 0
+        if self.current is not None:
+            self._discard(self.current)
+
+    def _discard(self, speculation: SpeculativeGeneration) -> None:
+        self.stats["wasted_tokens"] += len(speculation.deltas)
+        speculation.cancel()
+        if self.current is speculation:
+            self.current = None
+
+    def _settle(self) -> None:
+        """把首token已到达（或已结束）的已提交推测的节省延迟计入统计"""
+        pending = []
+        for speculation in self._committed:
+            saved = speculation.saved_latency()
+            if saved is not None:
+                self.stats["latency_saved"] += saved
+            elif not speculation.task.done():
+                pending.append(speculation)
+        self._committed = pending
+
+    def report(self) -> Dict[str, float]:
+        """命中率、浪费token数与节省的延迟"""
+        self._settle()
+        decided = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": self.stats["hits"] / decided if decided else 0.0,
+            "avg_latency_saved": self.stats["latency_saved"] / self.stats["hits"] if self.stats["hits"] else 0.0,
+        }
@@ -0,0 +1,74 @@
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+
+class StartupPipeline:
+    """启动流水线：并行执行握手、打开设备、LLM预取等阶段，并统计首包音频时间"""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.stage_tasks: Dict[str, asyncio.Task] = {}
+        self.stage_times: Dict[str, Dict[str, float]] = {}
+        self.first_audio_time: Optional[float] = None
+
+    def add_stage(self, name: str, coro: Awaitable[Any]) -> asyncio.Task:
+        """添加一个并行执行的启动阶段"""
+        task = asyncio.ensure_future(self._run_stage(name, coro))
+        self.stage_tasks[name] = task
+        return task
+
+    async def _run_stage(self, name: str, coro: Awaitable[Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return await coro
+        finally:
+            finished = time.perf_counter()
+            self.stage_times[name] = {
+                "start": started - self.start_time,
+                "end": finished - self.start_time,
+                "duration": finished - started,
+            }
+
+    @staticmethod
+    async def run_blocking(func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行阻塞调用（如打开音频设备），避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, func, *args)
+
+    async def ready(self, *names: str) -> None:
+        """就绪屏障：等待指定阶段（默认全部阶段）完成，任一阶段失败则抛出异常"""
+        names = names or tuple(self.stage_tasks)
+        await asyncio.gather(*(self.stage_tasks[name] for name in names))
+
+    async def result(self, name: str) -> Any:
+        """获取某个阶段的结果"""
+        return await self.stage_tasks[name]
+
+    def cancel(self) -> None:
+        """取消尚未完成的阶段"""
+        for task in self.stage_tasks.values():
+            if not task.done():
+                task.cancel()
+
+    def mark_first_audio(self) -> None:
+        """记录收到首个音频包的时间，并打印启动报告"""
+        if self.first_audio_time is not None:
+            return
+        self.first_audio_time = time.perf_counter() - self.start_time
+        self.print_report()
+
+    def report(self) -> Dict[str, Any]:
+        """返回各阶段耗时与首包音频时间（秒，相对流水线启动时刻）"""
+        return {
+            "stages": dict(self.stage_times),
+            "time_to_first_audio": self.first_audio_time,
+        }
+
+    def print_report(self) -> None:
+        """打印启动耗时报告"""
+        print("启动耗时报告:")
+        for name, times in sorted(self.stage_times.items(), key=lambda item: item[1]["start"]):
+            print(f"  {name}: {times['start']:.3f}s -> {times['end']:.3f}s (耗时 {times['duration']:.3f}s)")
+        if self.first_audio_time is not None:
+            print(f"  首包音频时间: {self.first_audio_time:.3f}s")
@@ -0,0 +1,173 @@
+import asyncio
+import copy
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import config
+from realtime_dialog_client import RealtimeDialogClient
+
+# 文本输入模式：服务端不等待上行音频
+TEXT_INPUT_SESSION = {"dialog": {"extra": {"input_mod": "text"}}}
+
+
+def text_session_request(overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """在config.start_session_req基础上开启文本输入模式"""
+    request = copy.deepcopy(config.start_session_req)
+    config._merge(request, TEXT_INPUT_SESSION)
+    if overrides:
+        config._merge(request, overrides)
+    return request
+
+
+@dataclass
+class TextReply:
+    """一次文本请求的回复"""
+    query: str
+    text: str = ""
+    first_token: Optional[float] = None  # 发出请求到首个550(s)
+    latency: float = 0.0  # 发出请求到559（wait_tts时为359）(s)
+    audio_bytes: int = 0  # 期间收到的TTS音频字节数（不播放）
+    error: Optional[str] = None
+
+
+class TextDialogSession:
+    """纯文本对话会话：不打开音频设备，不发送上行音频
+
+    ask()发送ChatTextQuery(501)并收集550直到559；say()发送ChatTTSText(500)并等待TTS结束(359)。
+    同一会话的请求依次进行；下行TTS音频只计数不保存，wait_tts为True时ask()等到本轮TTS也结束才返回。
+    服务端结束会话(152/153)或连接出错后，进行中和之后的请求立即返回带error的回复，不再等待超时。
+    适合脚本化的提示词回归和吞吐测试，一个事件循环可以同时运行大量会话。
+
+        async with TextDialogSession(config.ws_connect_config) as session:
+            reply = await session.ask("企业出海首先要考虑什么？")
+    """
+
+    def __init__(self, ws_config: Dict[str, Any], session_id: Optional[str] = None,
+                 start_session: Optional[Dict[str, Any]] = None, wait_tts: bool = False):
+        self.session_id = session_id or str(uuid.uuid4())
+        self.client = RealtimeDialogClient(config=ws_config, session_id=self.session_id)
+        self.start_session = start_session if start_session is not None else text_session_request()
+        self.wait_tts = wait_tts
+        self.replies: List[TextReply] = []
+        self._reply: Optional[TextReply] = None
+        self._started = 0.0
+        self._waiter: Optional[asyncio.Future] = None
+        self._wait_event = 559
+        self._finished: Optional[asyncio.Future] = None
+        self.closed_reason: Optional[str] = None  # 接收循环结束的原因，之后的请求直接失败
+        self._lock: Optional[asyncio.Lock] = None
+        self._receiver: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> "TextDialogSession":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        self._lock = asyncio.Lock()
+        self._finished = asyncio.get_running_loop().create_future()
+        await self.client.connect(self.start_session)
+        self._receiver = asyncio.ensure_future(self._receive_loop())
+
+    async def ask(self, text: str, timeout: float = 30.0) -> TextReply:
+        """发送文本请求，返回服务端的文本回复"""
+        return await self._request(TextReply(query=text), self.client.chat_text_query(text),
+                                   359 if self.wait_tts else 559, timeout)
+
+    async def say(self, text: str, timeout: float = 30.0) -> TextReply:
+        """让服务端合成指定文本（ChatTTSText），等到TTS结束"""
+        return await self._request(TextReply(query=text, text=text),
+                                   self.client.chat_tts_text(text, True, True), 359, timeout)
+
+    async def _request(self, reply: TextReply, send, wait_event: int, timeout: float) -> TextReply:
+        async with self._lock:
+            if self.closed_reason is not None:
+                send.close()  # 没有await的协程
+                reply.error = self.closed_reason
+                self.replies.append(reply)
+                return reply
+            self._reply, self._wait_event = reply, wait_event
+            self._waiter = asyncio.get_running_loop().create_future()
+            self._started = time.perf_counter()
+            try:
+                await send
+                await asyncio.wait_for(asyncio.shield(self._waiter), timeout)
+            except asyncio.TimeoutError:
+                reply.error = f"{timeout}秒内没有收到完整回复"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                reply.error = str(e) or type(e).__name__
+            finally:
+                reply.latency = time.perf_counter() - self._started
+                self._reply = self._waiter = None
+            self.replies.append(reply)
+            return reply
+
+    def _resolve(self, error: Optional[Exception] = None) -> None:
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+    async def _receive_loop(self) -> None:
+        try:
+            while True:
+                response = await self.client.receive_server_response()
+                self._dispatch(response)
+                if response.get("event") in (152, 153):
+                    self.closed_reason = "会话已结束"
+                    break
+        except asyncio.CancelledError:
+            self.closed_reason = "会话已关闭"
+            raise
+        except Exception as e:
+            self.closed_reason = f"连接已断开: {str(e) or type(e).__name__}"
+        finally:
+            self._resolve(ConnectionError(self.closed_reason))
+            if not self._finished.done():
+                self._finished.set_result(None)
+
+    def _dispatch(self, response: Dict[str, Any]) -> None:
+        if not response:
+            return
+        payload = response.get("payload_msg")
+        reply = self._reply
+        if response.get("message_type") == "SERVER_ERROR":
+            self._resolve(Exception(f"服务器错误: {payload}"))
+            return
+        if reply is None:
+            return
+        event = response.get("event")
+        if isinstance(payload, bytes):
+            reply.audio_bytes += len(payload)
+        elif event == 550:
+            if reply.first_token is None:
+                reply.first_token = time.perf_counter() - self._started
+            reply.text += payload.get("content", "")
+        if event == self._wait_event:
+            self._resolve()
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """结束会话和连接"""
+        try:
+            if self.client.ws is not None and self.client.ws.open:
+                await self.client.finish_session()
+                if self._finished is not None:
+                    await asyncio.wait_for(asyncio.shield(self._finished), timeout)
+                if self._receiver is not None:
+                    self._receiver.cancel()
+                    self._receiver = None
+                await self.client.finish_connection()
+        except asyncio.TimeoutError:
+            print(f"[{self.session_id}] 等待会话结束超时")
+        finally:
+            if self._receiver is not None:
+                self._receiver.cancel()
+            await self.client.close()
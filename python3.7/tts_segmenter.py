@@ -0,0 +1,142 @@
+import re
+from typing import Iterable, List
+
+# 句末标点：遇到即切分（英文句点需后接空白才算句末，避免切开小数和缩写）
+SENTENCE_ENDINGS = "。！？!?；;…\n"
+# 分句标点：句子过长时的次级切分点
+CLAUSE_BREAKS = "，,、：:"
+# 句末标点之后需要并入同一段的闭合引号/括号
+CLOSERS = "”’\"')）】」』》"
+
+# 需要逐个处理的字符：句末标点、英文句点、分句标点；其余字符整段跳过
+_BREAK_CHARS = re.compile("[" + re.escape(SENTENCE_ENDINGS + "." + CLAUSE_BREAKS) + "]")
+# 超长时的切分点：分句标点或换行以外的空白
+_SOFT_BREAKS = re.compile("[" + re.escape(CLAUSE_BREAKS) + r"]|[^\S\n]")
+
+
+class StreamingSegmenter:
+    """增量式TTS文本分段器
+
+    LLM流式输出的文本片段通过push()送入，返回已完成的可朗读段落；结束时调用flush()取出剩余文本。
+    - 句末标点（中英文）处切分，段落不足min_length时与下一句合并
+    - 段落达到clause_length后在分句标点处切分；首段达到first_chunk_length即可切分，以降低首包延迟
+    - 任何段落都不超过max_length：没有标点时优先在最近的分句标点或空白处切，否则硬切
+    判断句末需要看到下一个字符（英文句点后的空白、闭合引号），因此每次push最多保留一个字符待定。
+    同一段文本无论如何拆分push，切分结果都相同。
+    扫描用预编译的正则从上次的位置跳到下一个标点，不逐字符循环；超长时才回头找最近的分句标点或空白。
+    """
+
+    def __init__(self, max_length: int = 120, min_length: int = 4, clause_length: int = 20,
+                 first_chunk_length: int = 8):
+        if not 0 < first_chunk_length <= max_length or not 0 < clause_length <= max_length:
+            raise ValueError("first_chunk_length和clause_length必须在1到max_length之间")
+        self.max_length = max_length
+        self.min_length = min_length
+        self.clause_length = clause_length
+        self.first_chunk_length = first_chunk_length
+        self.buffer = ""
+        self._scan = 0  # buffer中尚未检查的位置
+        self._first = True
+
+    def push(self, text: str) -> List[str]:
+        """追加文本，返回已完成的段落"""
+        scanned = self._scan == len(self.buffer)
+        self.buffer += text
+        if scanned and len(self.buffer) < self.max_length and _BREAK_CHARS.search(text) is None:
+            self._scan = len(self.buffer)  # 没有待定字符、新文本中没有标点且不超长：无需扫描
+            return []
+        return self._drain(final=False)
+
+    def flush(self) -> List[str]:
+        """结束当前文本流，返回剩余段落并重置状态"""
+        segments = self._drain(final=True)
+        rest = self.buffer.strip()
+        if rest:
+            segments.append(rest)
+        self.buffer = ""
+        self._scan = 0
+        self._first = True
+        return segments
+
+    def _drain(self, final: bool) -> List[str]:
+        buf = self.buffer
+        n = len(buf)
+        segments = []
+        start = 0
+        i = self._scan
+        while True:
+            limit = start + self.max_length  # 段落在limit - 1处达到max_length
+            m = _BREAK_CHARS.search(buf, i, min(n, limit))
+            if m is None:
+                if n < limit:
+                    i = n
+                    break
+                i = limit - 1
+                cut = self._soft_cut(buf, start, limit)
+            else:
+                i = m.start()
+                char = buf[i]
+                cut = None
+                if char in CLAUSE_BREAKS:
+                    clause_length = self.first_chunk_length if self._first else self.clause_length
+                    if i + 1 - start >= clause_length:
+                        cut = i + 1
+                else:
+                    if i + 1 >= n and not final:
+                        break  # 需要下一个字符才能判断
+                    end = i + 1
+                    while end < n and buf[end] in CLOSERS:
+                        end += 1
+                    if end >= n and not final and end > i + 1:
+                        break  # 闭合引号之后可能还有引号
+                    is_end = char != "." or end > i + 1 or end >= n or buf[end].isspace()
+                    min_length = min(self.min_length, self.first_chunk_length) if self._first else self.min_length
+                    if is_end and end - start >= min_length:
+                        # 带上闭合引号会超长时，引号留给下一段
+                        cut = end if end - start <= self.max_length else i + 1
+                if cut is None:
+                    if i + 1 < limit:
+                        i += 1
+                        continue
+                    cut = self._soft_cut(buf, start, limit)
+
+            segment = buf[start:cut].strip()
+            if segment:
+                segments.append(segment)
+                self._first = False
+            start = i = cut
+
+        self.buffer = buf[start:]
+        self._scan = i - start
+        return segments
+
+    @staticmethod
+    def _soft_cut(buf: str, start: int, limit: int) -> int:
+        """buf[start:limit]达到max_length时的切分位置：最近的分句标点或空白之后，没有时硬切"""
+        soft = limit
+        for m in _SOFT_BREAKS.finditer(buf, start, limit):
+            soft = m.end()
+        return soft
+
+
+def pack_segments(segments: Iterable[str], max_length: int) -> List[str]:
+    """将相邻段落合并为不超过max_length的块，减少TTS请求数"""
+    chunks = []
+    current: List[str] = []
+    length = 0
+    for segment in segments:
+        if current and length + len(segment) > max_length:
+            chunks.append("".join(current))
+            current, length = [], 0
+        current.append(segment)
+        length += len(segment)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def split_text(text: str, max_length: int = 120) -> List[str]:
+    """整段文本分段：按句切分后合并为不超过max_length的块"""
+    segmenter = StreamingSegmenter(max_length=max_length, min_length=1, clause_length=max_length,
+                                   first_chunk_length=max_length)
+    return pack_segments(segmenter.push(text) + segmenter.flush(), max_length)
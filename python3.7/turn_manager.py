@@ -0,0 +1,104 @@
+import asyncio
+import contextvars
+import time
+from typing import Awaitable, Dict, Optional
+
+# 当前协程所属的回合，由TurnManager在回合任务内设置
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("current_turn", default=None)
+
+
+class Turn:
+    """一个对话回合：一次用户输入及其LLM/TTS生成"""
+
+    def __init__(self, seq: int, text: str = ""):
+        self.seq = seq
+        self.text = text
+        self.started = time.perf_counter()
+        self.tokens = 0  # 已生成的token数（流式增量数近似）
+        self.chunks = 0  # 已发出的ChatTTSText块数
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+
+
+class TurnManager:
+    """为每个回合分配递增序号，新回合开始或用户打断时取消上一回合的生成
+
+    回合内的协程通过contextvars识别自己所属的回合：被取消回合遗留的ChatTTSText块
+    在发送前由is_stale()拦截。被取消回合已生成的token和耗时计为浪费。
+    """
+
+    def __init__(self):
+        self.seq = 0
+        self.current: Optional[Turn] = None
+        self.stats: Dict[str, float] = {
+            "turns": 0,
+            "cancelled": 0,
+            "stale_chunks": 0,
+            "wasted_tokens": 0,
+            "wasted_time": 0.0,
+        }
+
+    def start(self, coro: Awaitable, text: str = "") -> Turn:
+        """取消上一回合并在新任务中运行coro"""
+        self.cancel("新回合开始")
+        self.seq += 1
+        turn = Turn(self.seq, text)
+        self.current = turn
+        self.stats["turns"] += 1
+        turn.task = asyncio.ensure_future(self._run(turn, coro))
+        return turn
+
+    @staticmethod
+    async def _run(turn: Turn, coro: Awaitable):
+        _current_turn.set(turn)
+        return await coro
+
+    def cancel(self, reason: str = "") -> Optional[Turn]:
+        """取消仍在进行的当前回合，返回被取消的回合"""
+        turn = self.current
+        if turn is None or turn.cancelled or turn.task is None or turn.task.done():
+            return None
+        turn.cancelled = True
+        turn.task.cancel()
+        self.stats["cancelled"] += 1
+        self.stats["wasted_tokens"] += turn.tokens
+        self.stats["wasted_time"] += time.perf_counter() - turn.started
+        print(f"取消第{turn.seq}个回合的生成{'（' + reason + '）' if reason else ''}，"
+              f"已生成{turn.tokens}个token，已发送{turn.chunks}段")
+        return turn
+
+    @staticmethod
+    def active() -> Optional[Turn]:
+        """调用方所在的回合，不在回合任务内时为None"""
+        return _current_turn.get()
+
+    def is_stale(self) -> bool:
+        """调用方所在的回合已被取消或已被新回合取代"""
+        turn = _current_turn.get()
+        return turn is not None and (turn.cancelled or turn is not self.current)
+
+    def add_tokens(self, count: int = 1) -> None:
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.tokens += count
+
+    def allow_chunk(self) -> bool:
+        """发送ChatTTSText块前调用：过期回合的块被丢弃并计数"""
+        if self.is_stale():
+            self.stats["stale_chunks"] += 1
+            return False
+        turn = _current_turn.get()
+        if turn is not None:
+            turn.chunks += 1
+        return True
+
+    async def wait(self, timeout: float) -> bool:
+        """等待当前回合结束，超时返回False；回合被取消视为已结束"""
+        turn = self.current
+        if turn is None or turn.task is None:
+            return True
+        done, _ = await asyncio.wait([turn.task], timeout=timeout)
+        return bool(done)
+
+    def report(self) -> Dict[str, float]:
+        return dict(self.stats)
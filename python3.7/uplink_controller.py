@@ -0,0 +1,318 @@
+import asyncio
+import audioop
+import collections
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import websockets
+
+import metrics
+
+UPLINK_LEVEL = metrics.REGISTRY.gauge("realtime_dialog_uplink_level", "自适应上行当前的降级档位（0为不降级）")
+UPLINK_ADAPTATIONS = metrics.REGISTRY.counter(
+    "realtime_dialog_uplink_adaptations_total", "自适应上行的档位切换次数(degrade/recover)", ["direction"])
+UPLINK_STALE = metrics.REGISTRY.counter(
+    "realtime_dialog_uplink_stale_frames_total", "在本地队列中等待过久、没有发送就丢弃的麦克风帧数")
+UPLINK_RTT = metrics.REGISTRY.histogram(
+    "realtime_dialog_uplink_rtt_seconds", "上行连接的WebSocket ping往返时延",
+    buckets=(0.025, 0.05, 0.1, 0.2, 0.4, 0.8, 1.6, 3.2, 6.4))
+
+MODES = ("off", "fixed", "adaptive")
+
+
+@dataclass
+class UplinkLevel:
+    """一个降级档位，发出的都还是服务端接受的格式（16kHz单声道int16 PCM，gzip压缩）
+
+    - batch: 每条消息合并的麦克风帧数，省掉消息头、WebSocket帧头和gzip头，也减少了ping要排队越过的消息数
+    - compress_level: gzip压缩级别（语音PCM在1到9之间大小和耗时差别都不到1%）
+    - drop_bits: 把每个采样的低drop_bits位清零，仍是16位PCM，但gzip后明显变小（4位约-24%，6位约-37%），
+      对3000左右RMS的语音，量化误差分别约为8和36
+    - zero_silence: RMS低于silence_rms的帧换成全零的静音帧，服务端VAD看到的仍是静音，gzip后几乎不占带宽
+    - max_inflight: 已发出、还没有被ping确认的音频超过这么多秒时，新帧先留在本地队列（0为不限），
+      留在本地的帧超过max_lag后会被丢弃，而进入网络的无法撤回
+    """
+    name: str
+    batch: int = 1
+    compress_level: int = 9
+    drop_bits: int = 0
+    zero_silence: bool = False
+    max_inflight: float = 0.0
+
+
+LEVELS = (
+    UplinkLevel("normal"),
+    UplinkLevel("congested", batch=2, drop_bits=4, zero_silence=True),
+    UplinkLevel("severe", batch=4, drop_bits=6, zero_silence=True, max_inflight=1.0),
+)
+
+
+class AdaptiveUplink:
+    """拥塞自适应的麦克风上行
+
+    麦克风帧用submit()放进本地队列，run()中的发送任务按当前档位取帧、合并、降级后发送，
+    探测任务每probe_interval秒发一个WebSocket ping（同一时刻最多一个）。拥塞信号有两个：
+    - 排队时延：平滑往返时延（和TCP的SRTT一样按1/4的权重更新，单次丢包重传不会触发降档）减去观测到的最小往返时延；
+      还没回来的ping已等待的时间也计入
+    - 积压：本地队列中超出一批的音频 + 已交给WebSocket、还没被确认的音频（秒）。ping和音频走同一条TCP连接、
+      按顺序到达，pong回来说明ping之前发出的音频都已到达服务端；WebSocket发送缓冲中的也算在未确认之内。
+      ping每probe_interval秒一个，链路不拥塞时未确认的音频也有probe_interval加一个往返时延左右
+    排队时延超过degrade_delay或积压超过degrade_backlog时降一档（两次降档至少间隔degrade_hold秒），
+    排队时延低于recover_delay且积压低于recover_backlog持续recover_hold秒后升一档。
+    本地队列中等待超过max_lag秒的帧直接丢弃。
+    pong和下行音频排在同一条下行链路上：最近一次ping发出后收到过下行音频（on_downlink）时，
+    往返时延里混有下行的排队，分不清是哪个方向拥塞，此时不调整档位、也不按max_inflight留住新帧。
+    mode为fixed时同样经过队列并测量往返时延，但始终使用第0档，作为对照；off时会话不使用本类。
+    record_trace为True时记录每条发出的消息(首帧采集时刻, 末帧采集时刻, 发送时刻, 音频字节数, 档位)，
+    时刻为clock()，默认time.perf_counter()，和本地服务、网络损伤代理的记录对齐。
+    """
+
+    def __init__(self, mode: str = "adaptive", levels: Sequence[UplinkLevel] = LEVELS, probe_interval: float = 0.25,
+                 ping_timeout: float = 10.0, degrade_delay: float = 0.3, degrade_backlog: float = 1.5,
+                 recover_delay: float = 0.1, recover_backlog: float = 0.8, degrade_hold: float = 1.0,
+                 recover_hold: float = 3.0, max_lag: float = 2.0, silence_rms: int = 300, sample_rate: int = 16000,
+                 sample_width: int = 2, record_trace: bool = False, clock: Callable[[], float] = time.perf_counter):
+        if mode not in MODES:
+            raise ValueError(f"不支持的上行模式: {mode}，可选 {MODES}")
+        self.mode = mode
+        self.levels = list(levels)
+        self.probe_interval = probe_interval
+        self.ping_timeout = ping_timeout
+        self.degrade_delay = degrade_delay
+        self.degrade_backlog = degrade_backlog
+        self.recover_delay = recover_delay
+        self.recover_backlog = recover_backlog
+        self.degrade_hold = degrade_hold
+        self.recover_hold = recover_hold
+        self.max_lag = max_lag
+        self.silence_rms = silence_rms
+        self.sample_width = sample_width
+        self.bytes_per_second = sample_rate * sample_width
+        self.clock = clock
+        self.level = 0
+        self.srtt: Optional[float] = None
+        self.min_rtt: Optional[float] = None
+        self.sent_audio = 0.0  # 交给WebSocket的音频秒数
+        self.acked_audio = 0.0  # 其中已被ping确认到达的
+        self.trace: Optional[list] = [] if record_trace else None
+        self.stats = {"frames": 0, "messages": 0, "audio_bytes": 0, "zeroed": 0, "stale": 0,
+                      "degrades": 0, "recovers": 0, "max_queued": 0.0, "max_send_buffer": 0, "lost_pings": 0,
+                      "ambiguous_pings": 0}
+        self.rtts: List[float] = []
+        self.level_seconds = [0.0] * len(self.levels)
+        self._queue: collections.deque = collections.deque()  # (采集时刻, 帧)
+        self._queued_bytes = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._ping_sent_at: Optional[float] = None
+        self._probe_at = float("-inf")  # 最近一次ping的发出时刻
+        self._downlink_at = float("-inf")  # 最近一次收到下行音频的时刻
+        self._level_since = clock()
+        self._last_degrade = float("-inf")
+        self._calm_since: Optional[float] = None
+        UPLINK_LEVEL.set(0)
+
+    @classmethod
+    def from_config(cls, options: Dict[str, Any], **kwargs: Any) -> "AdaptiveUplink":
+        options = {**options, **kwargs}
+        if "levels" in options:
+            options["levels"] = [level if isinstance(level, UplinkLevel) else UplinkLevel(**level)
+                                 for level in options["levels"]]
+        return cls(**options)
+
+    @property
+    def adaptive(self) -> bool:
+        return self.mode == "adaptive"
+
+    def submit(self, frame: bytes, captured_at: Optional[float] = None) -> None:
+        """放入一帧麦克风音频，不阻塞"""
+        now = self.clock()
+        self._queue.append((now if captured_at is None else captured_at, frame))
+        self._queued_bytes += len(frame)
+        self.stats["frames"] += 1
+        self._drop_stale(now)
+        self.stats["max_queued"] = max(self.stats["max_queued"], self.queued_seconds())
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def on_downlink(self) -> None:
+        """收到下行音频时调用"""
+        self._downlink_at = self.clock()
+
+    def downlink_busy(self) -> bool:
+        return self._downlink_at >= self._probe_at
+
+    def queued_seconds(self) -> float:
+        return self._queued_bytes / self.bytes_per_second
+
+    def inflight_seconds(self) -> float:
+        return self.sent_audio - self.acked_audio
+
+    def backlog_seconds(self) -> float:
+        """本地队列中超出一批的音频 + 已发出未确认的音频(s)，为凑一批而等待的帧不算积压"""
+        batch = self.levels[self.level].batch * len(self._queue[0][1]) if self._queue else 0
+        return max(0, self._queued_bytes - batch) / self.bytes_per_second + self.inflight_seconds()
+
+    def queue_delay(self, now: float) -> float:
+        """往返时延超出最小往返时延的部分，即链路和缓冲中的排队时间"""
+        if self.min_rtt is None:
+            return 0.0
+        rtt = self.srtt or 0.0
+        if self._ping_sent_at is not None:
+            rtt = max(rtt, now - self._ping_sent_at)
+        return max(0.0, rtt - self.min_rtt)
+
+    async def run(self, client) -> None:
+        """发送和探测，直到连接关闭或被取消；client为RealtimeDialogClient"""
+        self._wakeup = asyncio.Event()
+        tasks = [asyncio.ensure_future(self._send_loop(client)), asyncio.ensure_future(self._probe_loop(client))]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._set_level(self.level, self.clock())  # 结算当前档位的时长
+
+    async def _wait(self, timeout: float) -> None:
+        # 不用wait_for：事件恰好在取消的同时被置位时，wait_for会吞掉取消，发送循环就停不下来
+        self._wakeup.clear()
+        timer = asyncio.get_running_loop().call_later(timeout, self._wakeup.set)
+        try:
+            await self._wakeup.wait()
+        finally:
+            timer.cancel()
+
+    async def _send_loop(self, client) -> None:
+        while True:
+            now = self.clock()
+            self._adapt(now)
+            self._drop_stale(now)
+            level = self.levels[self.level]
+            if not self._queue or (level.max_inflight and not self.downlink_busy()
+                                   and self.inflight_seconds() >= level.max_inflight):
+                # 新帧和ping确认都会唤醒
+                await self._wait(self.probe_interval)
+                continue
+            if len(self._queue) < level.batch:
+                # 凑一批：最多等到最早的帧之后再过batch - 0.5帧的时长（后面的帧一帧一帧地从麦克风到来）
+                first_at, first = self._queue[0]
+                wait = first_at + (level.batch - 0.5) * len(first) / self.bytes_per_second - now
+                if wait > 0:
+                    await self._wait(wait)
+                    continue
+            frames = [self._queue.popleft() for _ in range(min(level.batch, len(self._queue)))]
+            size = sum(len(frame) for _, frame in frames)
+            self._queued_bytes -= size
+            audio = b"".join(self._degrade(frame, level) for _, frame in frames)
+            if self.trace is not None:
+                self.trace.append((frames[0][0], frames[-1][0], self.clock(), size, self.level))
+            self.sent_audio += size / self.bytes_per_second
+            try:
+                await client.task_request(audio, compress_level=level.compress_level)
+            except websockets.ConnectionClosed:
+                return
+            self.stats["messages"] += 1
+            self.stats["audio_bytes"] += size
+            ws = client.ws
+            if ws is not None and ws.transport is not None:
+                self.stats["max_send_buffer"] = max(self.stats["max_send_buffer"],
+                                                    ws.transport.get_write_buffer_size())
+
+    async def _probe_loop(self, client) -> None:
+        while True:
+            audio = self.sent_audio
+            self._ping_sent_at = self._probe_at = self.clock()
+            rtt = await client.measure_rtt(self.ping_timeout)
+            self._ping_sent_at = None
+            if rtt is None:
+                if client.ws is not None and not client.ws.open:
+                    return
+                self.stats["lost_pings"] += 1
+            else:
+                # 确认总是有效的；往返时延只在没有下行音频交错时采用
+                self.acked_audio = max(self.acked_audio, audio)
+                self.min_rtt = rtt if self.min_rtt is None else min(self.min_rtt, rtt)
+                if self.downlink_busy():
+                    self.stats["ambiguous_pings"] += 1
+                else:
+                    self.srtt = rtt if self.srtt is None else self.srtt * 0.75 + rtt * 0.25
+                    self.rtts.append(rtt)
+                    UPLINK_RTT.observe(rtt)
+                self._wakeup.set()
+            self._adapt(self.clock())
+            await asyncio.sleep(self.probe_interval)
+
+    def _degrade(self, frame: bytes, level: UplinkLevel) -> bytes:
+        if level.zero_silence and audioop.rms(frame, self.sample_width) < self.silence_rms:
+            self.stats["zeroed"] += 1
+            return bytes(len(frame))
+        if level.drop_bits:
+            scale = 1 << level.drop_bits
+            return audioop.mul(audioop.mul(frame, self.sample_width, 1.0 / scale), self.sample_width, scale)
+        return frame
+
+    def _drop_stale(self, now: float) -> None:
+        if not self.adaptive:
+            return
+        while self._queue and now - self._queue[0][0] > self.max_lag:
+            self._queued_bytes -= len(self._queue.popleft()[1])
+            self.stats["stale"] += 1
+            UPLINK_STALE.inc()
+
+    def _adapt(self, now: float) -> None:
+        if not self.adaptive:
+            return
+        if self.downlink_busy():
+            self._calm_since = None
+            return
+        delay, backlog = self.queue_delay(now), self.backlog_seconds()
+        if delay > self.degrade_delay or backlog > self.degrade_backlog:
+            self._calm_since = None
+            if self.level < len(self.levels) - 1 and now - self._last_degrade >= self.degrade_hold:
+                self._last_degrade = now
+                self.stats["degrades"] += 1
+                UPLINK_ADAPTATIONS.labels("degrade").inc()
+                self._set_level(self.level + 1, now)
+        elif delay < self.recover_delay and backlog < self.recover_backlog:
+            if self._calm_since is None:
+                self._calm_since = now
+            elif self.level > 0 and now - self._calm_since >= self.recover_hold:
+                self._calm_since = now
+                self.stats["recovers"] += 1
+                UPLINK_ADAPTATIONS.labels("recover").inc()
+                self._set_level(self.level - 1, now)
+        else:
+            self._calm_since = None
+
+    def _set_level(self, level: int, now: float) -> None:
+        self.level_seconds[self.level] += now - self._level_since
+        self._level_since = now
+        self.level = level
+        UPLINK_LEVEL.set(level)
+
+    def report(self) -> Dict[str, Any]:
+        rtts = sorted(self.rtts)
+        seconds = self.stats["audio_bytes"] / self.bytes_per_second
+        total = sum(self.level_seconds) or 1.0
+
+        def percentile(q: float) -> float:
+            return rtts[min(int(q * len(rtts)), len(rtts) - 1)] if rtts else 0.0
+
+        return {**self.stats, "mode": self.mode, "level": self.levels[self.level].name,
+                "audio_seconds": seconds, "queued": len(self._queue),
+                "level_share": {level.name: s / total for level, s in zip(self.levels, self.level_seconds)},
+                "rtt_min": self.min_rtt or 0.0, "rtt_p50": percentile(0.5), "rtt_p95": percentile(0.95),
+                "rtt_max": rtts[-1] if rtts else 0.0}
+
+    def format_report(self) -> str:
+        r = self.report()
+        shares = ", ".join(f"{name} {share:.0%}" for name, share in r["level_share"].items())
+        return (f"自适应上行({r['mode']}): {r['frames']} 帧 -> {r['messages']} 条消息, 音频 {r['audio_seconds']:.1f}s, "
+                f"静音置零 {r['zeroed']} 帧, 过期丢弃 {r['stale']} 帧, 降档 {r['degrades']} 次 升档 {r['recovers']} 次\n"
+                f"  档位时间: {shares}; 往返时延 min {r['rtt_min'] * 1000:.0f}ms p50 {r['rtt_p50'] * 1000:.0f}ms "
+                f"p95 {r['rtt_p95'] * 1000:.0f}ms max {r['rtt_max'] * 1000:.0f}ms, ping超时 {r['lost_pings']}, "
+                f"下行交错 {r['ambiguous_pings']}, "
+                f"本地最大积压 {r['max_queued']:.2f}s, 发送缓冲最大 {r['max_send_buffer'] / 1024:.0f}KB")
@@ -0,0 +1,158 @@
+import audioop
+import collections
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import metrics
+
+UPLINK_FRAMES = metrics.REGISTRY.counter(
+    "realtime_dialog_uplink_frames_total", "麦克风上行帧数，按门控结果区分(sent/dropped/ducked/resent)", ["action"])
+BARGE_INS = metrics.REGISTRY.counter("realtime_dialog_barge_ins_total", "播放期间检测到用户插话、打开上行门控的次数")
+
+MODES = ("off", "half_duplex", "duck")
+
+
+class UplinkGate:
+    """播放感知的上行门控：TTS播放期间不把扬声器回声送上去
+
+    播放状态由服务端事件(350开始/359结束/450打断)和playback_active（如本地播放队列非空）共同决定，
+    播放结束后再保持hold秒（设备缓冲和房间混响的尾音）。门控关闭期间：
+    - half_duplex: 丢弃上行帧
+    - duck: 替换为静音帧，服务端的音频时间轴保持连续，gzip后几乎不占带宽
+    插话检测只算每帧的RMS能量：连续barge_in_frames帧超过max(barge_in_rms, 回声能量 x barge_in_ratio)
+    即视为用户插话，立即打开门控并补发之前缓存的preroll帧，此后barge_in_hold秒内只要还有响声就保持打开。
+    回声能量取门控期间麦克风RMS的滑动平均。
+    """
+
+    def __init__(self, mode: str = "half_duplex", hold: float = 0.4, barge_in_rms: int = 2000,
+                 barge_in_ratio: float = 2.0, barge_in_frames: int = 2, barge_in_hold: float = 1.0,
+                 speech_rms: int = 500, speech_frames: int = 2, preroll: int = 2, sample_width: int = 2,
+                 playback_active: Optional[Callable[[], bool]] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        if mode not in MODES:
+            raise ValueError(f"不支持的门控模式: {mode}，可选 {MODES}")
+        self.mode = mode
+        self.hold = hold
+        self.barge_in_rms = barge_in_rms
+        self.barge_in_ratio = barge_in_ratio
+        self.barge_in_frames = barge_in_frames
+        self.barge_in_hold = barge_in_hold
+        self.speech_rms = speech_rms
+        self.speech_frames = speech_frames
+        self.sample_width = sample_width
+        self.playback_active = playback_active
+        self.clock = clock
+        self.tts_playing = False
+        self.echo_rms: Optional[float] = None
+        self.stats = {"frames": 0, "sent": 0, "gated": 0, "bytes_saved": 0, "barge_ins": 0,
+                      "suppressed_bursts": 0, "echo_interruptions": 0, "barge_in_interruptions": 0}
+        self._preroll: collections.deque = collections.deque(maxlen=preroll)
+        self._last_playback = float("-inf")
+        self._barge_until = float("-inf")
+        self._loud = 0
+        self._burst = 0
+
+    @classmethod
+    def from_config(cls, options: Dict[str, Any], **kwargs: Any) -> "UplinkGate":
+        return cls(**{**options, **kwargs})
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def on_event(self, event: Optional[int]) -> None:
+        """接收服务端事件，跟踪TTS播放状态并统计打断"""
+        if event == 350:
+            self.tts_playing = True
+        elif event == 359:
+            self.tts_playing = False
+            self._last_playback = self.clock()
+        elif event == 450:
+            if self.enabled and (self.tts_playing or self.gated()):
+                # 门控期间收到的打断：插话打开门控后的为真打断，否则是回声漏过门控造成的误打断
+                key = "barge_in_interruptions" if self.clock() < self._barge_until else "echo_interruptions"
+                self.stats[key] += 1
+            if self.tts_playing:
+                self.tts_playing = False
+                self._last_playback = self.clock()
+
+    def playing(self) -> bool:
+        return self.tts_playing or (self.playback_active is not None and self.playback_active())
+
+    def gated(self) -> bool:
+        now = self.clock()
+        if self.playing():
+            self._last_playback = now
+            return True
+        return now - self._last_playback < self.hold
+
+    def filter(self, frame: bytes) -> List[bytes]:
+        """处理一帧麦克风音频，返回需要发送的帧（可能为空，插话时包括之前缓存的帧）"""
+        self.stats["frames"] += 1
+        if not self.enabled or not self.gated():
+            self._reset()
+            return self._send([frame])
+        now = self.clock()
+        rms = audioop.rms(frame, self.sample_width)
+        threshold = max(self.barge_in_rms, (self.echo_rms or 0.0) * self.barge_in_ratio)
+        loud = rms >= threshold
+        if now < self._barge_until:
+            # 插话进行中：有响声就延长
+            if loud:
+                self._barge_until = now + self.barge_in_hold
+            return self._send([frame])
+        self._loud = self._loud + 1 if loud else 0
+        if self._loud >= self.barge_in_frames:
+            self.stats["barge_ins"] += 1
+            BARGE_INS.inc()
+            self._barge_until = now + self.barge_in_hold
+            self._burst = 0
+            # preroll中的帧之前已按门控计数，补发时改计为发送
+            preroll = list(self._preroll)
+            self._preroll.clear()
+            self.stats["gated"] -= len(preroll)
+            self.stats["bytes_saved"] -= sum(len(f) for f in preroll)
+            self.stats["sent"] += len(preroll)
+            UPLINK_FRAMES.labels("resent").inc(len(preroll))
+            return preroll + self._send([frame])
+        if not loud:
+            self.echo_rms = rms if self.echo_rms is None else self.echo_rms * 0.8 + rms * 0.2
+        # 像语音一样持续的一段响声：不门控的话很可能触发服务端VAD，造成一次误打断
+        if rms >= self.speech_rms:
+            self._burst += 1
+        else:
+            self._end_burst()
+        self._preroll.append(frame)
+        self.stats["gated"] += 1
+        self.stats["bytes_saved"] += len(frame)
+        if self.mode == "duck":
+            UPLINK_FRAMES.labels("ducked").inc()
+            return [bytes(len(frame))]
+        UPLINK_FRAMES.labels("dropped").inc()
+        return []
+
+    def _send(self, frames: List[bytes]) -> List[bytes]:
+        self.stats["sent"] += len(frames)
+        UPLINK_FRAMES.labels("sent").inc(len(frames))
+        return frames
+
+    def _end_burst(self) -> None:
+        if self._burst >= self.speech_frames:
+            self.stats["suppressed_bursts"] += 1
+        self._burst = 0
+
+    def _reset(self) -> None:
+        self._end_burst()
+        self._loud = 0
+        self._preroll.clear()
+
+    def report(self) -> Dict[str, Any]:
+        """frames_saved为门控的帧数；suppressed_bursts为门控挡下的类语音响声段数，即估计避免的误打断次数"""
+        return {**self.stats, "mode": self.mode, "frames_saved": self.stats["gated"],
+                "saved_ratio": self.stats["gated"] / self.stats["frames"] if self.stats["frames"] else 0.0}
+
+    def format_report(self) -> str:
+        stats = self.report()
+        return (f"上行门控({stats['mode']}): 麦克风帧 {stats['frames']}, 门控 {stats['gated']} "
+                f"({stats['saved_ratio']:.0%}, {stats['bytes_saved'] / 1024:.0f}KB), 插话 {stats['barge_ins']} 次, "
+                f"挡下回声段 {stats['suppressed_bursts']} 次, 漏过的回声打断 {stats['echo_interruptions']} 次")
@@ -0,0 +1,131 @@
+import os
+import struct
+import time
+from collections import Counter
+from typing import Any, BinaryIO, Dict, Iterator, NamedTuple, Optional, Union
+
+import protocol
+
+# 文件格式: 文件头 MAGIC + 版本(1 byte) + 开始录制的墙上时间(double, 秒)
+# 之后每帧一条记录: 方向(1 byte) + 帧类型(1 byte) + 相对开始的单调时间(uint64, 微秒) + 帧长度(uint32) + 原始帧
+# 文本帧按UTF-8编码写入。版本1的记录没有帧类型字段，都是二进制帧
+MAGIC = b"RDWL"
+VERSION = 2
+FILE_HEADER = struct.Struct(">4sBd")
+RECORD_HEADER = struct.Struct(">BBQI")
+RECORD_HEADER_V1 = struct.Struct(">BQI")
+
+OUTBOUND = 0  # 客户端 -> 服务端
+INBOUND = 1  # 服务端 -> 客户端
+
+BINARY = 0  # WebSocket二进制帧（协议帧）
+TEXT = 1  # WebSocket文本帧
+
+
+class WireRecord(NamedTuple):
+    direction: int
+    timestamp: float  # 相对开始录制的秒数
+    frame: Union[bytes, str]  # 文本帧为str，回放时仍以文本帧发送
+
+
+class WireRecorder:
+    """把客户端收发的每一帧原样追加写入二进制日志
+
+    时间戳取time.perf_counter()相对录制开始的偏移，不受系统时间调整影响。
+    只做缓冲的追加写，不解析帧内容；进程异常退出时最后一条不完整的记录在读取时被忽略。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.frames = 0
+        self.bytes = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._file: Optional[BinaryIO] = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(MAGIC, VERSION, time.time()))
+        self._start = time.perf_counter()
+
+    def record(self, direction: int, frame: Union[bytes, str]) -> None:
+        if self._file is None:
+            return
+        kind = BINARY
+        if isinstance(frame, str):
+            kind, frame = TEXT, frame.encode("utf-8")
+        offset = int((time.perf_counter() - self._start) * 1e6)
+        self._file.write(RECORD_HEADER.pack(direction, kind, offset, len(frame)))
+        self._file.write(frame)
+        self.frames += 1
+        self.bytes += len(frame)
+
+    def flush(self) -> None:
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def open_recorder(path_template: Optional[str], session_id: str) -> Optional[WireRecorder]:
+    """按配置的路径模板（可包含{session_id}）创建录制器，未配置时返回None"""
+    if not path_template:
+        return None
+    return WireRecorder(path_template.format(session_id=session_id))
+
+
+def _read_version(path: str) -> int:
+    with open(path, "rb") as f:
+        magic, version, _ = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    if magic != MAGIC or version not in (1, VERSION):
+        raise ValueError(f"不是有效的录制文件: {path}")
+    return version
+
+
+def read_header(path: str) -> float:
+    """返回开始录制的墙上时间"""
+    _read_version(path)
+    with open(path, "rb") as f:
+        return FILE_HEADER.unpack(f.read(FILE_HEADER.size))[2]
+
+
+def read_records(path: str) -> Iterator[WireRecord]:
+    """按录制顺序读取所有帧"""
+    version = _read_version(path)
+    record_header = RECORD_HEADER if version == VERSION else RECORD_HEADER_V1
+    with open(path, "rb") as f:
+        f.seek(FILE_HEADER.size)
+        while True:
+            header = f.read(record_header.size)
+            if len(header) < record_header.size:
+                return
+            if version == VERSION:
+                direction, kind, offset, size = record_header.unpack(header)
+            else:
+                (direction, offset, size), kind = record_header.unpack(header), BINARY
+            frame = f.read(size)
+            if len(frame) < size:
+                return
+            yield WireRecord(direction, offset / 1e6, frame.decode("utf-8") if kind == TEXT else frame)
+
+
+def parse_record(record: WireRecord) -> Dict[str, Any]:
+    """按方向解析帧内容，文本帧不是协议帧，返回空字典"""
+    if isinstance(record.frame, str):
+        return {}
+    if record.direction == INBOUND:
+        return protocol.parse_response(record.frame)
+    return protocol.parse_request(record.frame)
+
+
+def summarize(path: str) -> Dict[str, Any]:
+    """统计录制文件中各方向的帧数、字节数和事件分布"""
+    summary = {"frames": 0, "duration": 0.0, "outbound": Counter(), "inbound": Counter(),
+               "outbound_bytes": 0, "inbound_bytes": 0}
+    for record in read_records(path):
+        side = "inbound" if record.direction == INBOUND else "outbound"
+        summary["frames"] += 1
+        summary["duration"] = record.timestamp
+        summary[f"{side}_bytes"] += len(record.frame)
+        summary[side][parse_record(record).get("event")] += 1
+    return summary
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import inspect
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import websockets
+
+import protocol
+import wire_recorder
+from wire_recorder import INBOUND, OUTBOUND, WireRecord
+
+# 不参与同步的上行事件：音频帧的数量和节奏取决于采集端，回放时不要求一一对应
+UNSYNCED_EVENTS = (200,)
+
+
+async def replay_inbound(path: str, handler: Callable[[Dict[str, Any]], Any], speed: float = 1.0) -> Dict[str, Any]:
+    """把录制的下行帧按原始间隔（speed倍速，<=0时不等待）解析后交给handler
+
+    handler可以是普通函数或协程函数，例如DialogSession.handle_server_response或训练管理器的响应处理。
+    返回帧数、回放耗时和最大调度延迟。
+    """
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    frames, max_lag = 0, 0.0
+    for record in wire_recorder.read_records(path):
+        if record.direction != INBOUND:
+            continue
+        if speed > 0:
+            due = start + record.timestamp / speed
+            await asyncio.sleep(max(due - loop.time(), 0))
+            max_lag = max(max_lag, loop.time() - due)
+        result = handler(protocol.parse_response(record.frame))
+        if inspect.isawaitable(result):
+            await result
+        frames += 1
+    return {"frames": frames, "elapsed": loop.time() - start, "max_lag": max_lag}
+
+
+class ReplayServer:
+    """把录制文件当作服务端回放给真实客户端
+
+    每个下行帧以它之前最近一个上行控制帧为锚点：等客户端发出对应序号的控制帧后，
+    再按录制时两者的间隔（除以speed）下发，这样服务端的处理延迟被保留，而客户端自身的耗时按实际发生。
+    音频上行帧不参与同步；客户端sync_timeout秒内没有发出期望的控制帧时照常下发并计入desyncs。
+    sent/received记录回放过程中每个下行/上行帧的(时间, 事件)，用于前后对比同一条轨迹上的延迟。
+    """
+
+    def __init__(self, path: str, speed: float = 1.0, sync_timeout: float = 5.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.path = path
+        self.records: List[WireRecord] = list(wire_recorder.read_records(path))
+        self.speed = speed
+        self.sync_timeout = sync_timeout
+        self.host = host
+        self.port = port
+        self.sent: List[Tuple[float, Optional[int]]] = []
+        self.received: List[Tuple[float, Optional[int]]] = []
+        self.desyncs = 0
+        self.done: Optional[asyncio.Event] = None
+        self.server = None
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self) -> str:
+        self.done = asyncio.Event()
+        self.server = await websockets.serve(self._handle, self.host, self.port, max_size=None)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self.url
+
+    async def stop(self) -> None:
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+    def _schedule(self) -> List[Tuple[int, float, WireRecord]]:
+        """为每个下行帧计算(需要的上行控制帧数, 相对该控制帧的延迟, 记录)"""
+        schedule = []
+        controls, anchor = 0, 0.0
+        for record in self.records:
+            if record.direction == OUTBOUND:
+                # 文本帧不是协议帧，不参与同步
+                if wire_recorder.parse_record(record).get("event") not in UNSYNCED_EVENTS + (None,):
+                    controls += 1
+                    anchor = record.timestamp
+            else:
+                schedule.append((controls, record.timestamp - anchor, record))
+        return schedule
+
+    async def _handle(self, ws, path: str = None) -> None:
+        loop = asyncio.get_running_loop()
+        controls: List[float] = [loop.time()]  # controls[i]: 第i个上行控制帧的到达时刻，0号为连接建立
+        arrived = asyncio.Event()
+
+        async def receive() -> None:
+            async for message in ws:
+                event = protocol.parse_request(message)["event"]
+                self.received.append((time.perf_counter(), event))
+                if event not in UNSYNCED_EVENTS:
+                    controls.append(loop.time())
+                    arrived.set()
+
+        receiver = asyncio.ensure_future(receive())
+        try:
+            for needed, delay, record in self._schedule():
+                deadline = loop.time() + self.sync_timeout
+                while len(controls) <= needed and loop.time() < deadline and not receiver.done():
+                    arrived.clear()
+                    try:
+                        await asyncio.wait_for(arrived.wait(), deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        pass
+                if len(controls) <= needed:
+                    self.desyncs += 1
+                    anchor = loop.time()
+                else:
+                    anchor = controls[needed]
+                if self.speed > 0:
+                    await asyncio.sleep(max(anchor + delay / self.speed - loop.time(), 0))
+                await ws.send(record.frame)
+                self.sent.append((time.perf_counter(), wire_recorder.parse_record(record).get("event")))
+            await receiver
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            receiver.cancel()
+            self.done.set()
+
+
+def print_summary(path: str) -> None:
+    summary = wire_recorder.summarize(path)
+    print(f"录制文件: {path}")
+    print(f"帧数: {summary['frames']}, 时长: {summary['duration']:.2f}s, "
+          f"上行 {summary['outbound_bytes']} 字节, 下行 {summary['inbound_bytes']} 字节")
+    for side in ("outbound", "inbound"):
+        events = ", ".join(f"{event}: {count}" for event, count in sorted(summary[side].items()))
+        print(f"{'上行' if side == 'outbound' else '下行'}事件 {events}")
+
+
+async def serve(path: str, host: str, port: int, speed: float) -> None:
+    server = ReplayServer(path, speed=speed, host=host, port=port)
+    print(f"回放服务已启动: {await server.start()} ({speed}倍速)")
+    print(f"客户端设置 REALTIME_DIALOG_BASE_URL={server.url} 即可连接")
+    await server.done.wait()
+    await server.stop()
+    print(f"回放完成: 下发 {len(server.sent)} 帧, 收到 {len(server.received)} 帧, 未同步 {server.desyncs} 次")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="回放录制的实时对话帧")
+    parser.add_argument("path", help="录制文件（客户端配置record_path或REALTIME_DIALOG_RECORD生成）")
+    parser.add_argument("--serve", action="store_true", help="作为服务端把录制的下行帧回放给客户端")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--speed", type=float, default=1.0, help="回放倍速，<=0时不等待")
+    args = parser.parse_args()
+
+    print_summary(args.path)
+    if args.serve:
+        asyncio.run(serve(args.path, args.host, args.port, args.speed))
+
+
+if __name__ == "__main__":
+    main()